@@ -7,21 +7,35 @@ import math  # Import to check for NaN values
 import matplotlib.pyplot as plt
 from datetime import datetime
 import RPi.GPIO as GPIO
-from hx711 import HX711
+from hx711 import HX711, ZeroTracker
 from picamera2 import Picamera2
 from tkinter import Tk, Label, Button, Frame
 from threading import Thread
-from statistics import mean
-from collections import Counter
+from hx711_stats import KalmanWeightEstimator, estimate_noise, NOISE_SAMPLES, STABLE_SAMPLES
+from hx711_filters import FilterPipeline, SaturationFilter, HampelFilter
+from hx711_calibration import calibrate, warm_start, get_registry, default_device
 
 
 
 
-BASE_DIR = "/home/xm23917/Desktop/weight/hx711py"
+# Data lives in weight/hx711py unless SCALE_BASE_DIR says otherwise
+BASE_DIR = os.environ.get("SCALE_BASE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "weight", "hx711py"))
 ZERO_READING_FILE = os.path.join(BASE_DIR, "zero_reading.json")
 CALIBRATION_FILE = os.path.join(BASE_DIR, "calibration_data.json")
 IMAGES_DIR = os.path.join(BASE_DIR, "images")
 WEIGHT_LOG_FILE = os.path.join(BASE_DIR, "weight_data.json")
+REGISTRY_FILE = os.path.join(BASE_DIR, "calibration_registry.json")
+
+# This scale in the calibration registry: station, load cell/HX711 and channel.
+# Set SCALE_CHIP to the load cell's serial number to let its calibration follow it to other stations
+SCALE_CHIP = os.environ.get("SCALE_CHIP")
+SCALE_KEY = (os.environ.get("SCALE_DEVICE") or default_device(), SCALE_CHIP or "hx711-5-6", "A")
+registry = get_registry(REGISTRY_FILE)
+# A registry file that can't be used is left for someone to look at: carrying
+# on without it would mean calibrating from scratch, and the registry won't save
+if registry.get_error() is not None:
+    sys.exit(f"Can't use the calibration registry {REGISTRY_FILE} ({registry.get_error()}). "
+             "Fix it or move it away, then start again.")
 
 # Ensure image directory existsmS
 os.makedirs(IMAGES_DIR, exist_ok=True)
@@ -33,6 +47,8 @@ NUTRITIONIX_API_KEY = "5e7a357053959ca39c053ba924460cc9"
 # Initialize HX711, Camera, and Nutrition Variables
 hx = HX711(5, 6)
 hx.set_reading_format("MSB", "MSB")
+# Keep the empty scale at zero as the load cell drifts.
+hx.set_zero_tracker(ZeroTracker())
 camera = Picamera2()
 camera.configure(camera.create_still_configuration())
 total_nutrition = {
@@ -65,39 +81,56 @@ def get_weight_reading():
     reading = hx.get_weight(5)
     return max(0, reading)  # Ensure no negative values
 
-# Function to calculate the mode-like average within 1g tolerance
-def get_mode_average(weights, tolerance=1):
-    rounded_weights = [round(w) for w in weights]
-    grouped = Counter(rounded_weights)
-    most_common_weight = grouped.most_common(1)[0][0]
-    mode_group = [w for w in weights if most_common_weight - tolerance <= w <= most_common_weight + tolerance]
-    return mean(mode_group) if mode_group else 0
-
 # Function to initialize scale with a new zero reading every time the code runs
 def initialize_scale():
+    # Reuse the saved zero if a few quick samples say it still holds.
+    result = warm_start(hx, tare=False, registry=registry, key=SCALE_KEY)
+    if result["warm"]:
+        print(f"Zero reading from {REGISTRY_FILE} still good (drift {result['drift']:+.2f} g).")
+        return
+
     print("Please ensure the scale is empty. Setting zero reading in:")
     for i in range(3, 0, -1):
         print(i)
         time.sleep(1)
 
     hx.tare()
-    zero_reading = hx.get_offset()
-    with open(ZERO_READING_FILE, "w") as f:
-        json.dump({"zero_reading": zero_reading}, f, indent=4)
-    print(f"Zero reading saved for future use in {ZERO_READING_FILE}")
+    registry.set_zero(*SCALE_KEY, hx.get_offset())
+    print(f"Zero reading saved for future use in {REGISTRY_FILE}")
 
-# Function to load the calibration reference unit
+# Function to calibrate the scale with one or more known weights
+def reset_calibration():
+    print("Resetting calibration. Please ensure the scale is empty.")
+    while True:
+        answer = input("Enter the known weights you will use, in grams, separated by commas (e.g. 100, 500, 1000): ")
+        try:
+            known_weights = [float(weight) for weight in answer.split(",")]
+        except ValueError:
+            known_weights = []
+        if known_weights and all(weight > 0 for weight in known_weights):
+            break
+        print("Weights must be numbers greater than zero. Please try again.")
+
+    # With two or more weights, also correct the load cell's nonlinearity
+    profile = calibrate(hx, known_weights, piecewise=len(known_weights) > 1)
+    hx.set_calibration(profile)
+    registry.set_profile(*SCALE_KEY, profile)
+    print(f"Calibration saved to {REGISTRY_FILE}. Reference unit: {profile.get_reference_unit()}, "
+          f"largest error at the calibration points: {profile.to_dict()['max_error']:.2f}g")
+    return profile.get_reference_unit()
+
+# Function to load the calibration profile from the registry
 def load_reference_unit():
-    try:
-        with open(CALIBRATION_FILE, "r") as f:
-            calibration_data = json.load(f)
-        reference_unit = calibration_data["reference_unit"]
-        print(f"Loaded reference unit: {reference_unit}")
-        hx.set_reference_unit(reference_unit)
-    except (FileNotFoundError, KeyError):
+    # Bring over this station's old calibration and zero files the first time
+    registry.import_files(*SCALE_KEY, calibration_file=CALIBRATION_FILE, zero_file=ZERO_READING_FILE)
+    profile = registry.get_profile(*SCALE_KEY, follow_chip=SCALE_CHIP is not None)
+    if profile is None:
         print("Calibration data not found. Please calibrate the scale.")
-        reference_unit = reset_calibration()
-    return reference_unit
+        return reset_calibration()
+
+    hx.set_calibration(profile)
+    print(f"Loaded calibration: {profile}")
+    return profile.get_reference_unit()
 
 # Function to fetch nutrition info from Nutritionix API
 def fetch_nutrition_info(ingredient_name, weight_grams):
@@ -175,45 +208,53 @@ def capture_and_log_image(weight, image_number, ingredient_name, meal_type):
 
 
 # Real-time weight display and auto-capture upon stabilization
-def monitor_weight(display_label, stability_threshold=1, stabilization_time=1):
+def monitor_weight(display_label, stability_threshold=1):
     global monitoring
     last_logged_weight = None
+    # The Kalman estimator restarts whenever the load changes, so once it has
+    # settled again and its variance and rate stay low for STABLE_SAMPLES
+    # samples in a row the item has settled (benchmark_scenarios.py's
+    # kalmanDetector tests this same rule)
+    variance_threshold = (stability_threshold / 2) ** 2
+    stable_count = 0
+    last_timestamp = None
     while True:
         if monitoring:
-            start_time = time.time()
-            stable_readings = []
-            while time.time() - start_time < stabilization_time:
-                current_weight = get_weight_reading()
-                stable_readings.append(current_weight)
-                display_label.config(text=f"Current Weight: {current_weight:.2f} grams")
-
-                # Check if readings are stable within the threshold
-                if len(stable_readings) > 1:
-                    avg_weight = get_mode_average(stable_readings)
-                    if abs(avg_weight - stable_readings[-1]) > stability_threshold:
-                        # Reset if the weight becomes unstable
-                        stable_readings = []
-                        start_time = time.time()  # Reset stabilization timer
-
-                time.sleep(0.05)  # Sampling delay for responsiveness
-
-            # If the weight is stable for the full duration and not zero, capture and log
-            if stable_readings and sum(stable_readings) / len(stable_readings) > 0:
-                average_stable_weight = sum(stable_readings) / len(stable_readings)
-                if last_logged_weight is None or abs(average_stable_weight - last_logged_weight) > stability_threshold:
-                    ingredient_name = input("Enter the ingredient name: ")
-                    image_number = len(os.listdir(IMAGES_DIR)) + 1
-                    meal_type = suggest_meal()  # Get the meal type based on the time of day
-                    capture_and_log_image(average_stable_weight, image_number, ingredient_name, meal_type)
-                    display_label.config(text=f"Weight logged: {average_stable_weight:.2f} grams")
-                    last_logged_weight = average_stable_weight
-
-                # Prompt to change ingredient after capture
-                display_label.config(text="Please change the ingredient and wait...")
-                time.sleep(2)
-                while get_weight_reading() != 0:
-                    time.sleep(0.1)  # Wait until scale is empty
-                display_label.config(text="Add next ingredient...")
+            estimate = hx.get_weight_estimate()
+            current_weight = max(0, estimate["weight"])
+            display_label.config(text=f"Current Weight: {current_weight:.2f} grams")
+
+            # Count every sample once
+            if estimate["timestamp"] != last_timestamp:
+                last_timestamp = estimate["timestamp"]
+                if (estimate["settled"] and estimate["variance"] <= variance_threshold and
+                        abs(estimate["rate"]) <= stability_threshold):
+                    stable_count += 1
+                else:
+                    stable_count = 0
+
+            if stable_count < STABLE_SAMPLES or estimate["weight"] <= stability_threshold:
+                hx.wait_for_new_sample(timeout=0.5)  # Pace the loop on new conversions
+                continue
+
+            # If the weight is stable and not zero, capture and log
+            average_stable_weight = estimate["weight"]
+            if last_logged_weight is None or abs(average_stable_weight - last_logged_weight) > stability_threshold:
+                ingredient_name = input("Enter the ingredient name: ")
+                image_number = len(os.listdir(IMAGES_DIR)) + 1
+                meal_type = suggest_meal()  # Get the meal type based on the time of day
+                capture_and_log_image(average_stable_weight, image_number, ingredient_name, meal_type)
+                display_label.config(text=f"Weight logged: {average_stable_weight:.2f} grams")
+                last_logged_weight = average_stable_weight
+
+            # Prompt to change ingredient after capture
+            display_label.config(text="Please change the ingredient and wait...")
+            time.sleep(2)
+            # The zero tracker keeps the empty scale at 0, but don't insist on exactly 0
+            while get_weight_reading() > stability_threshold:
+                hx.wait_for_new_sample(timeout=0.5)  # Wait until scale is empty
+            display_label.config(text="Add next ingredient...")
+            stable_count = 0
 
         else:
             time.sleep(0.1)  # Idle when monitoring is off
@@ -315,6 +356,15 @@ def main():
     try:
         load_reference_unit()
         initialize_scale()  # Set new zero reading at start
+        # Buffer conversions in the background from now on, dropping
+        # saturated readings before they reach the buffer.
+        hx.start_continuous(filters=FilterPipeline([SaturationFilter()]))
+        # The empty scale's spread over a few seconds is this load cell's
+        # noise: the glitch filter's floor and the estimator's measurement noise
+        noise = estimate_noise(hx.get_buffered_values(NOISE_SAMPLES, timeout=15))
+        hx.set_filter_pipeline(FilterPipeline([SaturationFilter(), HampelFilter(window=7, min_deviation=noise)]))
+        # Track weight, rate and variance per sample
+        hx.set_estimator(KalmanWeightEstimator(measurement_noise=noise))
         print("Scale ready. Starting real-time GUI with auto-capture on stabilization...")
         start_gui()
     except KeyboardInterrupt:
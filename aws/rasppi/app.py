@@ -7,12 +7,20 @@ import os
 from datetime import datetime
 import logging
 from botocore.exceptions import ClientError
-from openai import OpenAI
+from openai import AsyncOpenAI
 import requests
 import time
 from dotenv import load_dotenv
 from typing import Optional, Dict, Any
 import json
+import asyncio
+
+# The HX711 driver is optional: without it (or without a scale attached)
+# the serving size is asked for instead.
+try:
+    from hx711 import HX711
+except ImportError:
+    HX711 = None
 
 # Load environment variables
 load_dotenv()
@@ -126,7 +134,7 @@ class CameraS3Uploader:
 
 class NutritionAnalyzer:
     def __init__(self):
-        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.openai_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
         self.nutritionix_app_id = os.getenv('NUTRITIONIX_APP_ID')
         self.nutritionix_api_key = os.getenv('NUTRITIONIX_API_KEY')
         self.nutritionix_api_url = "https://trackapi.nutritionix.com/v2/natural/nutrients"
@@ -174,11 +182,79 @@ class NutritionAnalyzer:
             raise
 
 
+class Scale:
+    # Construction waits for the HX711 to settle and may tare, so it blocks;
+    # build it off the event loop, e.g. with asyncio.to_thread(open_scale).
+    # Every read has a deadline, so a missing HX711 raises TimeoutError
+    # instead of blocking forever
+    def __init__(self):
+        dout = int(os.getenv('HX711_DOUT_PIN', '5'))
+        pd_sck = int(os.getenv('HX711_PD_SCK_PIN', '6'))
+        self.timeout = float(os.getenv('HX711_READ_TIMEOUT', '2'))
+        self.hx = HX711(dout, pd_sck, read_timeout=self.timeout)
+        self.hx.set_reading_format("MSB", "MSB")
+        self.hx.set_reference_unit(float(os.getenv('HX711_REFERENCE_UNIT', '1')))
+
+        offset = os.getenv('HX711_OFFSET')
+        if offset is not None:
+            self.hx.set_offset(float(offset))
+        else:
+            logger.info("Taring the scale, make sure it is empty")
+            self.hx.tare()
+
+        # Keep sampling in the background so weights can be awaited
+        self.hx.start_continuous()
+
+    async def read_weight(self, times: int = 15) -> float:
+        """Weight in grams, awaited without blocking the event loop"""
+        weight = await asyncio.wait_for(self.hx.read_weight(times), self.timeout)
+        return max(0.0, weight)
+
+    def close(self) -> None:
+        self.hx.stop_continuous()
+
+
+# Opening the scale is a read to set the gain, a second to settle and a tare
+SCALE_OPEN_TIMEOUT = 10.0
+
+
+def open_scale() -> Optional[Scale]:
+    """Open the HX711 scale, or return None if it isn't available"""
+    if HX711 is None:
+        return None
+
+    try:
+        return Scale()
+    except TimeoutError:
+        logger.warning("No HX711 answering, serving size will be asked for")
+        return None
+    except Exception as e:
+        logger.warning(f"Scale unavailable, serving size will be asked for: {e}")
+        return None
+
+
+def ask_serving_grams() -> float:
+    """Ask the user for the serving size in grams"""
+    while True:
+        try:
+            serving_input = input("Enter the serving size in grams: ")
+            serving_grams = float(serving_input)
+            if serving_grams <= 0:
+                raise ValueError("Serving size must be positive")
+            return serving_grams
+        except ValueError as e:
+            print(f"Invalid input: {e}. Please enter a positive number.")
+
+
 async def main() -> None:
     local_filename: Optional[str] = None
     uploader: Optional[CameraS3Uploader] = None
+    scale: Optional[Scale] = None
+    scale_task: Optional[asyncio.Task] = None
     
     try:
+        # Set up (and tare) the scale in a worker thread while the camera works
+        scale_task = asyncio.create_task(asyncio.to_thread(open_scale))
         uploader = CameraS3Uploader()
         analyzer = NutritionAnalyzer()
         
@@ -196,20 +272,25 @@ async def main() -> None:
         object_key = uploader.upload_to_s3(local_filename)
         img_url = uploader.generate_url(object_key)
         
+        # Weigh the food while the image is being analyzed
+        scale = await scale_task
+        weight_task = asyncio.create_task(scale.read_weight()) if scale else None
+
         # Analyze image and get food name
         food_name = await analyzer.analyze_image(img_url)
         print(f"Detected food: {food_name}")
         
-        # Get serving size from user
-        while True:
+        # Get serving size from the scale, or from the user without one
+        serving_grams = 0.0
+        if weight_task:
             try:
-                serving_input = input("Enter the serving size in grams: ")
-                serving_grams = float(serving_input)
-                if serving_grams <= 0:
-                    raise ValueError("Serving size must be positive")
-                break
-            except ValueError as e:
-                print(f"Invalid input: {e}. Please enter a positive number.")
+                serving_grams = await weight_task
+            except (asyncio.TimeoutError, TimeoutError, RuntimeError) as e:
+                logger.warning(f"Couldn't read the scale, serving size will be asked for: {e}")
+        if serving_grams > 0:
+            print(f"Serving size from the scale: {serving_grams:.1f} grams")
+        else:
+            serving_grams = ask_serving_grams()
         
         # Get nutrition information
         nutrition_data = analyzer.get_nutrition_info(food_name, serving_grams)
@@ -240,7 +321,14 @@ async def main() -> None:
     finally:
         if local_filename and uploader:
             uploader.cleanup(local_filename)
+        # A scale still being opened gives up within its read timeouts
+        if scale is None and scale_task is not None:
+            try:
+                scale = await asyncio.wait_for(scale_task, SCALE_OPEN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("Gave up waiting for the scale to open")
+        if scale:
+            await asyncio.to_thread(scale.close)
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
\ No newline at end of file
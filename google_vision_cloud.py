@@ -9,14 +9,15 @@ from datetime import datetime
 from google.cloud import vision
 from google.cloud.vision import types
 import RPi.GPIO as GPIO
-from hx711 import HX711
+from hx711 import HX711, ZeroTracker
 from picamera2 import Picamera2
 from tkinter import Tk, Label, Button, Frame
 from threading import Thread
 from statistics import mean
 from collections import Counter
 
-BASE_DIR = "/home/xm23917/Desktop/weight/hx711py"
+# Data lives in weight/hx711py unless SCALE_BASE_DIR says otherwise
+BASE_DIR = os.environ.get("SCALE_BASE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "weight", "hx711py"))
 ZERO_READING_FILE = os.path.join(BASE_DIR, "zero_reading.json")
 CALIBRATION_FILE = os.path.join(BASE_DIR, "calibration_data.json")
 IMAGES_DIR = os.path.join(BASE_DIR, "images")
@@ -32,6 +33,8 @@ NUTRITIONIX_API_KEY = "5e7a357053959ca39c053ba924460cc9"
 # Initialize HX711, Camera, and Nutrition Variables
 hx = HX711(5, 6)
 hx.set_reading_format("MSB", "MSB")
+# Keep the empty scale at zero as the load cell drifts.
+hx.set_zero_tracker(ZeroTracker())
 camera = Picamera2()
 camera.configure(camera.create_still_configuration())
 total_nutrition = {
@@ -241,7 +244,8 @@ def monitor_weight(display_label, stability_threshold=1, stabilization_time=1):
                 # Prompt to change ingredient after capture
                 display_label.config(text="Please change the ingredient and wait...")
                 time.sleep(2)
-                while get_weight_reading() != 0:
+                # The zero tracker keeps the empty scale at 0, but don't insist on exactly 0
+                while get_weight_reading() > stability_threshold:
                     time.sleep(0.1)  # Wait until scale is empty
                 display_label.config(text="Add next ingredient...")
 
@@ -0,0 +1,33 @@
+import os
+import sys
+import RPi.GPIO as GPIO
+from hx711_daemon import serve
+from hx711_realtime import RealtimeProfile, isolated_cpus
+
+'''
+Runs the HX711 on DOUT BCM 5 / PD_SCK BCM 6 in this process and publishes
+its samples through shared memory, for hx711_daemon.HX711Client to read from
+the capture scripts.
+
+Usage: python acquisition_daemon.py [name] [realtime]
+
+With "realtime" the daemon reads under a RealtimeProfile: pinned to an
+isolated CPU (the last one if none is isolated), SCHED_FIFO priority 50,
+memory locked and the garbage collector paused during reads.  Run it as root
+for the priority and the memory lock.
+
+Stop it with Ctrl+C.
+'''
+
+name = sys.argv[1] if len(sys.argv) > 1 else "hx711"
+
+realtime = None
+if len(sys.argv) > 2 and sys.argv[2] == "realtime":
+    realtime = RealtimeProfile(cpus=isolated_cpus() or {os.cpu_count() - 1}, priority=50,
+                               lock_memory=True, pause_gc=True)
+
+print("Publishing HX711 samples as \"%s\", Ctrl+C to stop..." % name)
+serve(5, 6, name=name, realtime=realtime)
+
+GPIO.cleanup()
+print("Bye!")
@@ -3,7 +3,8 @@ import time
 import sys
 import json
 import RPi.GPIO as GPIO
-from hx711 import HX711
+from hx711 import HX711, ZeroTracker
+from hx711_calibration import warm_start, get_registry, default_device
 from picamera2 import Picamera2
 from tkinter import Tk, Label
 from threading import Thread
@@ -12,18 +13,35 @@ from collections import Counter
 
 
 # Define file paths
-BASE_DIR = "/home/xm23917/Desktop/weight/hx711py"
+# Data lives next to the scripts unless SCALE_BASE_DIR says otherwise
+BASE_DIR = os.environ.get("SCALE_BASE_DIR", os.path.dirname(os.path.abspath(__file__)))
 ZERO_READING_FILE = os.path.join(BASE_DIR, "zero_reading.json")
 CALIBRATION_FILE = os.path.join(BASE_DIR, "calibration_data.json")
 IMAGES_DIR = os.path.join(BASE_DIR, "images")
 WEIGHT_LOG_FILE = os.path.join(BASE_DIR, "weight_data.json")
+REGISTRY_FILE = os.path.join(BASE_DIR, "calibration_registry.json")
+
+# This scale in the calibration registry: station, load cell/HX711 and channel.
+# Set SCALE_CHIP to the load cell's serial number to let its calibration follow it to other stations
+SCALE_CHIP = os.environ.get("SCALE_CHIP")
+SCALE_KEY = (os.environ.get("SCALE_DEVICE") or default_device(), SCALE_CHIP or "hx711-5-6", "A")
+registry = get_registry(REGISTRY_FILE)
+# A registry file that can't be used is left for someone to look at: carrying
+# on without it would mean calibrating from scratch, and the registry won't save
+if registry.get_error() is not None:
+    sys.exit(f"Can't use the calibration registry {REGISTRY_FILE} ({registry.get_error()}). "
+             "Fix it or move it away, then start again.")
 
 # Ensure image directory exists
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
 # Initialize HX711 and Camera
-hx = HX711(5, 6)
+hx = HX711(5, 6, read_timeout=1.0, settle_time=0)
 hx.set_reading_format("MSB", "MSB")
+# Power-cycle the HX711 if it stops answering.
+hx.set_auto_reset()
+# Keep the empty scale at zero as the load cell drifts.
+hx.set_zero_tracker(ZeroTracker())
 camera = Picamera2()
 camera.configure(camera.create_still_configuration())
 
@@ -39,7 +57,12 @@ GPIO.setwarnings(False)
 
 # Function to get a single weight reading
 def get_weight_reading():
-    reading = hx.get_weight(5)
+    try:
+        reading = hx.get_weight(5)
+    except TimeoutError:
+        # Unplugged or dead sensor: read as empty rather than hang the GUI.
+        print("Scale not responding, check the HX711 wiring.")
+        return 0
     return max(0, reading)  # Ensure no negative values
 
 # Function to calculate the mode-like average within 1g tolerance
@@ -52,29 +75,33 @@ def get_mode_average(weights, tolerance=1):
 
 # Function to initialize scale with a new zero reading every time the code runs
 def initialize_scale():
+    # Reuse the saved zero if a few quick samples say it still holds.
+    result = warm_start(hx, tare=False, registry=registry, key=SCALE_KEY)
+    if result["warm"]:
+        print(f"Zero reading from {REGISTRY_FILE} still good (drift {result['drift']:+.2f} g).")
+        return
+
     print("Please ensure the scale is empty. Setting zero reading in:")
     for i in range(3, 0, -1):
         print(i)
         time.sleep(1)
 
     hx.tare()
-    zero_reading = hx.get_offset()
-    with open(ZERO_READING_FILE, "w") as f:
-        json.dump({"zero_reading": zero_reading}, f, indent=4)
-    print(f"Zero reading saved for future use in {ZERO_READING_FILE}")
+    registry.set_zero(*SCALE_KEY, hx.get_offset())
+    print(f"Zero reading saved for future use in {REGISTRY_FILE}")
 
-# Function to load the calibration reference unit
+# Function to load the calibration profile from the registry
 def load_reference_unit():
-    try:
-        with open(CALIBRATION_FILE, "r") as f:
-            calibration_data = json.load(f)
-        reference_unit = calibration_data["reference_unit"]
-        print(f"Loaded reference unit: {reference_unit}")
-        hx.set_reference_unit(reference_unit)
-    except (FileNotFoundError, KeyError):
+    # Bring over this station's old calibration and zero files the first time
+    registry.import_files(*SCALE_KEY, calibration_file=CALIBRATION_FILE, zero_file=ZERO_READING_FILE)
+    profile = registry.get_profile(*SCALE_KEY, follow_chip=SCALE_CHIP is not None)
+    if profile is None:
         print("Calibration data not found. Please calibrate the scale.")
-        reference_unit = reset_calibration()
-    return reference_unit
+        return reset_calibration()
+
+    hx.set_calibration(profile)
+    print(f"Loaded calibration: {profile}")
+    return profile.get_reference_unit()
 
 # Function to capture image and log weight
 def capture_and_log_image(weight, image_number):
@@ -143,7 +170,8 @@ def monitor_weight(display_label, stability_threshold=1, stabilization_time=1):
             if capturing:
                 display_label.config(text="Please change the ingredient and wait...")
                 time.sleep(2)
-                while get_weight_reading() != 0:
+                # The zero tracker keeps the empty scale at 0, but don't insist on exactly 0
+                while get_weight_reading() > stability_threshold:
                     time.sleep(0.1)  # Wait until scale is empty
                 display_label.config(text="Add next ingredient...")
                 capturing = False
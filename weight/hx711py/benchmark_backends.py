@@ -0,0 +1,75 @@
+import sys
+import time
+import hx711
+from hx711 import HX711
+from hx711_backends import FakeGPIOBackend, RPiGPIOBackend, GpiodBackend, GpiomemBackend
+
+'''
+Compares the GPIO backends in hx711_backends.py.
+
+Usage: python benchmark_backends.py [samples] [--fake-only]
+
+For every backend that can be opened on this machine it reads the given
+amount of samples (200 by default) and reports:
+
+- bits/s: clock pulses per second while clocking a sample out, which is what
+  the backend's clock_bit() can sustain.
+- read us: per-sample read latency, from DOUT going low to the value being
+  available, i.e. without the wait for the conversion itself.
+
+The fake backend always runs, so this also works on a plain Linux box.
+Pins are BCM 5 (DOUT) and 6 (PD_SCK), like the examples.
+'''
+
+DOUT_PIN = 5
+PD_SCK_PIN = 6
+
+SAMPLES = 200
+FAKE_ONLY = False
+for arg in sys.argv[1:]:
+    if arg == "--fake-only":
+        FAKE_ONLY = True
+    else:
+        SAMPLES = int(arg)
+
+
+def openBackends():
+    backends = [("fake", FakeGPIOBackend)]
+    if not FAKE_ONLY:
+        backends += [("RPi.GPIO", RPiGPIOBackend),
+                     ("gpiod", GpiodBackend),
+                     ("gpiomem", GpiomemBackend)]
+
+    for name, backendClass in backends:
+        try:
+            yield name, backendClass()
+        except (ImportError, OSError, RuntimeError) as e:
+            print("%-9s | unavailable: %s" % (name, e))
+
+
+def benchmark(backend):
+    hx = HX711(DOUT_PIN, PD_SCK_PIN, wait_strategy=hx711.WAIT_POLL, backend=backend)
+    bitsPerSample = 24 + hx.GAIN
+
+    readTimes = []
+    for i in range(SAMPLES):
+        hx.waitUntilReady()
+        start = time.perf_counter()
+        hx.read_long()
+        readTimes.append(time.perf_counter() - start)
+
+    readTimes.sort()
+    total = sum(readTimes)
+    median = readTimes[len(readTimes) // 2]
+    worst = readTimes[-1]
+
+    return bitsPerSample * SAMPLES / total, median, worst
+
+
+print("backend   | bits/s    | median read us | worst read us")
+for name, backend in openBackends():
+    try:
+        bitsPerSecond, median, worst = benchmark(backend)
+        print("%-9s | %9.0f | %14.1f | %13.1f" % (name, bitsPerSecond, median * 1e6, worst * 1e6))
+    finally:
+        backend.cleanup()
@@ -0,0 +1,84 @@
+import sys
+import time
+import random
+import hx711
+from hx711 import HX711, AdaptiveDutyCycle
+from hx711_backends import FakeGPIOBackend
+
+'''
+Measures the power/latency tradeoff of AdaptiveDutyCycle settings.
+
+Usage: python benchmark_duty_cycle.py [sample_rate]
+
+Runs the same scripted session against a simulated HX711 (FakeGPIOBackend)
+for every setting, in real time: the scale sits empty, a 200 g item is put
+on it, then removed again.  For each setting it reports:
+
+- reads/s: samples the acquisition thread clocked out.
+- powered down: share of the session the chip spent powered down.  At about
+  1.5 mA active and under 1 uA powered down, that's also the share of the
+  HX711's supply current saved.
+- wake ms: time from placing the item until the first buffered sample shows
+  at least half of its weight.
+'''
+
+SAMPLE_RATE = float(sys.argv[1]) if len(sys.argv) > 1 else 80.0
+
+REFERENCE_UNIT = 100
+OFFSET = 50000
+ITEM_GRAMS = 200
+PLACE_AT = 3.0
+REMOVE_AT = 5.0
+DURATION = 8.0
+
+SETTINGS = [
+    ("always on", None),
+    ("idle 0.25s", AdaptiveDutyCycle(idle_interval=0.25, idle_after=1.0)),
+    ("idle 0.5s, power down", AdaptiveDutyCycle(idle_interval=0.5, idle_after=1.0, power_down=True)),
+    ("idle 1s, power down", AdaptiveDutyCycle(idle_interval=1.0, idle_after=1.0, power_down=True)),
+]
+
+
+def run(dutyCycle):
+    start = time.monotonic()
+
+    def source(gain):
+        elapsed = time.monotonic() - start
+        grams = ITEM_GRAMS if PLACE_AT <= elapsed < REMOVE_AT else 0
+        return OFFSET + grams * REFERENCE_UNIT + random.randint(-50, 50)
+
+    backend = FakeGPIOBackend()
+    chip = backend.add_chip(5, 6, sample_source=source, sample_rate=SAMPLE_RATE)
+
+    hx = HX711(5, 6, backend=backend)
+    hx.set_reference_unit(REFERENCE_UNIT)
+    hx.set_offset(OFFSET)
+
+    start = time.monotonic()
+    poweredDownStart = chip.powered_down_time(start)
+    hx.start_continuous(buffer_size=1024, duty_cycle=dutyCycle)
+
+    wakeLatency = None
+    seenSamples = 0
+    while time.monotonic() - start < DURATION:
+        hx.wait_for_new_sample(timeout=0.05)
+        samples = hx.get_buffered_samples()
+        for timestamp, value in samples[seenSamples:]:
+            elapsed = timestamp - start
+            if (wakeLatency is None and elapsed >= PLACE_AT and
+                    (value - OFFSET) / REFERENCE_UNIT >= ITEM_GRAMS / 2):
+                wakeLatency = elapsed - PLACE_AT
+        seenSamples = len(samples)
+
+    hx.stop_continuous()
+    end = time.monotonic()
+
+    poweredDown = chip.powered_down_time(end) - poweredDownStart
+    return hx.sampleCount / (end - start), poweredDown / (end - start), wakeLatency
+
+
+print("setting               | reads/s | powered down | wake ms")
+for name, dutyCycle in SETTINGS:
+    readsPerSecond, poweredDownShare, wakeLatency = run(dutyCycle)
+    wake = "%7.0f" % (wakeLatency * 1000) if wakeLatency is not None else "  never"
+    print("%-21s | %7.1f | %11.0f%% | %s" % (name, readsPerSecond, poweredDownShare * 100, wake))
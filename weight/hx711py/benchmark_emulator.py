@@ -0,0 +1,92 @@
+import itertools
+import sys
+import time
+import hx711
+from hx711_backends import FakeGPIOBackend
+from hx711_emulator import HX711
+
+'''
+Runs a day of emulated scale traffic on the virtual clock.
+
+Usage: python benchmark_emulator.py [hours] [sample_rate]
+
+Reads every conversion an 80 SPS (by default) HX711 would produce in
+`hours` simulated hours, first through read_raw_int() and then through
+get_weight(5), and reports how much faster than real time that ran.  Each
+pass is run twice with the same seed to check that the emulator gives the
+same numbers both times.
+
+Before timing, it checks that the emulator and hx711.HX711 on
+FakeGPIOBackend return the same readRawBytes() and read_raw_int() for the
+same samples in all four byte/bit reading formats.
+'''
+
+HOURS = float(sys.argv[1]) if len(sys.argv) > 1 else 24.0
+SAMPLE_RATE = float(sys.argv[2]) if len(sys.argv) > 2 else 80.0
+
+SEED = 711
+REFERENCE_UNIT = 1000
+FORMAT_SAMPLES = 200
+
+
+def run(read, reads):
+    hx = HX711(5, 6, seed=SEED, sample_rate=SAMPLE_RATE)
+    hx.set_reference_unit(REFERENCE_UNIT)
+    hx.tare()
+
+    simulatedStart = hx.clock.now()
+    checksum = 0.0
+    start = time.perf_counter()
+    for i in range(reads):
+        checksum += read(hx)
+    elapsed = time.perf_counter() - start
+
+    return hx.clock.now() - simulatedStart, elapsed, checksum
+
+
+def makeDriver(values):
+    # hx711.HX711 on a fake chip whose conversions hand out values in turn,
+    # after the conversion the chip makes while the driver powers it up.  A
+    # clock pulse stretched by the scheduler mustn't power the chip down and
+    # cost a value, so that's off.
+    backend = FakeGPIOBackend()
+    source = itertools.chain([0], values)
+    backend.add_chip(5, 6, sample_source=lambda gain: next(source), power_down_time=None)
+    return hx711.HX711(5, 6, wait_strategy=hx711.WAIT_BUSY, backend=backend, settle_time=0)
+
+
+def checkFormats():
+    # The emulator in the default MSB/MSB format hands out the samples as
+    # they are; replay them through fake chips and compare the driver with
+    # fresh emulators, seeded the same, in every format.
+    reference = HX711(5, 6, seed=SEED, sample_rate=SAMPLE_RATE)
+    values = [reference.read_raw_int() for i in range(FORMAT_SAMPLES)]
+
+    for byteFormat in ("MSB", "LSB"):
+        for bitFormat in ("MSB", "LSB"):
+            for readName in ("readRawBytes", "read_raw_int"):
+                driver = makeDriver(values)
+                emulated = HX711(5, 6, seed=SEED, sample_rate=SAMPLE_RATE)
+                driver.set_reading_format(byteFormat, bitFormat)
+                emulated.set_reading_format(byteFormat, bitFormat)
+
+                for value in values:
+                    if getattr(driver, readName)() != getattr(emulated, readName)():
+                        raise AssertionError("%s/%s %s() mismatch for %d" % (byteFormat, bitFormat, readName, value))
+
+                driver.backend.cleanup()
+
+
+checkFormats()
+
+conversions = int(HOURS * 3600 * SAMPLE_RATE)
+
+print("path          | simulated h | wall s | x real time | us/read | repeatable")
+for name, read, readsPerCall in (("read_raw_int", lambda hx: hx.read_raw_int(), 1),
+                                 ("get_weight(5)", lambda hx: hx.get_weight(5), 5)):
+    simulated, elapsed, checksum = run(read, conversions // readsPerCall)
+    _, _, repeatChecksum = run(read, conversions // readsPerCall)
+    print("%-13s | %11.2f | %6.2f | %11.0f | %7.2f | %s" % (name, simulated / 3600, elapsed,
+                                                          simulated / elapsed,
+                                                          elapsed * 1e6 / conversions,
+                                                          "yes" if checksum == repeatChecksum else "NO"))
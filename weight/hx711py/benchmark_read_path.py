@@ -0,0 +1,163 @@
+import itertools
+import random
+import statistics
+import sys
+import time
+import timeit
+import hx711
+from hx711 import HX711
+from hx711_backends import GPIOBackend, FakeGPIOBackend
+
+sys.path.insert(0, "breakoutcodes")
+import hx711v0_5_1
+
+'''
+Microbenchmark of the sample read path against FakeGPIOBackend.
+
+Usage: python benchmark_read_path.py [samples]
+
+Compares, for both drivers and every reading format, the legacy path
+(readRawBytes() followed by joining the bytes and converting from two's
+complement) with the read_raw_int()/readRawInt() fast path.
+
+The timings run on StubBackend, which hands out precomputed bits at next to
+no cost and is always ready, so what's measured is the driver's own Python
+work per read: FakeGPIOBackend's chip simulation costs far more than that
+and its jitter drowns the difference.  The "floor" is what the stub's bit
+clocking costs on its own; the driver overhead of each path, in brackets,
+is what comes on top of it.  The floor and both paths are timed in turns,
+in the same loop, and an overhead smaller than the floor's own jitter
+("noise") is reported as such rather than as a number.  All times are us
+per sample.  Before timing, it checks on FakeGPIOBackend that both paths
+return the same values.
+'''
+
+SAMPLES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+ROUNDS = 50
+
+
+def makeBackend():
+    backend = FakeGPIOBackend()
+    # Walk through positive and negative values so every bit gets exercised.
+    counter = iter(range(10 ** 9))
+    # A zero conversion time is only safe with one trailing gain pulse, which
+    # is what gain 128 uses.
+    backend.add_chip(5, 6, sample_source=lambda gain: (next(counter) * 7919) % 0x1000000 - 0x800000,
+                     conversion_time=0.0, power_down_time=None)
+    return backend
+
+
+class StubBackend(GPIOBackend):
+
+    # A chip that is always ready and clocks out `words` over and over, each
+    # 24 data bits plus the one gain pulse of gain 128, at the cost of one
+    # call per bit (clock_bit()) or per read (shift_in()).
+
+    def __init__(self, words):
+        bits = [(word >> shift) & 1 for word in words for shift in range(24, -1, -1)]
+        self.nextBit = itertools.cycle(bits).__next__
+        self.nextWord = itertools.cycle(words).__next__
+
+    def setup_output(self, pin):
+        pass
+
+    def setup_input(self, pin):
+        pass
+
+    def write(self, pin, value):
+        pass
+
+    def read(self, pin):
+        return 0
+
+    def clock_bit(self, sck, dout):
+        return self.nextBit()
+
+    def shift_in(self, sck, dout, count):
+        return self.nextWord()
+
+
+def makeStubBackend():
+    generator = random.Random(1)
+    return StubBackend([generator.getrandbits(24) << 1 for i in range(1024)])
+
+
+def legacyLong(dataBytes):
+    twosComplementValue = ((dataBytes[0] << 16) |
+                           (dataBytes[1] << 8)  |
+                           dataBytes[2])
+    return -(twosComplementValue & 0x800000) + (twosComplementValue & 0x7fffff)
+
+
+def timeInterleaved(funcs):
+    # Time every function in short blocks, taking turns, so that clock
+    # speed changes and background load hit them all alike.  The best block
+    # of each is its time, in us per sample; how far the first one's median
+    # block is from its best is returned as the noise.
+    block = max(1, SAMPLES // ROUNDS)
+    blocks = [[] for func in funcs]
+    for i in range(ROUNDS):
+        for func, times in zip(funcs, blocks):
+            times.append(timeit.timeit(func, number=block) * 1e6 / block)
+    return [min(times) for times in blocks], statistics.median(blocks[0]) - min(blocks[0])
+
+
+def overhead(total, floor, noise):
+    # What a path costs on top of the floor, or None when that is lost in
+    # the noise of the floor itself.
+    return total - floor if total - floor > noise else None
+
+
+def run(label, hx, legacyRead, fastRead, setFormat):
+    backend = hx.backend
+    shiftIn = lambda: backend.shift_in(hx.PD_SCK, hx.DOUT, 25)
+
+    for byteFormat in ("MSB", "LSB"):
+        for bitFormat in ("MSB", "LSB"):
+            setFormat(byteFormat, bitFormat)
+
+            (floor, legacy, fast), noise = timeInterleaved((shiftIn, legacyRead, fastRead))
+            legacyOverhead = overhead(legacy, floor, noise)
+            fastOverhead = overhead(fast, floor, noise)
+
+            if legacyOverhead is not None and fastOverhead is not None:
+                speedup = "%6.1fx" % (legacyOverhead / fastOverhead)
+            else:
+                speedup = "     -"
+
+            print("%-6s | %s/%s | %8.2f | %6.2f | %8.2f %-9s | %8.2f %-9s | %s" % (
+                label, byteFormat, bitFormat, floor, noise,
+                legacy, "(+%.2f)" % legacyOverhead if legacyOverhead is not None else "(noise)",
+                fast, "(+%.2f)" % fastOverhead if fastOverhead is not None else "(noise)",
+                speedup))
+
+
+def check(hx, readBytes, readInt, setFormat):
+    for byteFormat in ("MSB", "LSB"):
+        for bitFormat in ("MSB", "LSB"):
+            setFormat(byteFormat, bitFormat)
+            chip = hx.backend.get_chip(5)
+            source = chip.sampleSource
+            for value in (0, 1, -1, 0x7fffff, -0x800000, 0x123456, -0x123456):
+                chip.sampleSource = lambda gain: value
+                # The chip latched its next conversion during the last read.
+                readInt()
+                if legacyLong(readBytes()) != readInt():
+                    raise AssertionError("%s/%s mismatch for %d" % (byteFormat, bitFormat, value))
+            chip.sampleSource = source
+
+
+legacyHx = HX711(5, 6, wait_strategy=hx711.WAIT_BUSY, backend=makeBackend())
+newHx = hx711v0_5_1.HX711(5, 6, backend=makeBackend())
+
+check(legacyHx, legacyHx.readRawBytes, legacyHx.read_raw_int, legacyHx.set_reading_format)
+check(newHx, newHx.readRawBytes, newHx.readRawInt, newHx.setReadingFormat)
+
+legacyHx = HX711(5, 6, wait_strategy=hx711.WAIT_BUSY, backend=makeStubBackend(), settle_time=0)
+newHx = hx711v0_5_1.HX711(5, 6, backend=makeStubBackend())
+
+print("driver | format  | floor    | noise  | legacy (overhead)  | fast (overhead)    | speedup")
+run("hx711", legacyHx, lambda: legacyLong(legacyHx.readRawBytes()), legacyHx.read_raw_int,
+    legacyHx.set_reading_format)
+run("v0.5.1", newHx, lambda: newHx.rawBytesToLong(newHx.readRawBytes()), newHx.readRawInt,
+    newHx.setReadingFormat)
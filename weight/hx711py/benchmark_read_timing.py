@@ -0,0 +1,80 @@
+import sys
+import json
+import time
+import threading
+import hx711
+from hx711 import HX711
+from hx711_backends import FakeGPIOBackend, RPiGPIOBackend
+
+'''
+Shows how background work in the same process hurts HX711 reads.
+
+Usage: python benchmark_read_timing.py [samples] [load threads] [--hardware]
+
+Reads the given amount of samples (400 by default) with read timing on,
+first with nothing else running and then with threads that keep encoding
+JSON, the way the capture scripts log results.  For each run it reports the
+read_timing counters: reads that held PD_SCK high past the 50us datasheet
+limit, how many were retried, how many ran out of retries, and the max and
+p99 read time and jitter (longest PD_SCK high time per read).
+
+By default it reads a simulated 80 SPS chip on FakeGPIOBackend, which powers
+down like the real one when PD_SCK stays high past 60us, so it also runs on
+a plain Linux box.  With --hardware it reads a real HX711 through RPi.GPIO
+instead, on BCM 5 (DOUT) and 6 (PD_SCK).
+'''
+
+HARDWARE = "--hardware" in sys.argv[1:]
+ARGS = [arg for arg in sys.argv[1:] if arg != "--hardware"]
+SAMPLES = int(ARGS[0]) if len(ARGS) > 0 else 400
+LOAD_THREADS = int(ARGS[1]) if len(ARGS) > 1 else 2
+
+RECORD = {"ingredient": "flour", "weight": 123.4, "nutrition": {"kcal": 364, "protein": 10.3}}
+
+
+def jsonLoad(stop):
+    while not stop.is_set():
+        json.dumps([RECORD] * 200)
+
+
+def run(label, threads):
+    stop = threading.Event()
+    workers = [threading.Thread(target=jsonLoad, args=(stop,), daemon=True) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+
+    hx.enable_read_timing()
+    for i in range(SAMPLES):
+        hx.read_raw_int()
+    stats = hx.get_read_stats()
+
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    print("%-10s | %5d | %10d | %7d | %5d | %6.0f | %6.0f | %6.0f | %6.0f" % (
+        label, stats["reads"], stats["violations"], stats["retries"], stats["drops"],
+        stats["read_time_max"] * 1e6, stats["read_time_p99"] * 1e6,
+        stats["jitter_max"] * 1e6, stats["jitter_p99"] * 1e6))
+
+
+if HARDWARE:
+    backend = RPiGPIOBackend()
+else:
+    backend = FakeGPIOBackend()
+    backend.add_chip(5, 6, sample_rate=80.0)
+
+hx = HX711(5, 6, wait_strategy=hx711.WAIT_POLL, backend=backend)
+hx.set_reading_format("MSB", "MSB")
+
+try:
+    print("                                                    |  read us        | jitter us")
+    print("load       | reads | violations | retries | drops |    max |    p99 |    max |    p99")
+    run("idle", 0)
+    run("%d x json" % LOAD_THREADS, LOAD_THREADS)
+
+except (KeyboardInterrupt, SystemExit):
+    pass
+
+finally:
+    backend.cleanup()
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import threading
+import multiprocessing
+import hx711
+from hx711 import HX711
+from hx711_backends import EdgeTimingBackend
+from hx711_realtime import RealtimeProfile, isolated_cpus
+from hx711_stats import percentileOf
+
+'''
+Compares PD_SCK jitter of the acquisition thread under each real-time
+profile, with the machine kept busy.
+
+Usage: python benchmark_realtime.py [seconds per profile] [cpu hogs]
+
+The driver reads an EdgeTimingBackend, a fake GPIO backend that records
+every PD_SCK edge, so this runs anywhere, but the numbers that matter come
+from the Pi the scale runs on.  While each profile runs, threads in this
+process keep allocating cyclic garbage (the collector's favourite food) and
+`cpu hogs` processes (one per CPU by default) spin on every core.  For each
+profile it reports how many pulses were clocked, the p99, p99.9 and max time
+PD_SCK stayed high, and how many pulses broke the 50us datasheet limit or
+were long enough (60us) to power a real chip down.
+
+The priority and memory lock need root; without it the profile says so and
+runs without them.
+'''
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+CPU_HOGS = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+CPU = isolated_cpus() or {os.cpu_count() - 1}
+
+PROFILES = [
+    ("default", None),
+    ("gc paused", RealtimeProfile(pause_gc=True)),
+    ("pinned fifo", RealtimeProfile(cpus=CPU, priority=50)),
+    ("full", RealtimeProfile(cpus=CPU, priority=50, lock_memory=True, pause_gc=True)),
+]
+
+
+def cpuHog(stop):
+    while not stop.is_set():
+        sum(range(10000))
+
+
+def garbageLoad(stop):
+    while not stop.is_set():
+        nodes = [{} for i in range(2000)]
+        for i, node in enumerate(nodes):
+            node["next"] = nodes[i - 1]
+
+
+def run(label, profile):
+    backend = EdgeTimingBackend(conversion_time=0.001)
+    hx = HX711(5, 6, wait_strategy=hx711.WAIT_POLL, backend=backend)
+    hx.set_reading_format("MSB", "MSB")
+
+    backend.clear()
+    hx.start_continuous(realtime=profile)
+    time.sleep(SECONDS)
+    hx.stop_continuous()
+
+    highTimes = backend.high_times()
+    print("%-11s | %7d | %6.1f | %6.1f | %7.1f | %7d | %7d" % (
+        label, len(highTimes),
+        percentileOf(highTimes, 0.99) * 1e6, percentileOf(highTimes, 0.999) * 1e6,
+        max(highTimes) * 1e6,
+        sum(1 for high in highTimes if high > 50e-6),
+        sum(1 for high in highTimes if high > 60e-6)))
+
+
+if __name__ == '__main__':
+    stop = multiprocessing.Event()
+    hogs = [multiprocessing.Process(target=cpuHog, args=(stop,), daemon=True) for i in range(CPU_HOGS)]
+    workers = [threading.Thread(target=garbageLoad, args=(stop,), daemon=True) for i in range(2)]
+    for worker in hogs + workers:
+        worker.start()
+
+    try:
+        print("%d CPU hogs, 2 garbage threads, %.0f s per profile, real-time CPU %s" % (CPU_HOGS, SECONDS, CPU))
+        print("            |         |  PD_SCK high us            | pulses over")
+        print("profile     |  pulses |    p99 |  p99.9 |     max |    50us |    60us")
+        for label, profile in PROFILES:
+            run(label, profile)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        stop.set()
+        for worker in hogs + workers:
+            worker.join()
@@ -0,0 +1,176 @@
+import sys
+import time
+import multiprocessing
+from statistics import mean
+from collections import Counter
+from hx711_emulator import HX711, no_load
+from hx711_stats import KalmanWeightEstimator, estimate_noise, NOISE_SAMPLES, STABLE_SAMPLES
+from hx711_scenarios import random_scenario
+
+'''
+Benchmarks stability detection over random emulated scale sessions.
+
+Usage: python benchmark_scenarios.py [scenarios] [processes]
+
+Every scenario (hx711_scenarios.random_scenario(seed)) is run on the
+emulator's virtual clock in a pool of worker processes, once per detector.
+A capture is correct when it happens while the plate is settled and its
+weight is within TOLERANCE of what's on the plate; anything else (during a
+pour, a knock or a hand on the plate, or a second capture of the same
+load) is a false capture.  For each detector it reports:
+
+- latency: time from the plate settling to the capture, median and p95.
+- missed: settled loads that were never captured.
+- false: share of captures that were false.
+'''
+
+SCENARIOS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+PROCESSES = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+REFERENCE_UNIT = 1000
+# Only loads on the plate for longer than this can be expected to be caught.
+MIN_SETTLED = 1.5
+TOLERANCE = 2.0
+
+
+def get_mode_average(weights, tolerance=1):
+    rounded_weights = [round(w) for w in weights]
+    grouped = Counter(rounded_weights)
+    most_common_weight = grouped.most_common(1)[0][0]
+    mode_group = [w for w in weights if most_common_weight - tolerance <= w <= most_common_weight + tolerance]
+    return mean(mode_group) if mode_group else 0
+
+
+def autoCaptureDetector(hx, duration, stability_threshold=1, stabilization_time=1):
+    # monitor_weight() from auto_capture.py on the emulator's clock, without
+    # the GUI, the camera and the wait for an empty scale after a capture.
+    clock = hx.clock
+    captures = []
+    last_logged_weight = None
+
+    while clock.now() < duration:
+        start_time = clock.now()
+        stable_readings = []
+        while clock.now() - start_time < stabilization_time:
+            current_weight = max(0, hx.get_weight(5))
+            stable_readings.append(current_weight)
+
+            if len(stable_readings) > 1:
+                avg_weight = get_mode_average(stable_readings)
+                if abs(avg_weight - stable_readings[-1]) > stability_threshold:
+                    stable_readings = []
+                    start_time = clock.now()
+
+            clock.sleep(0.05)
+
+        if stable_readings and sum(stable_readings) / len(stable_readings) > 0:
+            average_stable_weight = sum(stable_readings) / len(stable_readings)
+            if last_logged_weight is None or abs(average_stable_weight - last_logged_weight) > stability_threshold:
+                captures.append((clock.now(), average_stable_weight))
+                last_logged_weight = average_stable_weight
+
+    return captures
+
+
+def kalmanDetector(hx, duration, max_sigma=0.5, max_rate=1.0, stable_samples=STABLE_SAMPLES, min_change=TOLERANCE):
+    # monitor_weight() from autocapture_analyer.py: captures once the
+    # KalmanWeightEstimator has settled and its standard deviation and rate
+    # have been small for stable_samples samples in a row, unless the plate
+    # is empty or holds what was captured last.  The measurement noise comes
+    # from an empty scale, like the script measures it at start-up.
+    emptyHx = HX711(5, 6, seed=0, load_A=no_load, glitch_interval=0)
+    noise = estimate_noise(emptyHx.read_long() for i in range(NOISE_SAMPLES))
+    estimator = KalmanWeightEstimator(measurement_noise=noise)
+    clock = hx.clock
+    unit = hx.get_reference_unit()
+    captures = []
+    lastCaptured = 0.0
+    stableCount = 0
+
+    while clock.now() < duration:
+        value, rate, variance = estimator.update(clock.now(), hx.read_long() - hx.get_offset())
+        if (estimator.is_settled() and variance ** 0.5 / unit <= max_sigma and
+                abs(rate / unit) <= max_rate):
+            stableCount += 1
+        else:
+            stableCount = 0
+
+        weight = value / unit
+        if stableCount == stable_samples and weight > min_change and abs(weight - lastCaptured) > min_change:
+            captures.append((clock.now(), weight))
+            lastCaptured = weight
+
+    return captures
+
+
+DETECTORS = [
+    ("auto_capture", autoCaptureDetector),
+    ("kalman", kalmanDetector),
+]
+
+
+def score(scenario, captures):
+    intervals = scenario.settled_intervals()
+    expected = [interval for interval in scenario.settled_intervals(MIN_SETTLED) if interval[2] > TOLERANCE]
+    caught = set()
+    latencies = []
+    falseCaptures = 0
+
+    for timestamp, weight in captures:
+        for start, end, grams in intervals:
+            if start <= timestamp < end and abs(weight - grams) <= TOLERANCE + grams * scenario.creep:
+                break
+        else:
+            falseCaptures += 1
+            continue
+
+        if (start, end, grams) in caught or grams <= TOLERANCE:
+            falseCaptures += 1
+            continue
+
+        caught.add((start, end, grams))
+        latencies.append(timestamp - start)
+
+    missed = sum(1 for interval in expected if interval not in caught)
+    return latencies, missed, len(expected), falseCaptures, len(captures)
+
+
+def runScenario(seed):
+    scenario = random_scenario(seed)
+    results = []
+    for name, detector in DETECTORS:
+        hx = HX711(5, 6, seed=seed, load_A=scenario, glitch_interval=0)
+        hx.set_reference_unit(REFERENCE_UNIT)
+        hx.tare()
+        results.append(score(scenario, detector(hx, scenario.duration)))
+
+    return results
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    with multiprocessing.Pool(PROCESSES) as pool:
+        results = pool.map(runScenario, range(SCENARIOS), chunksize=16)
+    elapsed = time.perf_counter() - start
+
+    simulated = sum(random_scenario(seed).duration for seed in range(SCENARIOS))
+    print("%d scenarios, %.0f simulated minutes in %.1f s" % (SCENARIOS, simulated / 60, elapsed))
+    print("detector     | latency ms p50 | p95   | missed | false")
+    for i, (name, detector) in enumerate(DETECTORS):
+        latencies = [latency for result in results for latency in result[i][0]]
+        missed = sum(result[i][1] for result in results)
+        settled = sum(result[i][2] for result in results)
+        falseCaptures = sum(result[i][3] for result in results)
+        captures = sum(result[i][4] for result in results)
+        print("%-12s | %14.0f | %5.0f | %5.1f%% | %4.1f%%" % (name, percentile(latencies, 0.5) * 1000,
+                                                            percentile(latencies, 0.95) * 1000,
+                                                            100.0 * missed / max(settled, 1),
+                                                            100.0 * falseCaptures / max(captures, 1)))
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import tempfile
+import hx711
+from hx711 import HX711
+from hx711_emulator import HX711 as EmulatedHX711
+from hx711_filters import FilterPipeline, SaturationFilter, HampelFilter, PlausibilityFilter
+from hx711_scenarios import random_scenario
+from hx711_stats import estimate_noise
+from hx711_trace import TraceReader, TraceReplayBackend, record_trace
+
+'''
+Replays a raw sample trace through the HX711 driver as fast as it can read.
+
+Usage: python benchmark_trace_replay.py [trace]
+
+Without a trace it records ten minutes of emulated scenarios first.  It
+reports the trace's size per sample, how fast TraceReader decodes it, how
+many times faster than real time HX711.read_raw_int() gets through it on
+TraceReplayBackend, and what a filter pipeline rejected along the way.  The
+replayed values are checked against the trace, so a replay can stand in for
+the recording when comparing filter or stability changes.
+'''
+
+
+def recordEmulatedTrace(path, minutes=10):
+    # One 30 s random scenario after the other.
+    scenarios = [random_scenario(seed) for seed in range(int(minutes * 2))]
+    hx = EmulatedHX711(5, 6, seed=1, load_A=lambda t: scenarios[min(int(t // 30), len(scenarios) - 1)](t % 30))
+    return record_trace(hx, path, duration=minutes * 60, clock=hx.clock.now)
+
+
+if len(sys.argv) > 1:
+    path = sys.argv[1]
+else:
+    path = os.path.join(tempfile.mkdtemp(), "emulated.trace")
+    recordEmulatedTrace(path)
+
+trace = TraceReader(path)
+
+start = time.perf_counter()
+samples = list(trace)
+decodeTime = time.perf_counter() - start
+traceSeconds = samples[-1][0] - samples[0][0]
+
+print("trace: %d samples, %.1f minutes, %.2f bytes/sample" % (len(samples), traceSeconds / 60,
+                                                               float(os.path.getsize(path)) / len(samples)))
+print("decode: %.0f samples/s" % (len(samples) / decodeTime))
+
+backend = TraceReplayBackend(trace, speed=None)
+hx = HX711(5, 6, wait_strategy=hx711.WAIT_BUSY, backend=backend)
+# The trace's noise, from the differences between consecutive samples: load
+# changes are few enough not to move their median, and a difference has
+# sqrt(2) times the noise of a sample.
+noise = estimate_noise(b[1] - a[1] for a, b in zip(samples, samples[1:])) / 2 ** 0.5
+filters = FilterPipeline([SaturationFilter(), HampelFilter(window=7, min_deviation=noise),
+                          PlausibilityFilter(max_step=50000)])
+
+# The driver's constructor already read the first sample.
+values = [samples[0][1]]
+start = time.perf_counter()
+while not backend.is_finished():
+    value = hx.read_raw_int()
+    values.append(value)
+    filters.process(value)
+replayTime = time.perf_counter() - start
+
+if values != [sample[1] for sample in samples]:
+    raise AssertionError("the replay doesn't match the trace")
+
+print("replay: %.0f samples/s, %.0fx real time" % (len(values) / replayTime, traceSeconds / replayTime))
+print("noise: %.0f counts, Hampel floor" % noise)
+print("rejected: %s" % ", ".join("%s %d" % item for item in filters.get_stats()["rejected"].items()))
+
+backend.cleanup()
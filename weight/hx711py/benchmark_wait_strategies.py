@@ -0,0 +1,64 @@
+import sys
+import time
+import hx711
+from hx711 import HX711
+from hx711_backends import FakeGPIOBackend, RPiGPIOBackend
+
+'''
+Measures how much CPU each ready-wait strategy burns per sample.
+
+Usage: python benchmark_wait_strategies.py [samples] [--hardware]
+
+For every strategy it reads the given amount of samples (100 by default) and
+reports the wall time and the process CPU time per sample.  Process CPU time
+includes the callback thread used by the edge strategy.  At 10 SPS the busy
+strategy should show roughly as much CPU time as wall time, while the poll
+and edge strategies should be a small fraction of it.
+
+By default it reads a simulated 10 SPS chip on FakeGPIOBackend, so it also
+runs on a plain Linux box.  With --hardware it reads a real HX711 through
+RPi.GPIO instead, on BCM 5 (DOUT) and 6 (PD_SCK).
+'''
+
+SAMPLES = 100
+HARDWARE = False
+for arg in sys.argv[1:]:
+    if arg == "--hardware":
+        HARDWARE = True
+    else:
+        SAMPLES = int(arg)
+
+if HARDWARE:
+    backend = RPiGPIOBackend()
+else:
+    backend = FakeGPIOBackend()
+    backend.add_chip(5, 6, sample_rate=10.0)
+
+hx = HX711(5, 6, backend=backend)
+hx.set_reading_format("MSB", "MSB")
+
+try:
+    print("strategy | wall ms/sample | cpu ms/sample | cpu %")
+    for strategy in (hx711.WAIT_BUSY, hx711.WAIT_POLL, hx711.WAIT_EDGE):
+        hx.set_wait_strategy(strategy)
+
+        # Sync up with the conversion cycle before measuring.
+        hx.read_long()
+
+        wallStart = time.perf_counter()
+        cpuStart = time.process_time()
+        for i in range(SAMPLES):
+            hx.read_long()
+        wall = time.perf_counter() - wallStart
+        cpu = time.process_time() - cpuStart
+
+        print("%8s | %14.3f | %13.3f | %5.1f" % (hx.get_wait_strategy(),
+                                                 wall * 1000 / SAMPLES,
+                                                 cpu * 1000 / SAMPLES,
+                                                 cpu * 100 / wall))
+
+except (KeyboardInterrupt, SystemExit):
+    pass
+
+finally:
+    backend.cleanup()
@@ -1,21 +1,30 @@
-import RPi.GPIO as GPIO
 import time
 import threading
+from hx711_backends import RPiGPIOBackend
+from hx711_stats import ReadTimingStats
+from hx711_queue import SampleQueue
+
+# Fault events passed to fault listeners, see HX711.addFaultListener().
+FAULT_STALL = 'stall'
+FAULT_RECOVERED = 'recovered'
+FAULT_TIMEOUT = 'timeout'
 
 class HX711:
 
-    def __init__(self, dout, pd_sck, gain=128):
+    def __init__(self, dout, pd_sck, gain=128, backend=None, readTimeout=None):
         self.PD_SCK = pd_sck
 
         self.DOUT = dout
 
+        # GPIO access goes through a backend (see hx711_backends.py).
+        self.backend = backend if backend is not None else RPiGPIOBackend()
+
         # Mutex for reading from the HX711, in case multiple threads in client
         # software try to access get values from the class at the same time.
         self.readLock = threading.Lock()
         
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.PD_SCK, GPIO.OUT)
-        GPIO.setup(self.DOUT, GPIO.IN)
+        self.backend.setup_output(self.PD_SCK)
+        self.backend.setup_input(self.DOUT)
 
         # The value returned by the hx711 that corresponds to your reference
         # unit AFTER dividing by the SCALE.
@@ -28,6 +37,22 @@ class HX711:
 
         self.byteFormat = 'MSB' # 'MSB' or 'LSB'
         self.bitFormat = 'MSB' # 'MSB' or 'LSB'
+        self.reorderTables = self.buildReorderTables(self.byteFormat, self.bitFormat)
+
+        # Read timing instrumentation, off until enableReadTiming().
+        self.readTiming = None
+        self.readRetries = 0
+
+        # Deadlines and fault recovery.  readTimeout is how long, in seconds,
+        # a read that isn't given a timeout may wait for the chip before it
+        # gives up and returns None; None waits forever.  With stallTime
+        # set, a chip that keeps DOUT high that long is power-cycled, up to
+        # maxResets times per wait.
+        self.readTimeout = readTimeout
+        self.stallTime = None
+        self.maxResets = 0
+        self.faultListeners = []
+        self.faultCounts = {FAULT_STALL: 0, FAULT_RECOVERED: 0, FAULT_TIMEOUT: 0}
         
         # GAIN must be between 1 and 3. None is an invalid value.
         self.GAIN = None
@@ -43,7 +68,11 @@ class HX711:
         
         self.readyCallbackEnabled = False
         self.paramCallback = None
-        self.lastRawBytes = None
+
+        # Samples read by readyCallback(), for one consumer thread, with
+        # sequence numbers and drop counts.  See hx711_queue.py.
+        self.sampleQueue = SampleQueue()
+        self.inReadyCallback = False
 
 
     def powerDown(self):
@@ -54,8 +83,8 @@ class HX711:
         # Because a rising edge on HX711 Digital Serial Clock (PD_SCK).  We then
         # leave it held up and wait 100us.  After 60us the HX711 should be
         # powered down.
-        GPIO.output(self.PD_SCK, False)
-        GPIO.output(self.PD_SCK, True)
+        self.backend.write(self.PD_SCK, False)
+        self.backend.write(self.PD_SCK, True)
 
         time.sleep(0.0001)
 
@@ -70,7 +99,7 @@ class HX711:
         self.readLock.acquire()
 
         # Lower the HX711 Digital Serial Clock (PD_SCK) line.
-        GPIO.output(self.PD_SCK, False)
+        self.backend.write(self.PD_SCK, False)
 
         # Wait 100 us for the HX711 to power back up.
         time.sleep(0.0001)
@@ -84,7 +113,7 @@ class HX711:
         # throw it away, so that next sample from the HX711 will be from the
         # correct channel/gain.
         if self.getGain() != 128:
-            self.readRawBytes()
+            self.readRawInt()
 
 
     def reset(self):
@@ -93,7 +122,149 @@ class HX711:
 
 
     def isReady(self):
-        return GPIO.input(self.DOUT) == GPIO.LOW
+        return self.backend.read(self.DOUT) == 0
+
+
+    def deadlineFor(self, timeout):
+        # The monotonic deadline of a read given `timeout` seconds, or the
+        # default read timeout if that's None.  None means no deadline.
+        if timeout is None:
+            timeout = self.readTimeout
+
+        if timeout is None:
+            return None
+
+        return time.monotonic() + timeout
+
+
+    def remainingTime(self, deadline):
+        if deadline is None:
+            return None
+
+        return max(0.0, deadline - time.monotonic())
+
+
+    def acquireReadLock(self, blockUntilReady, deadline):
+        if not blockUntilReady:
+            return self.readLock.acquire(False)
+
+        if deadline is None:
+            return self.readLock.acquire()
+
+        if self.readLock.acquire(timeout=self.remainingTime(deadline)):
+            return True
+
+        self.fireFault(FAULT_TIMEOUT)
+        return False
+
+
+    def waitUntilReady(self, deadline=None):
+        # Caller must hold the Read Lock.  Spins until a conversion is ready,
+        # resetting a stalled chip along the way if setAutoReset() asked for
+        # it.  Returns False if the deadline passed first.
+        if self.isReady():
+            return True
+
+        resets = 0
+        while True:
+            limit = deadline
+            if self.stallTime is not None and resets < self.maxResets:
+                stallAt = time.monotonic() + self.stallTime
+                if limit is None or stallAt < limit:
+                    limit = stallAt
+
+            if limit is None:
+                while self.isReady() is not True:
+                    pass
+            else:
+                while self.isReady() is not True and time.monotonic() < limit:
+                    pass
+
+            if self.isReady():
+                break
+
+            if deadline is not None and time.monotonic() >= deadline:
+                self.fireFault(FAULT_TIMEOUT)
+                return False
+
+            self.fireFault(FAULT_STALL)
+            self.resetUnlocked()
+            resets += 1
+
+        if resets:
+            self.fireFault(FAULT_RECOVERED)
+
+            # The chip comes back converting channel A at gain 128.  Throw
+            # that conversion away if it isn't what we're reading.
+            if self.GAIN != 1:
+                self.backend.shift_in(self.PD_SCK, self.DOUT, 24 + self.GAIN)
+                return self.waitUntilReady(deadline)
+
+        return True
+
+
+    def resetUnlocked(self):
+        # Caller must hold the Read Lock.  powerDown() and powerUp() in one
+        # go, for the waits that find the chip stalled.
+        self.backend.write(self.PD_SCK, False)
+        self.backend.write(self.PD_SCK, True)
+        time.sleep(0.0001)
+        self.backend.write(self.PD_SCK, False)
+        time.sleep(0.0001)
+
+
+    def setReadTimeout(self, timeout):
+        # Default timeout, in seconds, of every read that isn't given one.
+        # Reads that run out of time return None, like the ones that can't
+        # get the Read Lock.  None waits forever.
+        if timeout is not None and timeout <= 0:
+            raise ValueError("HX711::setReadTimeout() timeout must be greater than zero, or None!")
+
+        self.readTimeout = timeout
+
+
+    def getReadTimeout(self):
+        return self.readTimeout
+
+
+    def setAutoReset(self, stallTime=0.5, maxResets=2):
+        # Power-cycles the HX711 when DOUT stays high for stallTime seconds
+        # in the middle of a wait, up to maxResets times per wait.  At 10 SPS
+        # the chip needs 400ms to settle after a reset, so keep stallTime
+        # above that.  stallTime None turns it off.
+        if stallTime is not None and stallTime <= 0:
+            raise ValueError("HX711::setAutoReset() stallTime must be greater than zero, or None!")
+
+        if maxResets < 0:
+            raise ValueError("HX711::setAutoReset() maxResets can't be negative!")
+
+        self.readLock.acquire()
+        self.stallTime = stallTime
+        self.maxResets = maxResets if stallTime is not None else 0
+        self.readLock.release()
+
+
+    def addFaultListener(self, listener):
+        # listener(kind, timestamp) is called with FAULT_STALL,
+        # FAULT_RECOVERED or FAULT_TIMEOUT and the monotonic time of the
+        # fault, possibly with the Read Lock held: it mustn't read from the
+        # HX711 itself.
+        self.faultListeners.append(listener)
+
+
+    def removeFaultListener(self, listener):
+        self.faultListeners.remove(listener)
+
+
+    def getFaultCounts(self):
+        return dict(self.faultCounts)
+
+
+    def fireFault(self, kind):
+        self.faultCounts[kind] += 1
+        timestamp = time.monotonic()
+        for listener in list(self.faultListeners):
+            listener(kind, timestamp)
 
 
     def setGain(self, gain):
@@ -109,10 +280,10 @@ class HX711:
         
         self.reset()
 
-        GPIO.output(self.PD_SCK, False)
+        self.backend.write(self.PD_SCK, False)
 
-        # Read out a set of raw bytes and throw it away.
-        self.readRawBytes()
+        # Read out a sample and throw it away.
+        self.readRawInt()
         
         return True
 
@@ -154,12 +325,7 @@ class HX711:
        # Clock HX711 Digital Serial Clock (PD_SCK).  DOUT will be
        # ready 1us after PD_SCK rising edge, so we sample after
        # lowering PD_SCL, when we know DOUT will be stable.
-       GPIO.output(self.PD_SCK, True)
-       GPIO.output(self.PD_SCK, False)
-       bitValue = GPIO.input(self.DOUT)
-
-       # Convert Boolean to int and return it.
-       return int(bitValue)
+       return self.backend.clock_bit(self.PD_SCK, self.DOUT)
 
 
     def readNextByte(self):
@@ -181,22 +347,43 @@ class HX711:
        return byteValue 
 
 
-    def readRawBytes(self, blockUntilReady=True):
+    def readRawBytes(self, blockUntilReady=True, timeout=None):
         
         if self.GAIN is None:
             raise ValueError("HX711::readRawBytes() called without setting gain first!")
+
+        deadline = self.deadlineFor(timeout)
         
         # Try to get the Read Lock. If we can't, we lost our opportunity to read.
         # Though this behaviour is not ideal, it seems key to avoid time consuming interrupt handlers.
-        if self.readLock.acquire(blockUntilReady) is False:
+        if self.acquireReadLock(blockUntilReady, deadline) is False:
             # If we couldn't get the lock, it's probably because someone else
             # is reading the HX711 right now.  We'll just skip this reading and
             # return None.
             return None
 
         # Wait until HX711 is ready for us to read a sample.
-        while self.isReady() is not True:
-           pass
+        if not self.waitUntilReady(deadline):
+            self.readLock.release()
+            return None
+
+        if self.readTiming is not None:
+            rawValue = self.timedShiftIn(deadline)
+            self.readLock.release()
+
+            # A read that kept failing timing is dropped.
+            if rawValue is None:
+                return None
+
+            # Same bit and byte order readNextByte() and the code below give.
+            rawBytes = [rawValue >> 16, (rawValue >> 8) & 0xFF, rawValue & 0xFF]
+            if self.bitFormat == 'LSB':
+                rawBytes = [int('{:08b}'.format(byteValue)[::-1], 2) for byteValue in rawBytes]
+
+            if self.byteFormat == 'MSB':
+                return rawBytes
+            else:
+                return [rawBytes[2], rawBytes[1], rawBytes[0]]
 
         # Read three bytes of data from the HX711.
         firstByte  = self.readNextByte()
@@ -221,7 +408,140 @@ class HX711:
             # Less Significant Byte first.
             return [thirdByte, secondByte, firstByte]
 
-    def getRawBytes(self, channel='A'):
+    def readRawInt(self, blockUntilReady=True, timeout=None):
+        # Same as readRawBytes(), but the 24 bits go straight into a signed
+        # int, with no per-bit format checks and no intermediate byte list.
+
+        if self.GAIN is None:
+            raise ValueError("HX711::readRawInt() called without setting gain first!")
+
+        deadline = self.deadlineFor(timeout)
+
+        if self.acquireReadLock(blockUntilReady, deadline) is False:
+            return None
+
+        # Wait until HX711 is ready for us to read a sample.
+        if not self.waitUntilReady(deadline):
+            self.readLock.release()
+            return None
+
+        # The HX711 clocks data out MSB first, plus 1 to 3 pulses that set
+        # the channel and gain of the next conversion.
+        if self.readTiming is None:
+            rawValue = self.backend.shift_in(self.PD_SCK, self.DOUT, 24 + self.GAIN) >> self.GAIN
+        else:
+            rawValue = self.timedShiftIn(deadline)
+
+        self.readLock.release()
+
+        # A read that kept failing timing is dropped.
+        if rawValue is None:
+            return None
+
+        # Apply the reading format, if it isn't the natural one.
+        tables = self.reorderTables
+        if tables is not None:
+            rawValue = (tables[0][rawValue >> 16] |
+                        tables[1][(rawValue >> 8) & 0xFF] |
+                        tables[2][rawValue & 0xFF])
+
+        # Convert from 24bit twos-complement to a signed value.
+        return rawValue - ((rawValue & 0x800000) << 1)
+
+
+    def timedShiftIn(self, deadline=None):
+        # Caller must hold the Read Lock, with a conversion ready.  Clocks
+        # the 24 data bits in while timing every PD_SCK pulse, and reads the
+        # next conversion instead when a pulse stayed high for too long: the
+        # chip may have powered down halfway and shifted out garbage.
+        # Returns None once out of retries.
+        stats = self.readTiming
+        clock = time.perf_counter
+
+        for attempt in range(self.readRetries + 1):
+            if attempt:
+                stats.retries += 1
+                if not self.waitUntilReady(deadline):
+                    break
+
+            start = clock()
+            rawValue, longestHigh = self.backend.shift_in_timed(self.PD_SCK, self.DOUT, 24 + self.GAIN)
+            if not stats.record(clock() - start, longestHigh):
+                return rawValue >> self.GAIN
+
+        stats.drops += 1
+        return None
+
+
+    def enableReadTiming(self, maxRetries=2, maxSckHigh=50e-6, history=1024):
+        # Times every read from now on and retries, up to maxRetries times,
+        # the ones that held PD_SCK high for more than maxSckHigh seconds
+        # (50us is the datasheet limit).  Reads that still fail return None.
+        if maxRetries < 0:
+            raise ValueError("HX711::enableReadTiming() maxRetries can't be negative!")
+
+        self.readLock.acquire()
+        self.readTiming = ReadTimingStats(maxSckHigh, history)
+        self.readRetries = maxRetries
+        self.readLock.release()
+
+
+    def disableReadTiming(self):
+        self.readLock.acquire()
+        self.readTiming = None
+        self.readLock.release()
+
+
+    def getReadStats(self):
+        # Read counters and timings (see hx711_stats.ReadTimingStats), or
+        # None if read timing isn't enabled.
+        stats = self.readTiming
+        if stats is None:
+            return None
+
+        return stats.get_stats()
+
+
+    def buildReorderTables(self, byteFormat, bitFormat):
+        # The reading format decides where each clocked-out bit lands in the
+        # 24bit value.  Work that out once: tables[i][b] is what the i-th
+        # clocked byte contributes to the value when its bits read b, MSB
+        # first.  The natural MSB/MSB format needs no tables at all.
+        if byteFormat == 'MSB' and bitFormat == 'MSB':
+            return None
+
+        tables = []
+        for position in range(3):
+            if byteFormat == 'MSB':
+                shift = 16 - 8 * position
+            else:
+                shift = 8 * position
+
+            table = []
+            for byteValue in range(256):
+                if bitFormat == 'LSB':
+                    byteValue = int('{:08b}'.format(byteValue)[::-1], 2)
+                table.append(byteValue << shift)
+
+            tables.append(table)
+
+        return tables
+
+
+    def rawIntToBytes(self, rawInt):
+        # Inverse of rawBytesToLong(), for code that still wants byte lists.
+        if rawInt is None:
+            return None
+
+        twosComplementValue = rawInt & 0xFFFFFF
+        return [twosComplementValue >> 16,
+                (twosComplementValue >> 8) & 0xFF,
+                twosComplementValue & 0xFF]
+
+
+    def getRawBytes(self, channel='A', timeout=None):
+        # Returns None if the chip didn't answer within timeout seconds (the
+        # default read timeout if None).
         
         # Get current channel
         currentChannel = self.getChannel()
@@ -231,7 +551,7 @@ class HX711:
             # Temporarily switch to the requested channel
             self.setChannel(channel)
         
-        rawBytes = self.readRawBytes()
+        rawBytes = self.readRawBytes(timeout=timeout)
         
         # Compare the requested channel with the current channel
         if channel != currentChannel:
@@ -242,29 +562,82 @@ class HX711:
 
 
     def getLastRawBytes(self):
-        rawBytes = self.lastRawBytes
-        self.lastRawBytes = None
-        return rawBytes
+        return self.rawIntToBytes(self.getLastRawInt())
+
+
+    def getLastRawInt(self):
+        # The newest sample the ready callback read since the last call, or
+        # None.  Older ones are consumed with it; use getSample() or
+        # getSamples() to see every sample.
+        samples = self.sampleQueue.drain()
+        if not samples:
+            return None
+
+        return samples[-1][2]
+
+
+    def getSample(self, timeout=None):
+        # The oldest sample the ready callback read and nobody consumed yet,
+        # as (sequence, timestamp, rawInt), waiting up to timeout seconds
+        # (forever if None) for one.  None on timeout.  A jump in sequence
+        # numbers means samples were lost in between.
+        return self.sampleQueue.get(timeout)
+
+
+    def getSamples(self):
+        # Every sample waiting in the queue, oldest first, without blocking.
+        return self.sampleQueue.drain()
+
+
+    def getQueueStats(self):
+        # See SampleQueue.get_stats(): conversions seen, queued, missed
+        # (lock busy or read failed) and dropped on a full queue, and the
+        # effective sample rate.
+        return self.sampleQueue.get_stats()
 
 
     def readyCallback(self, pin):
         # Check if the callback is for the DOUT pin.
         if(pin != self.DOUT):
             return
-        
-        self.lastRawBytes = self.readRawBytes(blockUntilReady=False)
+
+        # DOUT also falls while we clock the data bits out.  Backends that
+        # call back right away land here again in the middle of our own
+        # read; that's not a conversion, so don't count it as a lost one.
+        if self.inReadyCallback:
+            return
+        self.inReadyCallback = True
+        
+        # The callback gets the signed value straight from readRawInt().  All
+        # the rawBytesTo*() helpers accept it in place of a byte list.
+        try:
+            rawInt = self.readRawInt(blockUntilReady=False)
+        finally:
+            self.inReadyCallback = False
+
+        # Every conversion gets a sequence number, read or not, so consumers
+        # can tell where samples went missing.
+        if rawInt is None:
+            self.sampleQueue.skip()
+        else:
+            self.sampleQueue.put(rawInt)
+
         if self.paramCallback is not None:
-            self.paramCallback(self.lastRawBytes)
+            self.paramCallback(rawInt)
 
     
-    def enableReadyCallback(self, paramCallback=None):
+    def enableReadyCallback(self, paramCallback=None, queueSize=None):
+        # queueSize, if given, replaces the sample queue with an empty one
+        # of that many samples.
         self.paramCallback = paramCallback if paramCallback is not None else self.paramCallback
-        GPIO.add_event_detect(self.DOUT, GPIO.FALLING, callback=self.readyCallback)
+        if queueSize is not None:
+            self.sampleQueue = SampleQueue(queueSize)
+        self.backend.add_falling_edge(self.DOUT, self.readyCallback)
         self.readyCallbackEnabled = True
 
     
     def disableReadyCallback(self):
-        GPIO.remove_event_detect(self.DOUT)
+        self.backend.remove_edge(self.DOUT)
         self.paramCallback = None
         self.readyCallbackEnabled = False
 
@@ -279,6 +652,7 @@ class HX711:
         
         self.byteFormat = byteFormat
         self.bitFormat = bitFormat
+        self.reorderTables = self.buildReorderTables(byteFormat, bitFormat)
 
     
     def convertFromTwosComplement24bit(self, inputValue):
@@ -290,13 +664,17 @@ class HX711:
         if rawBytes is None:
             return None
 
-        # Join the raw bytes into a single 24bit 2s complement value.
-        twosComplementValue = ((rawBytes[0] << 16) |
-                               (rawBytes[1] << 8)  |
-                               rawBytes[2])
-        
-        # Convert from 24bit twos-complement to a signed value.
-        signed_int_value = self.convertFromTwosComplement24bit(twosComplementValue)
+        if isinstance(rawBytes, int):
+            # Already converted by readRawInt().
+            signed_int_value = rawBytes
+        else:
+            # Join the raw bytes into a single 24bit 2s complement value.
+            twosComplementValue = ((rawBytes[0] << 16) |
+                                   (rawBytes[1] << 8)  |
+                                   rawBytes[2])
+
+            # Convert from 24bit twos-complement to a signed value.
+            signed_int_value = self.convertFromTwosComplement24bit(twosComplementValue)
 
         # Record the latest sample value we've read.
         self.lastVal = signed_int_value
@@ -305,22 +683,22 @@ class HX711:
         return int(signed_int_value)
 
 
-    def getLong(self, channel='A'):
+    def getLong(self, channel='A', timeout=None):
                 
         currentChannel = self.getChannel()
         if channel != currentChannel:
             self.setChannel(channel)
         
-        # Get a sample from the HX711 in the form of raw bytes.
-        rawBytes = self.readRawBytes()
+        # Get a sample from the HX711 as a signed value.
+        rawInt = self.readRawInt(timeout=timeout)
         
         if channel != currentChannel:
             self.setChannel(currentChannel)
         
-        if rawBytes is None:
+        if rawInt is None:
             return None
         
-        return self.rawBytesToLong(rawBytes)
+        return self.rawBytesToLong(rawInt)
 
 
     def setOffset(self, offset, channel='A'):
@@ -369,21 +747,21 @@ class HX711:
         return longValue - offset
 
 
-    def getLongWithOffset(self, channel='A'):
+    def getLongWithOffset(self, channel='A', timeout=None):
         
         currentChannel = self.getChannel()
         if channel != currentChannel:
             self.setChannel(channel)
         
-        rawBytes = self.readRawBytes()
+        rawInt = self.readRawInt(timeout=timeout)
         
         if channel != currentChannel:
             self.setChannel(currentChannel)
         
-        if rawBytes is None:
+        if rawInt is None:
             return None
         
-        return self.rawBytesToLongWithOffset(rawBytes, channel)
+        return self.rawBytesToLongWithOffset(rawInt, channel)
     
  
     def setReferenceUnit(self, referenceUnit, channel='A'):
@@ -425,25 +803,124 @@ class HX711:
         
         return longWithOffset / referenceUnit
 
-    
-    def getWeight(self, channel='A'):
+
+    def rawBytesArrayToLongs(self, rawBytes, byteFormat='MSB'):
+        # Batch version of rawBytesToLong(), using NumPy.  rawBytes is either
+        # a bytes-like buffer of 3-byte samples, an N x 3 array of byte
+        # values, or an array of values readRawInt() already converted.  A
+        # flat uint8 array (e.g. np.frombuffer(buf, np.uint8)) is taken as a
+        # byte stream, 3 bytes per sample, never as converted values.
+        # byteFormat is the order of the bytes of each sample: 'MSB' (most
+        # significant first, like readRawBytes() returns them) or 'LSB'.
+        # Returns an int32 array of signed values.  Unlike rawBytesToLong(),
+        # it doesn't touch lastVal.
+        import numpy as np
+
+        if byteFormat != 'MSB' and byteFormat != 'LSB':
+            raise ValueError(f"HX711::rawBytesArrayToLongs() invalid byteFormat: '{byteFormat}'")
+
+        if isinstance(rawBytes, (bytes, bytearray, memoryview)):
+            if len(rawBytes) % 3 != 0:
+                raise ValueError("HX711::rawBytesArrayToLongs() buffer length must be a multiple of 3!")
+            rawBytes = np.frombuffer(rawBytes, dtype=np.uint8).reshape(-1, 3)
+        else:
+            rawBytes = np.asarray(rawBytes)
+
+        if rawBytes.ndim == 1 and rawBytes.dtype == np.uint8:
+            if rawBytes.size % 3 != 0:
+                raise ValueError("HX711::rawBytesArrayToLongs() byte stream length must be a multiple of 3!")
+            rawBytes = rawBytes.reshape(-1, 3)
+
+        if rawBytes.ndim == 1:
+            # Already converted by readRawInt().
+            return rawBytes.astype(np.int32)
+
+        if rawBytes.ndim != 2 or rawBytes.shape[1] != 3:
+            raise ValueError("HX711::rawBytesArrayToLongs() expects an N x 3 array of bytes!")
+
+        if rawBytes.dtype != np.uint8:
+            if rawBytes.size and (rawBytes.min() < 0 or rawBytes.max() > 0xFF):
+                raise ValueError("HX711::rawBytesArrayToLongs() byte values must be between 0 and 255!")
+
+        rawBytes = rawBytes.astype(np.int32)
+        if byteFormat == 'LSB':
+            rawBytes = rawBytes[:, ::-1]
+
+        # Join the raw bytes into 24bit 2s complement values and convert them
+        # to signed values, all samples at once.
+        values = (rawBytes[:, 0] << 16) | (rawBytes[:, 1] << 8) | rawBytes[:, 2]
+        return values - ((values & 0x800000) << 1)
+
+
+    def rawBytesArrayToLongsWithOffset(self, rawBytes, channel='A', byteFormat='MSB'):
+        return self.rawBytesArrayToLongs(rawBytes, byteFormat) - self.getOffset(channel)
+
+
+    def rawBytesArrayToWeights(self, rawBytes, channel='A', byteFormat='MSB'):
+        # Batch version of rawBytesToWeight(): grams for every sample, as a
+        # float64 array.
+        referenceUnit = self.getReferenceUnit(channel)
+
+        if referenceUnit == 0:
+            raise ValueError("HX711::rawBytesArrayToWeights() referenceUnit is 0. It isn't possible to divide by zero!")
+
+        return self.rawBytesArrayToLongsWithOffset(rawBytes, channel, byteFormat) / referenceUnit
+
+
+    def setOffsetFromRawBytes(self, rawBytes, channel='A', byteFormat='MSB'):
+        # Tare from a batch of samples taken with the scale empty: the
+        # offset becomes their median.  Returns the new offset.
+        import numpy as np
+
+        longs = self.rawBytesArrayToLongs(rawBytes, byteFormat)
+        if longs.size == 0:
+            raise ValueError("HX711::setOffsetFromRawBytes() needs at least one sample!")
+
+        offset = float(np.median(longs))
+        self.setOffset(offset, channel)
+        return offset
+
+
+    def setReferenceUnitFromRawBytes(self, rawBytes, knownWeight, channel='A', byteFormat='MSB'):
+        # Calibrate from a batch of samples taken with knownWeight grams on
+        # the scale, after taring.  Returns the new reference unit.
+        import numpy as np
+
+        if knownWeight == 0:
+            raise ValueError("HX711::setReferenceUnitFromRawBytes() knownWeight can't be 0!")
+
+        longs = self.rawBytesArrayToLongsWithOffset(rawBytes, channel, byteFormat)
+        if longs.size == 0:
+            raise ValueError("HX711::setReferenceUnitFromRawBytes() needs at least one sample!")
+
+        referenceUnit = float(np.median(longs)) / knownWeight
+        if referenceUnit == 0:
+            raise ValueError("HX711::setReferenceUnitFromRawBytes() the samples don't show the known weight!")
+
+        self.setReferenceUnit(referenceUnit, channel)
+        return referenceUnit
+
+
+    def getWeight(self, channel='A', timeout=None):
         
         currentChannel = self.getChannel()
         if channel != currentChannel:
             self.setChannel(channel)
         
-        rawBytes = self.readRawBytes()
+        rawInt = self.readRawInt(timeout=timeout)
         
         if channel != currentChannel:
             self.setChannel(currentChannel)
         
-        if rawBytes is None:
+        if rawInt is None:
             return None
         
-        return self.rawBytesToWeight(rawBytes, channel)
+        return self.rawBytesToWeight(rawInt, channel)
 
 
-    def autosetOffset(self, channel='A'):
+    def autosetOffset(self, channel='A', timeout=None):
+        # Returns False, leaving the offset alone, if the chip didn't answer
+        # within timeout seconds.
         
         currentReferenceUnit = self.getReferenceUnit(channel)
         
@@ -453,15 +930,16 @@ class HX711:
         if channel != currentChannel:
             self.setChannel(channel)
             
-        newOffsetValue = self.getLong(channel)
+        newOffsetValue = self.getLong(channel, timeout)
         
-        self.setOffset(newOffsetValue, channel)
+        if newOffsetValue is not None:
+            self.setOffset(newOffsetValue, channel)
         
         self.setReferenceUnit(currentReferenceUnit, channel)
         
         if channel != currentChannel:
             self.setChannel(currentChannel)
         
-        return True
+        return newOffsetValue is not None
     
 # EOF - hx711.py
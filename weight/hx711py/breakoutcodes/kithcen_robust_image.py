@@ -2,7 +2,7 @@ import time
 import sys
 import json
 import RPi.GPIO as GPIO
-from hx711 import HX711
+from hx711 import HX711, AdaptiveDutyCycle
 
 # Cleanup function to handle exit
 def cleanAndExit():
@@ -67,6 +67,7 @@ def main():
     reference_unit = load_reference_unit()
     print("Ensure scale is empty.")
     initialize_scale()
+    hx.start_continuous(duty_cycle=AdaptiveDutyCycle(power_down=True))
     print("Scale ready. Add weight.")
 
     last_weight = 0
@@ -88,7 +89,9 @@ def main():
                                 "average_weight": average_stable_weight,
                                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
                             }, f, indent=4)
-                        hx.tare()
+                        # The scale has just been steady for a while, so
+                        # the buffered samples can be tared on right away.
+                        hx.tare(instant=True)
                         print("Place new ingredient.")
                         stable_readings.clear()
                 else:
@@ -100,9 +103,7 @@ def main():
                 last_weight = 0
                 stable_readings.clear()
 
-            hx.power_down()
-            hx.power_up()
-            time.sleep(1)  # Reduced delay for faster response
+            hx.wait_for_new_sample(timeout=1.0)
 
     except (KeyboardInterrupt, SystemExit):
         cleanAndExit()
@@ -0,0 +1,38 @@
+import time
+import sys
+import RPi.GPIO as GPIO
+from hx711 import HX711Array
+
+'''
+Reading several load cells at once.
+
+Each load cell has its own HX711.  All the PD_SCK pins are wired together to
+BCM 6, and each DOUT goes to its own pin.  HX711Array clocks them all with
+the same pulses, so one read gets every cell's sample from the same
+conversion cycle.
+'''
+
+def cleanAndExit():
+    print("Cleaning...")
+    GPIO.cleanup()
+    print("Bye!")
+    sys.exit()
+
+hx = HX711Array([5, 13, 19, 26], 6)
+hx.set_reading_format("MSB", "MSB")
+
+# One reference unit per load cell, see example.py for how to work them out.
+hx.set_reference_units([114, 114, 114, 114])
+
+hx.tare()
+
+print("Tare done! Add weight now...")
+
+while True:
+    try:
+        weights, total = hx.get_weights_and_total(5)
+        print(" | ".join("%8.1f" % weight for weight in weights) + " | total %8.1f" % total)
+        time.sleep(0.1)
+
+    except (KeyboardInterrupt, SystemExit):
+        cleanAndExit()
@@ -1,6 +1,6 @@
 import time
 import sys
-from emulated_hx711 import HX711
+from hx711_emulator import HX711, RealClock
 
 
 def cleanAndExit():
@@ -9,8 +9,10 @@ def cleanAndExit():
     print("Bye!")
     sys.exit()
 
-referenceUnit = 1
-hx = HX711(5, 6)
+referenceUnit = 1000
+# RealClock runs the emulator at wall-clock speed.  Leave clock out to get
+# the virtual clock, which doesn't wait at all.
+hx = HX711(5, 6, seed=1, clock=RealClock())
 
 
 hx.set_reading_format("MSB", "MSB")
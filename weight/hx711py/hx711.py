@@ -1,21 +1,87 @@
-import RPi.GPIO as GPIO
 import time
+import asyncio
 import threading
+import collections
+from hx711_backends import RPiGPIOBackend
+from hx711_stats import SlidingWindowStats, ReadTimingStats, trimmedMeanOf, steadyMean
+
+# Ways of waiting for the HX711 to pull DOUT low when a conversion is ready.
+# WAIT_BUSY spins on the pin, WAIT_POLL sleeps between checks with an
+# exponential backoff and WAIT_EDGE sleeps until a GPIO falling-edge
+# interrupt wakes it up.
+WAIT_BUSY = 'busy'
+WAIT_POLL = 'poll'
+WAIT_EDGE = 'edge'
+
+# Fault events passed to fault listeners, see HX711.add_fault_listener().
+# FAULT_STALL: DOUT stayed high for the stall time, the chip is being reset.
+# FAULT_RECOVERED: a conversion came in after one or more resets.
+# FAULT_TIMEOUT: a read ran past its deadline and raised TimeoutError.
+FAULT_STALL = 'stall'
+FAULT_RECOVERED = 'recovered'
+FAULT_TIMEOUT = 'timeout'
+
+# Longest the acquisition thread waits for a conversion at a time, on top of
+# the auto-reset stall time, before it lets go of the Read Lock and checks
+# whether it's been asked to stop.
+ACQUISITION_WAIT_SLICE = 0.2
+
+
+def build_reorder_tables(byte_format, bit_format):
+    # The reading format decides where each clocked-out bit lands in the
+    # 24bit value.  Work that out once: tables[i][b] is what the i-th
+    # clocked byte contributes to the value when its bits read b, MSB
+    # first.  The natural MSB/MSB format needs no tables at all.
+    if byte_format == 'MSB' and bit_format == 'MSB':
+        return None
+
+    tables = []
+    for position in range(3):
+        if byte_format == 'MSB':
+            shift = 16 - 8 * position
+        else:
+            shift = 8 * position
+
+        table = []
+        for byteValue in range(256):
+            if bit_format == 'LSB':
+                byteValue = int('{:08b}'.format(byteValue)[::-1], 2)
+            table.append(byteValue << shift)
+
+        tables.append(table)
+
+    return tables
+
+
+def reorder_and_sign(rawValue, tables):
+    # Applies the reading format to 24 bits clocked out MSB first and
+    # converts the result from 24bit twos-complement to a signed value.
+    if tables is not None:
+        rawValue = (tables[0][rawValue >> 16] |
+                    tables[1][(rawValue >> 8) & 0xFF] |
+                    tables[2][rawValue & 0xFF])
+
+    return rawValue - ((rawValue & 0x800000) << 1)
+
 
 class HX711:
 
-    def __init__(self, dout, pd_sck, gain=128):
+    def __init__(self, dout, pd_sck, gain=128, wait_strategy=WAIT_EDGE, backend=None, read_timeout=None,
+                 settle_time=1.0):
         self.PD_SCK = pd_sck
 
         self.DOUT = dout
 
+        # GPIO access goes through a backend (see hx711_backends.py).  The
+        # default one uses RPi.GPIO, like this class always did.
+        self.backend = backend if backend is not None else RPiGPIOBackend()
+
         # Mutex for reading from the HX711, in case multiple threads in client
         # software try to access get values from the class at the same time.
         self.readLock = threading.Lock()
         
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.PD_SCK, GPIO.OUT)
-        GPIO.setup(self.DOUT, GPIO.IN)
+        self.backend.setup_output(self.PD_SCK)
+        self.backend.setup_input(self.DOUT)
 
         self.GAIN = 0
 
@@ -28,15 +94,104 @@ class HX711:
         self.OFFSET_B = 1
         self.lastVal = int(0)
 
+        # Multi-point calibration for channel A, see set_calibration().
+        self.calibration = None
+
         self.DEBUG_PRINTING = False
 
         self.byte_format = 'MSB'
         self.bit_format = 'MSB'
+        self.reorderTables = build_reorder_tables(self.byte_format, self.bit_format)
+
+        # Continuous acquisition state.  While the acquisition thread is
+        # running it clocks every conversion into a ring buffer of
+        # (timestamp, value) tuples, and the read methods consume buffered
+        # samples instead of waiting on fresh conversions.
+        self.sampleBuffer = collections.deque(maxlen=64)
+        self.windowStats = SlidingWindowStats(5)
+        self.sampleCondition = threading.Condition()
+        self.sampleCount = 0
+
+        # Channel scheduling.  With a schedule such as "AAAAB", the trailing
+        # pulses of every read program the channel of the next conversion
+        # from the pattern, so channel B is sampled in between channel A
+        # samples without throwing any conversion away.  Channel A samples
+        # go to sampleBuffer, channel B samples to channelBBuffer.
+        # scheduledChannel is the channel of the conversion in progress.
+        self.channelSchedule = None
+        self.scheduleIndex = 0
+        self.scheduledChannel = 'A'
+        self.channelBBuffer = collections.deque(maxlen=64)
+        self.channelSampleCounts = {'A': 0, 'B': 0}
+
+        # Optional AdaptiveDutyCycle deciding when the acquisition thread
+        # slows down or powers the chip down.  acquisitionWake interrupts
+        # its idle waits.
+        self.dutyCycle = None
+        self.acquisitionWake = threading.Event()
+
+        # Optional hx711_filters.FilterPipeline the acquisition thread runs
+        # channel A samples through before buffering them.
+        self.filterPipeline = None
+
+        # Optional hx711_stats.KalmanWeightEstimator fed with every buffered
+        # channel A sample.
+        self.estimator = None
+
+        # Optional hx711_realtime.RealtimeProfile the acquisition thread runs
+        # under.
+        self.realtimeProfile = None
+
+        # Optional ZeroTracker keeping the channel A offset on the empty
+        # scale's zero.
+        self.zeroTracker = None
+
+        # asyncio subscribers of the sample stream, as (loop, queue, channel)
+        # tuples.  The acquisition thread hands every buffered sample to
+        # their event loops with call_soon_threadsafe(), so nobody polls.
+        self.asyncSubscribers = []
+        self.asyncDroppedSamples = 0
+        self.maxSampleAge = 1.0
+        self.acquisitionThread = None
+        self.acquisitionRunning = False
+        self.poweredUp = True
+
+        # Ready-wait state.  Sleep-polling starts at pollMinDelay seconds and
+        # doubles up to pollMaxDelay, so a 10 SPS conversion costs a handful
+        # of wakeups instead of a pegged core.
+        self.waitStrategy = None
+        self.pollMinDelay = 0.0001
+        self.pollMaxDelay = 0.002
+        self.doutFallingEvent = threading.Event()
+        self.set_wait_strategy(wait_strategy)
+
+        # Read timing instrumentation, off until enable_read_timing().  With
+        # it on, every read is timed, reads that held PD_SCK high for too
+        # long are retried up to readRetries times, and lastReadFailed says
+        # whether the last read ran out of retries.
+        self.readTiming = None
+        self.readRetries = 0
+        self.lastReadFailed = False
+
+        # Deadlines and fault recovery.  readTimeout is how long, in seconds,
+        # a read call that isn't given a timeout may take in total; None
+        # waits forever.  With stallTime set, a chip that keeps DOUT high
+        # that long is power-cycled, up to maxResets times per wait.  Fault
+        # listeners are called as listener(kind, timestamp) and faultCounts
+        # keeps count of every kind.
+        self.readTimeout = read_timeout
+        self.stallTime = None
+        self.maxResets = 0
+        self.faultListeners = []
+        self.faultCounts = {FAULT_STALL: 0, FAULT_RECOVERED: 0, FAULT_TIMEOUT: 0}
 
         self.set_gain(gain)
         
-        # Think about whether this is necessary.
-        time.sleep(1)
+        # Think about whether this is necessary.  set_gain() has already
+        # waited for a conversion, so a warm start (see hx711_calibration.py)
+        # passes settle_time=0.
+        if settle_time > 0:
+            time.sleep(settle_time)
 
 
     def convertFromTwosComplement24bit(self, inputValue):
@@ -44,7 +199,7 @@ class HX711:
 
     
     def is_ready(self):
-        return GPIO.input(self.DOUT) == 0
+        return self.backend.read(self.DOUT) == 0
 
     
     def set_gain(self, gain):
@@ -55,10 +210,20 @@ class HX711:
         elif gain == 32:
             self.GAIN = 2
 
-        GPIO.output(self.PD_SCK, False)
+        deadline = self.deadlineFor(None)
+        self.acquireReadLock(deadline)
+        try:
+            self.backend.write(self.PD_SCK, False)
 
-        # Read out a set of raw bytes and throw it away.
-        self.readRawBytes()
+            # Read out a sample and throw it away.
+            self.readRawIntUnlocked(deadline=deadline)
+            self.scheduledChannel = self.channelForPulses(self.GAIN)
+
+            # Buffered samples were converted with the previous gain/channel.
+            self.clear_buffer()
+
+        finally:
+            self.readLock.release()
 
         
     def get_gain(self):
@@ -77,12 +242,7 @@ class HX711:
        # Clock HX711 Digital Serial Clock (PD_SCK).  DOUT will be
        # ready 1us after PD_SCK rising edge, so we sample after
        # lowering PD_SCL, when we know DOUT will be stable.
-       GPIO.output(self.PD_SCK, True)
-       GPIO.output(self.PD_SCK, False)
-       value = GPIO.input(self.DOUT)
-
-       # Convert Boolean to int and return it.
-       return int(value)
+       return self.backend.clock_bit(self.PD_SCK, self.DOUT)
 
 
     def readNextByte(self):
@@ -102,14 +262,265 @@ class HX711:
        return byteValue 
         
 
-    def readRawBytes(self):
+    def set_wait_strategy(self, strategy):
+        if strategy not in (WAIT_BUSY, WAIT_POLL, WAIT_EDGE):
+            raise ValueError("HX711::set_wait_strategy(): unrecognised strategy: \"%s\"" % strategy)
+
+        if strategy == self.waitStrategy:
+            return
+
+        if self.waitStrategy == WAIT_EDGE:
+            self.backend.remove_edge(self.DOUT)
+
+        if strategy == WAIT_EDGE:
+            try:
+                self.backend.add_falling_edge(self.DOUT, self.doutFalling)
+            except RuntimeError as e:
+                # Edge detection can fail if someone else already owns it on
+                # this pin, or if the backend has no interrupts at all.
+                # Sleep-polling is the next best thing.
+                print("HX711::set_wait_strategy(): edge detection unavailable (%s), using \"%s\"." % (e, WAIT_POLL))
+                strategy = WAIT_POLL
+
+        self.waitStrategy = strategy
+
+
+    def get_wait_strategy(self):
+        return self.waitStrategy
+
+
+    def doutFalling(self, pin):
+        self.doutFallingEvent.set()
+
+
+    def waitForDout(self, limit=None):
+        # Wait until HX711 is ready for us to read a sample, or until the
+        # monotonic time `limit` passes.  Returns whether it's ready.
+        if self.waitStrategy == WAIT_EDGE:
+            while True:
+                # Clear before checking the pin, so an edge that happens in
+                # between still wakes us up.
+                self.doutFallingEvent.clear()
+                if self.is_ready():
+                    return True
+
+                # The timeout only guards against a missed edge.
+                wait = 0.1
+                if limit is not None:
+                    wait = min(wait, limit - time.monotonic())
+                    if wait <= 0:
+                        return False
+                self.doutFallingEvent.wait(wait)
+
+        elif self.waitStrategy == WAIT_POLL:
+            delay = self.pollMinDelay
+            while not self.is_ready():
+                if limit is not None:
+                    remaining = limit - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    delay = min(delay, remaining)
+                time.sleep(delay)
+                delay = min(delay * 2, self.pollMaxDelay)
+
+        elif limit is None:
+            while not self.is_ready():
+               pass
+
+        else:
+            while not self.is_ready():
+                if time.monotonic() >= limit:
+                    return False
+
+        return True
+
+
+    def waitUntilReady(self, deadline=None):
+        # Caller must hold the Read Lock.  Waits for a conversion until the
+        # monotonic deadline (None waits forever), resetting a stalled chip
+        # along the way if set_auto_reset() asked for it, and raises
+        # TimeoutError once the deadline has passed.  Returns how many
+        # resets it took.
+        if self.is_ready():
+            return 0
+
+        resets = 0
+        while True:
+            limit = deadline
+            if self.stallTime is not None and resets < self.maxResets:
+                stallAt = time.monotonic() + self.stallTime
+                if limit is None or stallAt < limit:
+                    limit = stallAt
+
+            if self.waitForDout(limit):
+                if resets:
+                    self.fireFault(FAULT_RECOVERED)
+                return resets
+
+            if deadline is not None and time.monotonic() >= deadline:
+                self.fireFault(FAULT_TIMEOUT)
+                raise TimeoutError("HX711::waitUntilReady(): no conversion from the HX711 before the deadline!")
+
+            self.fireFault(FAULT_STALL)
+            self.resetUnlocked()
+            resets += 1
+
+
+    def acquireReadLock(self, deadline):
+        # The Read Lock, or TimeoutError if whoever holds it doesn't let go
+        # before the deadline.
+        if deadline is None:
+            self.readLock.acquire()
+            return
+
+        if not self.readLock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self.fireFault(FAULT_TIMEOUT)
+            raise TimeoutError("HX711::acquireReadLock(): the HX711 is still busy at the deadline!")
+
+
+    def stallLimit(self):
+        # How long the waits done without the Read Lock may take before
+        # handing over to waitUntilReady(), which can reset the chip.
+        if self.stallTime is None:
+            return None
+
+        return time.monotonic() + self.stallTime
+
+
+    def deadlineFor(self, timeout):
+        # The monotonic deadline of a read call given `timeout` seconds, or
+        # the default read timeout if that's None.  None means no deadline.
+        if timeout is None:
+            timeout = self.readTimeout
+
+        if timeout is None:
+            return None
+
+        if timeout < 0:
+            raise ValueError("HX711::deadlineFor(): timeout can't be negative!")
+
+        return time.monotonic() + timeout
+
+
+    def remainingTime(self, deadline):
+        # What's left of a deadline, as a timeout for another read call.
+        if deadline is None:
+            return None
+
+        return max(0.0, deadline - time.monotonic())
+
+
+    def set_read_timeout(self, timeout):
+        # Default timeout, in seconds, of every read call that isn't given
+        # one: read_raw_int(), read_long(), get_value(), get_weight(),
+        # tare() and friends raise TimeoutError once it's spent, instead of
+        # waiting forever on a chip that never pulls DOUT low.  None waits
+        # forever.
+        if timeout is not None and timeout <= 0:
+            raise ValueError("HX711::set_read_timeout(): timeout must be greater than zero, or None!")
+
+        self.readTimeout = timeout
+
+
+    def get_read_timeout(self):
+        return self.readTimeout
+
+
+    def set_auto_reset(self, stall_time=0.5, max_resets=2):
+        # Power-cycles the HX711 when DOUT stays high for stall_time seconds
+        # in the middle of a wait, up to max_resets times per wait.  At 10
+        # SPS the chip needs 400ms to settle after a reset, so keep
+        # stall_time above that.  stall_time None turns it off.
+        if stall_time is not None and stall_time <= 0:
+            raise ValueError("HX711::set_auto_reset(): stall_time must be greater than zero, or None!")
+
+        if max_resets < 0:
+            raise ValueError("HX711::set_auto_reset(): max_resets can't be negative!")
+
+        self.readLock.acquire()
+        self.stallTime = stall_time
+        self.maxResets = max_resets if stall_time is not None else 0
+        self.readLock.release()
+
+
+    def add_fault_listener(self, listener):
+        # listener(kind, timestamp) is called with FAULT_STALL,
+        # FAULT_RECOVERED or FAULT_TIMEOUT and the monotonic time of the
+        # fault, from the thread that ran into it, which may be holding the
+        # Read Lock: it mustn't read from the HX711 itself.
+        self.faultListeners.append(listener)
+
+
+    def remove_fault_listener(self, listener):
+        self.faultListeners.remove(listener)
+
+
+    def get_fault_counts(self):
+        return dict(self.faultCounts)
+
+
+    def fireFault(self, kind):
+        self.faultCounts[kind] += 1
+        timestamp = time.monotonic()
+
+        if self.DEBUG_PRINTING:
+            print("HX711 fault: %s" % kind)
+
+        for listener in list(self.faultListeners):
+            listener(kind, timestamp)
+
+
+    def resetUnlocked(self):
+        # Caller must hold the Read Lock.  power_down() and power_up() in
+        # one go, for the waits that find the chip stalled.  The chip comes
+        # back converting channel A at gain 128.
+        self.backend.write(self.PD_SCK, False)
+        self.backend.write(self.PD_SCK, True)
+        time.sleep(0.0001)
+        self.backend.write(self.PD_SCK, False)
+        time.sleep(0.0001)
+        self.poweredUp = True
+
+
+    def expectedPulses(self):
+        # Gain pulses that programmed the conversion in progress.
+        if self.channelSchedule is not None:
+            return self.pulsesForChannel(self.scheduledChannel)
+
+        return self.GAIN
+
+
+    def waitForConversion(self, deadline):
+        # Caller must hold the Read Lock.  waitUntilReady(), plus throwing
+        # away the conversion a reset left behind when it isn't on the
+        # channel and gain the read expects.
+        if self.waitUntilReady(deadline) and self.expectedPulses() != 1:
+            pulses = self.expectedPulses()
+            self.backend.shift_in(self.PD_SCK, self.DOUT, 24 + pulses)
+            self.waitUntilReady(deadline)
+
+
+    def readRawBytes(self, timeout=None):
+        deadline = self.deadlineFor(timeout)
+
         # Wait for and get the Read Lock, in case another thread is already
         # driving the HX711 serial interface.
-        self.readLock.acquire()
+        self.acquireReadLock(deadline)
+        try:
+            return self.readRawBytesUnlocked(deadline)
+
+        finally:
+            # Release the Read Lock, now that we've finished driving the HX711
+            # serial interface.
+            self.readLock.release()
 
-        # Wait until HX711 is ready for us to read a sample.
-        while not self.is_ready():
-           pass
+
+    def readRawBytesUnlocked(self, deadline=None):
+        # Caller must hold the Read Lock.
+        self.waitForConversion(deadline)
+
+        if self.readTiming is not None:
+            return self.timedRawBytes(deadline)
 
         # Read three bytes of data from the HX711.
         firstByte  = self.readNextByte()
@@ -122,10 +533,6 @@ class HX711:
            # Clock a bit out of the HX711 and throw it away.
            self.readNextBit()
 
-        # Release the Read Lock, now that we've finished driving the HX711
-        # serial interface.
-        self.readLock.release()           
-
         # Depending on how we're configured, return an ordered list of raw byte
         # values.
         if self.byte_format == 'LSB':
@@ -134,52 +541,153 @@ class HX711:
            return [firstByte, secondByte, thirdByte]
 
 
-    def read_long(self):
-        # Get a sample from the HX711 in the form of raw bytes.
-        dataBytes = self.readRawBytes()
+    def read_raw_int(self, timeout=None):
+        deadline = self.deadlineFor(timeout)
 
+        # Wait for and get the Read Lock, in case another thread is already
+        # driving the HX711 serial interface.
+        self.acquireReadLock(deadline)
+        try:
+            return self.readRawIntUnlocked(deadline=deadline)
+
+        finally:
+            # Release the Read Lock, now that we've finished driving the HX711
+            # serial interface.
+            self.readLock.release()
+
+
+    def readRawIntUnlocked(self, nextGainPulses=None, deadline=None):
+        # Caller must hold the Read Lock.  Same as readRawBytesUnlocked(), but
+        # the 24 bits go straight into a signed int, with no per-bit format
+        # checks and no intermediate byte list.  nextGainPulses overrides the
+        # channel/gain programmed for the next conversion.
+        self.waitForConversion(deadline)
+
+        if nextGainPulses is None:
+            nextGainPulses = self.GAIN
+
+        # The HX711 clocks data out MSB first, plus 1 to 3 pulses that set
+        # the channel and gain of the next conversion.
+        if self.readTiming is None:
+            rawValue = self.backend.shift_in(self.PD_SCK, self.DOUT, 24 + nextGainPulses) >> nextGainPulses
+        else:
+            rawValue = self.timedShiftIn(nextGainPulses, deadline)
 
-        if self.DEBUG_PRINTING:
-            print(dataBytes,)
-        
-        # Join the raw bytes into a single 24bit 2s complement value.
-        twosComplementValue = ((dataBytes[0] << 16) |
-                               (dataBytes[1] << 8)  |
-                               dataBytes[2])
+        return reorder_and_sign(rawValue, self.reorderTables)
+
+
+    def timedShiftIn(self, nextGainPulses, deadline=None):
+        # Caller must hold the Read Lock, with a conversion ready.  Clocks
+        # the 24 data bits in while timing every PD_SCK pulse, and reads the
+        # next conversion instead when a pulse stayed high for too long: the
+        # chip may have powered down halfway and shifted out garbage.  Once
+        # out of retries, the last attempt is returned, and lastReadFailed
+        # flags it.
+        stats = self.readTiming
+        clock = time.perf_counter
+
+        for attempt in range(self.readRetries + 1):
+            if attempt:
+                stats.retries += 1
+                self.waitUntilReady(deadline)
+
+            start = clock()
+            rawValue, longestHigh = self.backend.shift_in_timed(self.PD_SCK, self.DOUT, 24 + nextGainPulses)
+            if not stats.record(clock() - start, longestHigh):
+                self.lastReadFailed = False
+                return rawValue >> nextGainPulses
+
+        stats.drops += 1
+        self.lastReadFailed = True
+        return rawValue >> nextGainPulses
+
+
+    def timedRawBytes(self, deadline=None):
+        # readRawBytesUnlocked() with read timing on.  The three bytes come
+        # out of timedShiftIn() in clock order, and get the same bit and byte
+        # order treatment readNextByte() and readRawBytesUnlocked() give them.
+        rawValue = self.timedShiftIn(self.GAIN, deadline)
+
+        dataBytes = [rawValue >> 16, (rawValue >> 8) & 0xFF, rawValue & 0xFF]
+        if self.bit_format == 'LSB':
+            dataBytes = [int('{:08b}'.format(byteValue)[::-1], 2) for byteValue in dataBytes]
+
+        if self.byte_format == 'LSB':
+           return [dataBytes[2], dataBytes[1], dataBytes[0]]
+        else:
+           return dataBytes
+
+
+    def enable_read_timing(self, max_retries=2, max_sck_high=50e-6, history=1024):
+        # Times every read from now on and retries, up to max_retries times,
+        # the ones that held PD_SCK high for more than max_sck_high seconds
+        # (50us is the datasheet limit).  Timing each pulse makes reads a
+        # little slower.
+        if max_retries < 0:
+            raise ValueError("HX711::enable_read_timing(): max_retries can't be negative!")
+
+        self.readLock.acquire()
+        self.readTiming = ReadTimingStats(max_sck_high, history)
+        self.readRetries = max_retries
+        self.lastReadFailed = False
+        self.readLock.release()
+
+
+    def disable_read_timing(self):
+        self.readLock.acquire()
+        self.readTiming = None
+        self.lastReadFailed = False
+        self.readLock.release()
+
+
+    def get_read_stats(self):
+        # Read counters and timings (see ReadTimingStats.get_stats()), or
+        # None if read timing isn't enabled.
+        stats = self.readTiming
+        if stats is None:
+            return None
+
+        return stats.get_stats()
+
+
+    def read_long(self, timeout=None):
+        # Get a sample from the HX711 as a signed value.
+        signedIntValue = self.read_raw_int(timeout)
 
         if self.DEBUG_PRINTING:
-            print("Twos: 0x%06x" % twosComplementValue)
-        
-        # Convert from 24bit twos-complement to a signed value.
-        signedIntValue = self.convertFromTwosComplement24bit(twosComplementValue)
+            print("Twos: 0x%06x" % (signedIntValue & 0xFFFFFF))
 
         # Record the latest sample value we've read.
         self.lastVal = signedIntValue
 
         # Return the sample value we've read from the HX711.
-        return int(signedIntValue)
+        return signedIntValue
 
     
-    def read_average(self, times=3):
+    def read_average(self, times=3, timeout=None):
         # Make sure we've been asked to take a rational amount of samples.
         if times <= 0:
             raise ValueError("HX711()::read_average(): times must >= 1!!")
 
+        deadline = self.deadlineFor(timeout)
+
         # If we're only average across one value, just read it and return it.
         if times == 1:
-            return self.read_long()
+            return self.collectSamples(1, deadline)[0]
 
         # If we're averaging across a low amount of values, just take the
         # median.
         if times < 5:
-            return self.read_median(times)
+            return self.read_median(times, self.remainingTime(deadline))
+
+        # The acquisition thread may already have the answer.
+        value = self.readWindowStatistic(times, SlidingWindowStats.trimmed_mean, deadline)
+        if value is not None:
+            return value
 
         # If we're taking a lot of samples, we'll collect them in a list, remove
         # the outliers, then take the mean of the remaining set.
-        valueList = []
-
-        for x in range(times):
-            valueList += [self.read_long()]
+        valueList = self.collectSamples(times, deadline)
 
         valueList.sort()
 
@@ -195,106 +703,210 @@ class HX711:
 
     # A median-based read method, might help when getting random value spikes
     # for unknown or CPU-related reasons
-    def read_median(self, times=3):
+    def read_median(self, times=3, timeout=None):
        if times <= 0:
           raise ValueError("HX711::read_median(): times must be greater than zero!")
+
+       deadline = self.deadlineFor(timeout)
       
        # If times == 1, just return a single reading.
        if times == 1:
-          return self.read_long()
+          return self.collectSamples(1, deadline)[0]
 
-       valueList = []
+       # The acquisition thread may already have the answer.
+       value = self.readWindowStatistic(times, SlidingWindowStats.median, deadline)
+       if value is not None:
+          return value
 
-       for x in range(times):
-          valueList += [self.read_long()]
+       valueList = self.collectSamples(times, deadline)
 
        valueList.sort()
 
        # If times is odd we can just take the centre value.
+       midpoint = len(valueList) // 2
        if (times & 0x1) == 0x1:
-          return valueList[len(valueList) // 2]
+          return valueList[midpoint]
        else:
           # If times is even we have to take the arithmetic mean of
           # the two middle values.
-          midpoint = len(valueList) / 2
-          return sum(valueList[midpoint:midpoint+2]) / 2.0
+          return sum(valueList[midpoint-1:midpoint+1]) / 2.0
+
+
+    def collectSamples(self, times, deadline=None):
+        # Use the ring buffer when the acquisition thread is filling it,
+        # otherwise block on fresh conversions, all before the deadline.
+        if self.acquisitionRunning:
+            return self.get_buffered_values(times, timeout=self.remainingTime(deadline))
+
+        return [self.read_long(self.remainingTime(deadline)) for x in range(times)]
+
+
+    def readWindowStatistic(self, times, statistic, deadline=None):
+        # In continuous mode the acquisition thread feeds every sample into
+        # windowStats, so order statistics over the last windowStats.size
+        # samples are ready without collecting or sorting anything.  Returns
+        # None when that isn't the window being asked for.
+        if not self.acquisitionRunning or times != self.windowStats.size:
+            return None
+
+        with self.sampleCondition:
+            self.waitForBufferedSamples(times, self.maxSampleAge, deadline=deadline)
+            return statistic(self.windowStats)
+
+
+    def read_window_stats(self, max_age=None, timeout=None):
+        # Robust estimates over the last windowStats.size buffered samples:
+        # median, trimmed mean (20%) and median absolute deviation.
+        if max_age is None:
+            max_age = self.maxSampleAge
+
+        deadline = self.deadlineFor(timeout)
+
+        with self.sampleCondition:
+            self.waitForBufferedSamples(self.windowStats.size, max_age, deadline=deadline)
+            return {
+                "median": self.windowStats.median(),
+                "trimmed_mean": self.windowStats.trimmed_mean(),
+                "mad": self.windowStats.mad(),
+            }
 
 
     # Compatibility function, uses channel A version
-    def get_value(self, times=3):
-        return self.get_value_A(times)
+    def get_value(self, times=3, timeout=None):
+        return self.get_value_A(times, timeout)
+
+
+    def get_value_A(self, times=3, timeout=None):
+        value = self.read_median(times, timeout)
+
+        # The acquisition thread feeds the zero tracker itself.
+        zeroTracker = self.zeroTracker
+        if zeroTracker is not None and not self.acquisitionRunning:
+            zeroTracker.update(self, time.monotonic(), value)
 
+        return value - self.get_offset_A()
 
-    def get_value_A(self, times=3):
-        return self.read_median(times) - self.get_offset_A()
 
+    def get_value_B(self, times=3, timeout=None):
+        # The channel schedule may already be sampling channel B for us.
+        if self.is_channel_scheduled('B'):
+            valueList = sorted(self.get_buffered_values(times, channel='B', timeout=timeout))
+            midpoint = len(valueList) // 2
+            if times & 0x1:
+                value = valueList[midpoint]
+            else:
+                value = sum(valueList[midpoint-1:midpoint+1]) / 2.0
+            return value - self.get_offset_B()
 
-    def get_value_B(self, times=3):
         # for channel B, we need to set_gain(32)
         g = self.get_gain()
-        self.set_gain(32)
-        value = self.read_median(times) - self.get_offset_B()
-        self.set_gain(g)
+        try:
+            self.set_gain(32)
+            value = self.read_median(times, timeout) - self.get_offset_B()
+        finally:
+            self.set_gain(g)
         return value
 
     # Compatibility function, uses channel A version
-    def get_weight(self, times=3):
-        return self.get_weight_A(times)
+    def get_weight(self, times=3, timeout=None):
+        return self.get_weight_A(times, timeout)
 
 
-    def get_weight_A(self, times=3):
-        value = self.get_value_A(times)
-        value = value / self.REFERENCE_UNIT
+    def get_weight_A(self, times=3, timeout=None):
+        value = self.get_value_A(times, timeout)
+
+        calibration = self.calibration
+        if calibration is not None:
+            value = calibration.weight(value)
+        else:
+            value = value / self.REFERENCE_UNIT
+
+        if self.zeroTracker is not None:
+            value = self.zeroTracker.snap(value)
+
         return value
 
-    def get_weight_B(self, times=3):
-        value = self.get_value_B(times)
+    def get_weight_B(self, times=3, timeout=None):
+        value = self.get_value_B(times, timeout)
         value = value / self.REFERENCE_UNIT_B
         return value
     
 
     # Sets tare for channel A for compatibility purposes
-    def tare(self, times=15):
-        return self.tare_A(times)
+    def tare(self, times=15, timeout=None, instant=False, tolerance=1.0):
+        return self.tare_A(times, timeout, instant, tolerance)
     
     
-    def tare_A(self, times=15):
+    def tare_A(self, times=15, timeout=None, instant=False, tolerance=1.0):
+        # With instant set and continuous acquisition running, the offset
+        # comes straight from the last `times` buffered samples if they're
+        # fresh and steady: within `tolerance` weight units of each other
+        # once the outer 20% are trimmed off.  Otherwise it's the average of
+        # `times` conversions read from now on, as if instant wasn't set.
+        if instant:
+            value = self.steadyBufferedValue(times, tolerance * abs(self.get_reference_unit_A()))
+            if value is not None:
+                if self.DEBUG_PRINTING:
+                    print("Tare A value (buffered):", value)
+
+                self.set_offset_A(value)
+                return value
+
         # Backup REFERENCE_UNIT value
         backupReferenceUnit = self.get_reference_unit_A()
         self.set_reference_unit_A(1)
-        
-        value = self.read_average(times)
+
+        try:
+            if instant and self.acquisitionRunning:
+                # The buffer isn't steady; don't average what's in it.
+                value = trimmedMeanOf(self.waitForFreshValues(times, self.deadlineFor(timeout)))
+            else:
+                value = self.read_average(times, timeout)
+        finally:
+            # Restore the reference unit, offset or not.
+            self.set_reference_unit_A(backupReferenceUnit)
 
         if self.DEBUG_PRINTING:
             print("Tare A value:", value)
         
         self.set_offset_A(value)
 
-        # Restore the reference unit, now that we've got our offset.
-        self.set_reference_unit_A(backupReferenceUnit)
-
         return value
 
 
-    def tare_B(self, times=15):
+    def tare_B(self, times=15, timeout=None):
         # Backup REFERENCE_UNIT value
         backupReferenceUnit = self.get_reference_unit_B()
         self.set_reference_unit_B(1)
 
+        if self.is_channel_scheduled('B'):
+            # Average buffered channel B samples, like read_average() does.
+            try:
+                valueList = sorted(self.get_buffered_values(times, channel='B', timeout=timeout))
+            finally:
+                self.set_reference_unit_B(backupReferenceUnit)
+            trimAmount = int(len(valueList) * 0.2) if times >= 5 else 0
+            valueList = valueList[trimAmount:len(valueList) - trimAmount]
+            value = sum(valueList) / len(valueList)
+
+            self.set_offset_B(value)
+            return value
+
         # for channel B, we need to set_gain(32)
         backupGain = self.get_gain()
-        self.set_gain(32)
 
-        value = self.read_average(times)
+        try:
+            self.set_gain(32)
+            value = self.read_average(times, timeout)
+        finally:
+            # Restore gain/channel/reference unit settings.
+            self.set_gain(backupGain)
+            self.set_reference_unit_B(backupReferenceUnit)
 
         if self.DEBUG_PRINTING:
             print("Tare B value:", value)
         
         self.set_offset_B(value)
-
-        # Restore gain/channel/reference unit settings.
-        self.set_gain(backupGain)
-        self.set_reference_unit_B(backupReferenceUnit)
        
         return value
 
@@ -314,6 +926,8 @@ class HX711:
         else:
             raise ValueError("Unrecognised bitformat: \"%s\"" % bit_format)
 
+        self.reorderTables = build_reorder_tables(self.byte_format, self.bit_format)
+
             
     # sets offset for channel A for compatibility reasons
     def set_offset(self, offset):
@@ -359,7 +973,7 @@ class HX711:
 
 
     def get_reference_unit(self):
-        return get_reference_unit_A()
+        return self.get_reference_unit_A()
 
         
     def get_reference_unit_A(self):
@@ -368,8 +982,24 @@ class HX711:
         
     def get_reference_unit_B(self):
         return self.REFERENCE_UNIT_B
-        
-        
+
+
+    def set_calibration(self, calibration):
+        # calibration is an hx711_calibration.CalibrationProfile that
+        # converts channel A values to weights in place of the reference
+        # unit, or None to go back to the reference unit.  The reference
+        # unit becomes the profile's, so tolerances given in weight units
+        # stay right; setting it afterwards doesn't replace the profile.
+        if calibration is not None:
+            self.set_reference_unit_A(calibration.get_reference_unit())
+
+        self.calibration = calibration
+
+
+    def get_calibration(self):
+        return self.calibration
+
+
     def power_down(self):
         # Wait for and get the Read Lock, in case another thread is already
         # driving the HX711 serial interface.
@@ -378,11 +1008,13 @@ class HX711:
         # Because a rising edge on HX711 Digital Serial Clock (PD_SCK).  We then
         # leave it held up and wait 100us.  After 60us the HX711 should be
         # powered down.
-        GPIO.output(self.PD_SCK, False)
-        GPIO.output(self.PD_SCK, True)
+        self.backend.write(self.PD_SCK, False)
+        self.backend.write(self.PD_SCK, True)
 
         time.sleep(0.0001)
 
+        self.poweredUp = False
+
         # Release the Read Lock, now that we've finished driving the HX711
         # serial interface.
         self.readLock.release()           
@@ -394,11 +1026,14 @@ class HX711:
         self.readLock.acquire()
 
         # Lower the HX711 Digital Serial Clock (PD_SCK) line.
-        GPIO.output(self.PD_SCK, False)
+        self.backend.write(self.PD_SCK, False)
 
         # Wait 100 us for the HX711 to power back up.
         time.sleep(0.0001)
 
+        self.poweredUp = True
+        self.scheduledChannel = 'A'
+
         # Release the Read Lock, now that we've finished driving the HX711
         # serial interface.
         self.readLock.release()
@@ -409,14 +1044,1164 @@ class HX711:
         # correct channel/gain.
         if self.get_gain() != 128:
             self.readRawBytes()
+            self.scheduledChannel = self.channelForPulses(self.GAIN)
+
+
+    def reset(self):
+        self.power_down()
+        self.power_up()
+
+
+    def channelForPulses(self, gainPulses):
+        return 'B' if gainPulses == 2 else 'A'
+
+
+    def pulsesForChannel(self, channel):
+        if channel == 'B':
+            return 2
+
+        # Channel A keeps the gain it's been set to, 128 if we're on B.
+        return 1 if self.GAIN == 2 else self.GAIN
+
+
+    def set_channel_schedule(self, pattern):
+        # pattern is a string or list of 'A'/'B', e.g. "AAAAB" samples
+        # channel A four times for every channel B sample.  None or an empty
+        # pattern turns scheduling off.
+        if pattern:
+            pattern = tuple(pattern)
+            for channel in pattern:
+                if channel not in ('A', 'B'):
+                    raise ValueError("HX711::set_channel_schedule(): invalid channel: \"%s\"" % channel)
+        else:
+            pattern = None
+
+        self.readLock.acquire()
+        self.channelSchedule = pattern
+        self.scheduleIndex = 0
+        self.readLock.release()
+
+
+    def get_channel_schedule(self):
+        return self.channelSchedule
+
+
+    def is_channel_scheduled(self, channel):
+        return (self.acquisitionRunning and
+                self.channelSchedule is not None and
+                channel in self.channelSchedule)
+
+
+    def set_duty_cycle(self, duty_cycle):
+        # duty_cycle is an AdaptiveDutyCycle, or None to read every
+        # conversion.
+        self.dutyCycle = duty_cycle
+        self.acquisitionWake.set()
+
+
+    def get_duty_cycle(self):
+        return self.dutyCycle
+
+
+    def set_zero_tracker(self, zero_tracker):
+        # zero_tracker is a ZeroTracker, or None to leave the offset where
+        # the last tare put it.
+        if zero_tracker is not None:
+            zero_tracker.reset()
+        self.zeroTracker = zero_tracker
+
+
+    def get_zero_tracker(self):
+        return self.zeroTracker
+
+
+    def wake(self):
+        # Go back to full-rate reads right away, e.g. when the user is about
+        # to put something on the scale.
+        if self.dutyCycle is not None:
+            self.dutyCycle.wake(time.monotonic())
+        self.acquisitionWake.set()
+
+
+    def dutyCycleIdle(self, dutyCycle, delay):
+        # Called by the acquisition thread between samples while the duty
+        # cycle controller says the scale is idle.
+        powerDown = dutyCycle.powerDown
+        if powerDown:
+            self.power_down()
+
+        self.acquisitionWake.wait(delay)
+        self.acquisitionWake.clear()
+
+        if powerDown:
+            self.power_up()
+
+            # The first conversions after waking up haven't settled yet.
+            for i in range(dutyCycle.settleSamples - 1):
+                if not self.acquisitionRunning:
+                    break
+
+                self.waitForDout(self.stallLimit() or time.monotonic() + ACQUISITION_WAIT_SLICE)
+                self.readLock.acquire()
+                try:
+                    if self.poweredUp:
+                        self.readRawIntUnlocked(deadline=self.acquisitionDeadline())
+                except TimeoutError:
+                    break
+                finally:
+                    self.readLock.release()
+
+
+    def set_filter_pipeline(self, filters):
+        # filters is an hx711_filters.FilterPipeline, or None to buffer
+        # every sample as read.
+        with self.sampleCondition:
+            self.filterPipeline = filters
+
+
+    def get_filter_pipeline(self):
+        return self.filterPipeline
+
+
+    def get_filter_stats(self):
+        # Samples processed, accepted and rejected per stage by the filter
+        # pipeline, or None without one.
+        if self.filterPipeline is None:
+            return None
+
+        with self.sampleCondition:
+            return self.filterPipeline.get_stats()
+
+
+    def set_estimator(self, estimator):
+        # estimator is an hx711_stats.KalmanWeightEstimator, or None.
+        with self.sampleCondition:
+            self.estimator = estimator
+
+
+    def get_estimator(self):
+        return self.estimator
+
+
+    def get_weight_estimate(self, max_age=None):
+        # The estimator's latest state in reference units: a dict with the
+        # weight, its rate of change per second, the variance of the weight,
+        # whether the estimator has settled since the load last changed and
+        # the timestamp of the sample it's based on.  Waits for a sample
+        # no older than max_age seconds, like the other buffered reads.
+        if self.estimator is None:
+            raise RuntimeError("HX711::get_weight_estimate(): no estimator set!")
+
+        if max_age is None:
+            max_age = self.maxSampleAge
+
+        with self.sampleCondition:
+            # An estimator set while running only sees samples from then on.
+            while True:
+                self.waitForBufferedSamples(1, max_age)
+                estimate = self.estimator.get_estimate()
+                if estimate is not None:
+                    break
+                self.sampleCondition.wait(max_age)
+
+            value, rate, variance = estimate
+            timestamp = self.estimator.timestamp
+            settled = self.estimator.is_settled()
+
+        value = value - self.get_offset_A()
+        calibration = self.calibration
+        if calibration is not None:
+            slope = calibration.slope_at(value)
+            weight = calibration.weight(value)
+        else:
+            slope = 1.0 / self.get_reference_unit_A()
+            weight = value * slope
+
+        return {
+            "timestamp": timestamp,
+            "weight": weight,
+            "rate": rate * slope,
+            "variance": variance * slope * slope,
+            "settled": settled,
+        }
+
+
+    def start_continuous(self, buffer_size=64, max_age=1.0, stats_window=5, schedule=None, duty_cycle=None,
+                         filters=None, estimator=None, realtime=None, zero_tracker=None):
+        # realtime is an hx711_realtime.RealtimeProfile for the acquisition
+        # thread, or None to read with the thread as it comes.
+        if self.acquisitionRunning:
+            return
+
+        if self.acquisitionThread is not None:
+            raise RuntimeError("HX711::start_continuous(): the last acquisition thread hasn't stopped yet!")
+
+        if buffer_size <= 0:
+            raise ValueError("HX711::start_continuous(): buffer_size must be greater than zero!")
+
+        if not 0 < stats_window <= buffer_size:
+            raise ValueError("HX711::start_continuous(): stats_window must be between 1 and buffer_size!")
+
+        with self.sampleCondition:
+            self.sampleBuffer = collections.deque(maxlen=buffer_size)
+            self.channelBBuffer = collections.deque(maxlen=buffer_size)
+            self.windowStats = SlidingWindowStats(stats_window)
+
+        if schedule is not None:
+            self.set_channel_schedule(schedule)
+
+        if duty_cycle is not None:
+            self.set_duty_cycle(duty_cycle)
+
+        if filters is not None:
+            self.set_filter_pipeline(filters)
+
+        if estimator is not None:
+            self.set_estimator(estimator)
+
+        if zero_tracker is not None:
+            self.set_zero_tracker(zero_tracker)
+
+        self.realtimeProfile = realtime
+
+        self.acquisitionWake.clear()
+
+        self.maxSampleAge = max_age
+        self.acquisitionRunning = True
+        self.acquisitionThread = threading.Thread(target=self.acquisitionLoop,
+                                                  name="hx711-acquisition",
+                                                  daemon=True)
+        self.acquisitionThread.start()
+
+
+    def stop_continuous(self, timeout=None):
+        # Raises RuntimeError if the acquisition thread is still running
+        # after timeout seconds; it's still on its way out, and calling
+        # stop_continuous() again waits for it some more.  The default
+        # timeout covers the longest read the thread can be in the middle
+        # of, with a second to spare.
+        thread = self.acquisitionThread
+        if thread is None:
+            return
+
+        if timeout is None:
+            timeout = ACQUISITION_WAIT_SLICE + (self.stallTime or 0.0) + 1.0
+
+        self.acquisitionRunning = False
+        self.acquisitionWake.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            raise RuntimeError("HX711::stop_continuous(): the acquisition thread didn't stop within %s s!" % timeout)
+
+        self.acquisitionThread = None
+
+        # Wake up anybody still waiting on buffered samples, and end the
+        # async streams.
+        with self.sampleCondition:
+            self.sampleCondition.notify_all()
+            subscribers = list(self.asyncSubscribers)
+
+        self.publishAsync(subscribers, None)
+
+
+    def is_continuous(self):
+        return self.acquisitionRunning
+
+
+    def acquisitionDeadline(self):
+        # Deadline of one read by the acquisition thread: long enough for
+        # waitUntilReady() to reset a stalled chip, short enough that a dead
+        # one doesn't keep the thread from noticing it's been stopped.
+        return time.monotonic() + ACQUISITION_WAIT_SLICE + (self.stallTime or 0.0)
+
+
+    def acquisitionLoop(self):
+        profile = self.realtimeProfile
+        if profile is not None:
+            profile.apply()
+
+        while self.acquisitionRunning:
+            # Wait for the conversion without holding the Read Lock, so other
+            # threads get a chance to drive the interface between samples.
+            # A stalled chip is left to the locked read below, which can
+            # reset it; without auto-reset there's nothing it could do, so
+            # just check whether we're still running and wait some more.
+            if (not self.waitForDout(self.stallLimit() or time.monotonic() + ACQUISITION_WAIT_SLICE)
+                    and self.stallTime is None):
+                continue
+
+            if not self.acquisitionRunning:
+                break
+
+            self.readLock.acquire()
+
+            # The chip may have been powered down while we were waiting.  Its
+            # DOUT line stays high until it's powered up again.
+            if not self.poweredUp:
+                self.readLock.release()
+                time.sleep(0.01)
+                continue
+
+            burst = profile.begin_burst() if profile is not None else False
+
+            try:
+                if self.channelSchedule is None:
+                    channel = 'A'
+                    value = self.readRawIntUnlocked(deadline=self.acquisitionDeadline())
+
+                else:
+                    # This read returns the conversion programmed by the
+                    # previous one, and its trailing pulses program the next
+                    # channel.
+                    channel = self.scheduledChannel
+                    nextChannel = self.channelSchedule[self.scheduleIndex]
+                    value = self.readRawIntUnlocked(self.pulsesForChannel(nextChannel),
+                                                    self.acquisitionDeadline())
+                    self.scheduleIndex = (self.scheduleIndex + 1) % len(self.channelSchedule)
+                    self.scheduledChannel = nextChannel
+
+            except TimeoutError:
+                # The fault listeners have heard about it; go round again, so
+                # a stop request gets noticed.
+                value = None
+
+            else:
+                # Out of retries, the sample can't be trusted.
+                if self.lastReadFailed:
+                    value = None
+
+                if value is not None:
+                    if channel == 'A':
+                        self.lastVal = value
+                    value = self.appendSample(time.monotonic(), value, channel)
+
+            finally:
+                if profile is not None:
+                    profile.end_burst(burst)
+                self.readLock.release()
+
+            # Failed and rejected samples don't reach the buffer or the duty
+            # cycle.
+            if value is None:
+                continue
+
+            zeroTracker = self.zeroTracker
+            if zeroTracker is not None and channel == 'A':
+                zeroTracker.update(self, time.monotonic(), value)
+
+            dutyCycle = self.dutyCycle
+            if dutyCycle is not None and channel == 'A':
+                delay = dutyCycle.update(self, time.monotonic(), value)
+                if delay > 0 and self.acquisitionRunning:
+                    self.dutyCycleIdle(dutyCycle, delay)
+
+        # Leave the chip converting on the channel the rest of the class
+        # expects.
+        self.readLock.acquire()
+        try:
+            if self.poweredUp and self.scheduledChannel != self.channelForPulses(self.GAIN):
+                self.readRawIntUnlocked(deadline=self.acquisitionDeadline())
+                self.scheduledChannel = self.channelForPulses(self.GAIN)
+        except TimeoutError:
+            pass
+        finally:
+            self.readLock.release()
+
+        if profile is not None:
+            profile.release()
+
+
+    def appendSample(self, timestamp, value, channel='A'):
+        # Returns the value as buffered, or None if the filter pipeline
+        # rejected it.
+        with self.sampleCondition:
+            if channel == 'A' and self.filterPipeline is not None:
+                value = self.filterPipeline.process(value)
+                if value is None:
+                    return None
+
+            if channel == 'B':
+                self.channelBBuffer.append((timestamp, value))
+            else:
+                self.sampleBuffer.append((timestamp, value))
+                self.windowStats.add(value)
+                if self.estimator is not None:
+                    self.estimator.update(timestamp, value)
+            self.channelSampleCounts[channel] += 1
+            self.sampleCount += 1
+            self.sampleCondition.notify_all()
+
+            # Without a schedule, subscribers of either channel get the
+            # samples of whichever channel the gain selects.
+            subscribers = [subscriber for subscriber in self.asyncSubscribers
+                           if subscriber[2] == channel or self.channelSchedule is None]
+
+        if subscribers:
+            self.publishAsync(subscribers, (timestamp, value))
+
+        return value
+
+
+    def publishAsync(self, subscribers, sample):
+        # Runs on the acquisition thread.  A sample of None ends the streams.
+        for loop, queue, channel in subscribers:
+            try:
+                loop.call_soon_threadsafe(self.deliverAsync, queue, sample)
+            except RuntimeError:
+                # The subscriber's event loop is closed.
+                with self.sampleCondition:
+                    if (loop, queue, channel) in self.asyncSubscribers:
+                        self.asyncSubscribers.remove((loop, queue, channel))
+
+
+    def deliverAsync(self, queue, sample):
+        # Runs on the subscriber's event loop.  A subscriber that falls
+        # behind loses its oldest samples, never the newest.
+        if queue.full():
+            queue.get_nowait()
+            self.asyncDroppedSamples += 1
+        queue.put_nowait(sample)
+
+
+    async def stream(self, channel='A', queue_size=64):
+        # Async generator of (timestamp, value) tuples, one per sample the
+        # acquisition thread buffers from now on:
+        #
+        #     async for timestamp, value in hx.stream():
+        #         ...
+        #
+        # Any number of streams can run at the same time, on one or several
+        # event loops.  The stream ends when continuous acquisition stops.
+        if not self.acquisitionRunning:
+            raise RuntimeError("HX711::stream(): continuous acquisition isn't running!")
+
+        # Validates the channel.
+        self.bufferForChannel(channel)
+
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(queue_size), channel)
+        with self.sampleCondition:
+            self.asyncSubscribers.append(subscriber)
+
+        try:
+            queue = subscriber[1]
+            while True:
+                sample = await queue.get()
+                if sample is None:
+                    return
+                yield sample
+        finally:
+            with self.sampleCondition:
+                if subscriber in self.asyncSubscribers:
+                    self.asyncSubscribers.remove(subscriber)
+
+
+    async def read_weight(self, times=3, max_age=None):
+        # Async version of get_weight() for continuous mode: waits on the
+        # event loop, instead of blocking it, until `times` buffered samples
+        # no older than max_age are there.
+        if max_age is None:
+            max_age = self.maxSampleAge
+
+        if not 0 < times <= self.sampleBuffer.maxlen:
+            raise ValueError("HX711::read_weight(): times must be between 1 and the buffer size (%d)!" % self.sampleBuffer.maxlen)
+
+        if not self.bufferedSamplesReady(times, max_age):
+            samples = self.stream()
+            try:
+                async for sample in samples:
+                    if self.bufferedSamplesReady(times, max_age):
+                        break
+            finally:
+                await samples.aclose()
+
+            # The stream also ends when acquisition stops.
+            if not self.bufferedSamplesReady(times, max_age):
+                raise RuntimeError("HX711::read_weight(): continuous acquisition isn't running!")
+
+        return self.get_weight(times)
+
+
+    def bufferedSamplesReady(self, times, max_age, channel='A'):
+        with self.sampleCondition:
+            buffer = self.bufferForChannel(channel)
+            return (len(buffer) >= times and
+                    time.monotonic() - buffer[-1][0] <= max_age)
+
+
+    def clear_buffer(self):
+        with self.sampleCondition:
+            self.sampleBuffer.clear()
+            self.channelBBuffer.clear()
+            self.windowStats.clear()
+            # The filters' history no longer matches what comes next either.
+            if self.filterPipeline is not None:
+                self.filterPipeline.reset()
+            if self.estimator is not None:
+                self.estimator.reset()
+
+
+    def bufferForChannel(self, channel):
+        # Without a schedule, sampleBuffer holds whatever channel the gain
+        # selects, like the blocking reads do.
+        if channel == 'A':
+            return self.sampleBuffer
+        if channel == 'B':
+            return self.channelBBuffer if self.channelSchedule is not None else self.sampleBuffer
+
+        raise ValueError("HX711::bufferForChannel(): invalid channel: \"%s\"" % channel)
+
+
+    def get_buffered_samples(self, channel='A'):
+        # Returns a snapshot of the ring buffer as (timestamp, value) tuples,
+        # oldest first.
+        with self.sampleCondition:
+            return list(self.bufferForChannel(channel))
+
+
+    def get_buffered_values(self, times=3, max_age=None, channel='A', timeout=None):
+        # Returns the `times` most recent buffered values, waiting for the
+        # acquisition thread until there are enough of them and the newest
+        # one is no older than max_age seconds, or raising TimeoutError once
+        # timeout has passed.
+        if times <= 0:
+            raise ValueError("HX711::get_buffered_values(): times must be greater than zero!")
+
+        buffer = self.bufferForChannel(channel)
+        if times > buffer.maxlen:
+            raise ValueError("HX711::get_buffered_values(): times can't exceed the buffer size (%d)!" % buffer.maxlen)
+
+        if max_age is None:
+            max_age = self.maxSampleAge
+
+        deadline = self.deadlineFor(timeout)
+
+        with self.sampleCondition:
+            self.waitForBufferedSamples(times, max_age, channel, deadline)
+            buffer = self.bufferForChannel(channel)
+            return [value for (timestamp, value) in list(buffer)[-times:]]
+
+
+    def waitForBufferedSamples(self, times, max_age, channel='A', deadline=None):
+        # Caller must hold sampleCondition.
+        while True:
+            if self.bufferedSamplesReady(times, max_age, channel):
+                return
+
+            if not self.acquisitionRunning:
+                raise RuntimeError("HX711::waitForBufferedSamples(): continuous acquisition isn't running!")
+
+            wait = max_age
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    self.fireFault(FAULT_TIMEOUT)
+                    raise TimeoutError("HX711::waitForBufferedSamples(): no fresh samples before the deadline!")
+
+            self.sampleCondition.wait(wait)
+
+
+    def steadyBufferedValue(self, times, maxSpread):
+        # steadyMean() of the last `times` buffered channel A samples, or
+        # None if acquisition isn't running, the samples are stale or too
+        # few, or they aren't steady.
+        if not self.acquisitionRunning:
+            return None
+
+        with self.sampleCondition:
+            if not self.bufferedSamplesReady(times, self.maxSampleAge):
+                return None
+
+            values = [value for (timestamp, value) in list(self.sampleBuffer)[-times:]]
+
+        return steadyMean(values, maxSpread)
+
+
+    def waitForFreshValues(self, times, deadline=None, channel='A'):
+        # The next `times` values the acquisition thread buffers from now on,
+        # skipping everything already in the buffer.
+        buffer = self.bufferForChannel(channel)
+        if times > buffer.maxlen:
+            raise ValueError("HX711::waitForFreshValues(): times can't exceed the buffer size (%d)!" % buffer.maxlen)
+
+        with self.sampleCondition:
+            target = self.channelSampleCounts[channel] + times
+            while self.channelSampleCounts[channel] < target:
+                if not self.acquisitionRunning:
+                    raise RuntimeError("HX711::waitForFreshValues(): continuous acquisition isn't running!")
+
+                wait = self.maxSampleAge
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        self.fireFault(FAULT_TIMEOUT)
+                        raise TimeoutError("HX711::waitForFreshValues(): no fresh samples before the deadline!")
+
+                self.sampleCondition.wait(wait)
+
+            buffer = self.bufferForChannel(channel)
+            return [value for (timestamp, value) in list(buffer)[-times:]]
+
+
+    def wait_for_new_sample(self, timeout=None, channel='A'):
+        # Blocks until the acquisition thread buffers a sample newer than the
+        # ones already seen on the given channel, and returns it as a
+        # (timestamp, value) tuple.  Returns None on timeout.
+        with self.sampleCondition:
+            seen = self.channelSampleCounts[channel]
+            if not self.sampleCondition.wait_for(lambda: self.channelSampleCounts[channel] != seen, timeout):
+                return None
+
+            return self.bufferForChannel(channel)[-1]
+
+
+class AdaptiveDutyCycle:
+
+    # Duty-cycle policy for HX711 continuous acquisition.
+    #
+    # While readings change, every conversion is read (ACTIVE).  Once the
+    # reading has stayed within the noise floor for idle_after seconds, and
+    # sits at the tare level if empty_only is set, the controller goes IDLE:
+    # one sample every idle_interval seconds, with the chip powered down in
+    # between if power_down is set.  The first idle sample that moves past
+    # the noise floor switches back to ACTIVE, so idle_interval (plus
+    # settle_samples conversions when powering down) bounds the wake
+    # latency.
+    #
+    # The noise floor is the larger of noise_sigmas standard deviations,
+    # estimated from the MAD of the HX711's stats window, and min_change in
+    # weight units.
+
+    ACTIVE = 'active'
+    IDLE = 'idle'
+
+    def __init__(self, idle_interval=0.5, idle_after=3.0, min_change=2.0,
+                 noise_sigmas=4.0, power_down=False, settle_samples=4,
+                 empty_only=True):
+        if idle_interval <= 0:
+            raise ValueError("AdaptiveDutyCycle(): idle_interval must be greater than zero!")
+
+        self.idleInterval = idle_interval
+        self.idleAfter = idle_after
+        self.minChange = min_change
+        self.noiseSigmas = noise_sigmas
+        self.powerDown = power_down
+        self.settleSamples = max(1, settle_samples)
+        self.emptyOnly = empty_only
+
+        self.state = self.ACTIVE
+        self.baseline = None
+        self.flatSince = None
+        self.wakeups = 0
+
+
+    def get_state(self):
+        return self.state
+
+
+    def threshold(self, hx):
+        with hx.sampleCondition:
+            if len(hx.windowStats) >= 3:
+                # 1.4826 * MAD estimates the standard deviation of normal noise.
+                noise = self.noiseSigmas * 1.4826 * hx.windowStats.mad()
+            else:
+                noise = 0
+
+        return max(noise, self.minChange * abs(hx.get_reference_unit_A()))
+
+
+    def wake(self, timestamp):
+        if self.state == self.IDLE:
+            self.wakeups += 1
+        self.state = self.ACTIVE
+        self.flatSince = timestamp
+
+
+    def update(self, hx, timestamp, value):
+        # Called with every channel A sample.  Returns how many seconds to
+        # wait before reading the next one.
+        threshold = self.threshold(hx)
+
+        if self.baseline is None or abs(value - self.baseline) > threshold:
+            self.baseline = value
+            self.wake(timestamp)
+            return 0
+
+        if self.state == self.ACTIVE:
+            empty = not self.emptyOnly or abs(value - hx.get_offset_A()) <= threshold
+            if empty and timestamp - self.flatSince >= self.idleAfter:
+                self.state = self.IDLE
+
+        if self.state == self.IDLE:
+            return self.idleInterval
+
+        return 0
+
+
+class ZeroTracker:
+
+    # Automatic zero tracking, like commercial scales do it.
+    #
+    # While the scale is empty and steady, the offset slowly follows the
+    # load cell's thermal drift, so the reading stays at zero without a
+    # blocking tare.  The last `window` readings count as empty and steady
+    # when their median is within `band` weight units of zero and they
+    # don't spread more than twice that.  The offset then moves towards
+    # the median by at most `rate` units per second, and never more than
+    # max_drift units away from where the last tare (or set_offset) put
+    # it: past that the drift is too big to be trusted and needs a proper
+    # tare, and tracking stops until then.  Something placed on the scale
+    # slowly enough to look like drift stops being tracked once it's out
+    # of the band.
+    #
+    # Weights within the band of a tracked zero read as exactly 0 (see
+    # snap()), so "wait until the scale reads 0" loops terminate.
+
+    def __init__(self, band=0.5, rate=0.5, max_drift=20.0, window=5):
+        if band <= 0 or rate <= 0 or max_drift <= 0:
+            raise ValueError("ZeroTracker(): band, rate and max_drift must be greater than zero!")
+
+        if window < 2:
+            raise ValueError("ZeroTracker(): window must be at least 2!")
+
+        self.band = band
+        self.rate = rate
+        self.maxDrift = max_drift
+        self.recent = collections.deque(maxlen=window)
+
+        # Offset the last tare set, and the one we set last, to tell our
+        # own corrections from a new tare.
+        self.zeroOffset = None
+        self.trackedOffset = None
+        self.lastUpdate = None
+
+        self.tracking = False
+        self.limitReached = False
+        self.drift = 0.0
+        self.corrections = 0
+
+
+    def reset(self):
+        self.recent.clear()
+        self.zeroOffset = None
+        self.trackedOffset = None
+        self.lastUpdate = None
+        self.tracking = False
+        self.limitReached = False
+        self.drift = 0.0
+
+
+    def get_state(self):
+        # tracking: the scale is empty and steady and the offset follows it.
+        # drift: how far, in weight units, the offset has moved since the
+        # last tare.  limit_reached: max_drift has been hit; tare again.
+        return {
+            "tracking": self.tracking,
+            "drift": self.drift,
+            "limit_reached": self.limitReached,
+            "corrections": self.corrections,
+        }
+
+
+    def update(self, hx, timestamp, value):
+        # Called with every channel A reading (a raw value, before the
+        # offset).  Returns the correction made to the offset, in raw units.
+        offset = hx.get_offset_A()
+        if offset != self.trackedOffset:
+            # Tared since the last update: start over from the new zero.
+            self.recent.clear()
+            self.zeroOffset = offset
+            self.trackedOffset = offset
+            self.limitReached = False
+
+        unit = abs(hx.get_reference_unit_A())
+        self.drift = (offset - self.zeroOffset) / unit
+
+        elapsed = 0.0 if self.lastUpdate is None else min(timestamp - self.lastUpdate, 1.0)
+        self.lastUpdate = timestamp
+
+        self.recent.append(value)
+        if len(self.recent) < self.recent.maxlen:
+            self.tracking = False
+            return 0
+
+        values = sorted(self.recent)
+        midpoint = len(values) // 2
+        median = values[midpoint] if len(values) & 0x1 else (values[midpoint - 1] + values[midpoint]) / 2.0
+        error = median - offset
+        band = self.band * unit
+
+        self.tracking = abs(error) <= band and values[-1] - values[0] <= 2 * band
+        if not self.tracking or error == 0:
+            return 0
+
+        # Follow slowly, and only as far as max_drift from the tared zero.
+        step = max(-self.rate * unit * elapsed, min(self.rate * unit * elapsed, error))
+        limit = self.maxDrift * unit
+        newOffset = max(self.zeroOffset - limit, min(self.zeroOffset + limit, offset + step))
+        if newOffset != offset + step:
+            self.limitReached = True
+        if newOffset == offset:
+            return 0
+
+        if hx.get_offset_A() != offset:
+            # Tared in the meantime; the tare wins.
+            return 0
+
+        hx.set_offset_A(newOffset)
+        self.trackedOffset = newOffset
+        self.drift = (newOffset - self.zeroOffset) / unit
+        self.corrections += 1
+        return newOffset - offset
+
+
+    def snap(self, weight):
+        # 0 for a weight within the band of a tracked zero, the weight
+        # otherwise.
+        if self.tracking and abs(weight) <= self.band:
+            return 0.0
+
+        return weight
+
+
+class HX711Array:
+
+    # Several HX711s sharing one PD_SCK line, each with its own DOUT.  Every
+    # clock pulse samples all the DOUT pins, so N load cells are read in a
+    # single 25-27 pulse burst instead of N separate reads, and the samples
+    # of all cells come from the same conversion cycle.  Like HX711, every
+    # read call has a deadline of read_timeout seconds unless given a
+    # timeout of its own, and raises TimeoutError once it's spent; None
+    # waits forever.
+
+    def __init__(self, douts, pd_sck, gain=128, wait_strategy=WAIT_POLL, backend=None, read_timeout=None):
+        if len(douts) == 0:
+            raise ValueError("HX711Array(): at least one DOUT pin is required!")
+
+        self.PD_SCK = pd_sck
+        self.DOUTS = list(douts)
+
+        self.backend = backend if backend is not None else RPiGPIOBackend()
+
+        # Mutex for driving the shared clock line.
+        self.readLock = threading.Lock()
+
+        self.backend.setup_output(self.PD_SCK)
+        for dout in self.DOUTS:
+            self.backend.setup_input(dout)
+
+        self.GAIN = 0
+
+        self.REFERENCE_UNITS = [1] * len(self.DOUTS)
+        self.OFFSETS = [1] * len(self.DOUTS)
+        self.lastVals = [0] * len(self.DOUTS)
+
+        self.byte_format = 'MSB'
+        self.bit_format = 'MSB'
+        self.reorderTables = build_reorder_tables(self.byte_format, self.bit_format)
+
+        self.waitStrategy = None
+        self.pollMinDelay = 0.0001
+        self.pollMaxDelay = 0.002
+        self.doutFallingEvent = threading.Event()
+        self.set_wait_strategy(wait_strategy)
+
+        self.readTimeout = None
+        self.set_read_timeout(read_timeout)
+
+        self.set_gain(gain)
+
+
+    def __len__(self):
+        return len(self.DOUTS)
+
+
+    def set_wait_strategy(self, strategy):
+        if strategy not in (WAIT_BUSY, WAIT_POLL, WAIT_EDGE):
+            raise ValueError("HX711Array::set_wait_strategy(): unrecognised strategy: \"%s\"" % strategy)
+
+        if strategy == self.waitStrategy:
+            return
+
+        if self.waitStrategy == WAIT_EDGE:
+            for dout in self.DOUTS:
+                self.backend.remove_edge(dout)
+
+        if strategy == WAIT_EDGE:
+            try:
+                for dout in self.DOUTS:
+                    self.backend.add_falling_edge(dout, self.doutFalling)
+            except RuntimeError as e:
+                for dout in self.DOUTS:
+                    self.backend.remove_edge(dout)
+                print("HX711Array::set_wait_strategy(): edge detection unavailable (%s), using \"%s\"." % (e, WAIT_POLL))
+                strategy = WAIT_POLL
+
+        self.waitStrategy = strategy
+
+
+    def get_wait_strategy(self):
+        return self.waitStrategy
+
+
+    def doutFalling(self, pin):
+        self.doutFallingEvent.set()
+
+
+    def is_ready(self):
+        # Every chip has to have its conversion ready.
+        return not any(self.backend.read_many(self.DOUTS))
+
+
+    def set_read_timeout(self, timeout):
+        # Default timeout, in seconds, of every read call that isn't given
+        # one.  None waits forever.
+        if timeout is not None and timeout <= 0:
+            raise ValueError("HX711Array::set_read_timeout(): timeout must be greater than zero, or None!")
+
+        self.readTimeout = timeout
+
+
+    def get_read_timeout(self):
+        return self.readTimeout
+
+
+    def deadlineFor(self, timeout):
+        # The monotonic deadline of a read call given `timeout` seconds, or
+        # the default read timeout if that's None.  None means no deadline.
+        if timeout is None:
+            timeout = self.readTimeout
+
+        if timeout is None:
+            return None
+
+        if timeout < 0:
+            raise ValueError("HX711Array::deadlineFor(): timeout can't be negative!")
+
+        return time.monotonic() + timeout
+
+
+    def acquireReadLock(self, deadline):
+        # The Read Lock, or TimeoutError if whoever holds it doesn't let go
+        # before the deadline.
+        if deadline is None:
+            self.readLock.acquire()
+            return
+
+        if not self.readLock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise TimeoutError("HX711Array::acquireReadLock(): the HX711s are still busy at the deadline!")
+
+
+    def waitUntilReady(self, deadline=None):
+        # Caller must hold the Read Lock.  Waits until every chip has a
+        # conversion ready, or raises TimeoutError once the monotonic
+        # deadline (None waits forever) has passed.
+        if self.waitStrategy == WAIT_EDGE:
+            while True:
+                self.doutFallingEvent.clear()
+                if self.is_ready():
+                    return
+                wait = 0.1
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        break
+                self.doutFallingEvent.wait(wait)
+
+        elif self.waitStrategy == WAIT_POLL:
+            delay = self.pollMinDelay
+            while not self.is_ready():
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    delay = min(delay, remaining)
+                time.sleep(delay)
+                delay = min(delay * 2, self.pollMaxDelay)
+            else:
+                return
+
+        else:
+            while not self.is_ready():
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+            else:
+                return
+
+        raise TimeoutError("HX711Array::waitUntilReady(): not every HX711 had a conversion ready before the deadline!")
+
+
+    def set_gain(self, gain):
+        if gain == 128:
+            self.GAIN = 1
+        elif gain == 64:
+            self.GAIN = 3
+        elif gain == 32:
+            self.GAIN = 2
+        else:
+            raise ValueError("HX711Array::set_gain(): invalid gain: %s" % gain)
+
+        self.backend.write(self.PD_SCK, False)
+
+        # Read out a set of samples and throw it away, so the next ones come
+        # with the new gain.
+        self.read_raw_ints()
+
+
+    def get_gain(self):
+        if self.GAIN == 1:
+            return 128
+        if self.GAIN == 3:
+            return 64
+        if self.GAIN == 2:
+            return 32
+
+        return 0
+
+
+    def set_reading_format(self, byte_format="MSB", bit_format="MSB"):
+        if byte_format not in ("MSB", "LSB"):
+            raise ValueError("Unrecognised byte_format: \"%s\"" % byte_format)
+
+        if bit_format not in ("MSB", "LSB"):
+            raise ValueError("Unrecognised bitformat: \"%s\"" % bit_format)
+
+        self.byte_format = byte_format
+        self.bit_format = bit_format
+        self.reorderTables = build_reorder_tables(byte_format, bit_format)
+
+
+    def read_raw_ints(self, timeout=None):
+        # One burst: returns the signed value of every chip, in DOUT order.
+        return self.readRawIntsBy(self.deadlineFor(timeout))
+
+
+    def readRawIntsBy(self, deadline):
+        # read_raw_ints() against a monotonic deadline shared with the rest
+        # of the caller's read.
+        self.acquireReadLock(deadline)
+        try:
+            self.waitUntilReady(deadline)
+            rawValues = self.backend.shift_in_many(self.PD_SCK, self.DOUTS, 24 + self.GAIN)
+        finally:
+            self.readLock.release()
+
+        tables = self.reorderTables
+        values = [reorder_and_sign(rawValue >> self.GAIN, tables) for rawValue in rawValues]
+        self.lastVals = values
+        return values
+
+
+    def read_longs(self, times=3, timeout=None):
+        # Per-chip value over `times` bursts: the median for fewer than 5
+        # samples, otherwise the mean with 20% trimmed from each end, like
+        # HX711.read_average().  The timeout covers all the bursts.
+        if times <= 0:
+            raise ValueError("HX711Array::read_longs(): times must be greater than zero!")
+
+        deadline = self.deadlineFor(timeout)
+        samples = [self.readRawIntsBy(deadline) for x in range(times)]
+        if times == 1:
+            return samples[0]
+
+        results = []
+        for chip in range(len(self.DOUTS)):
+            valueList = sorted(sample[chip] for sample in samples)
+            midpoint = len(valueList) // 2
+
+            if times < 5:
+                if times & 0x1:
+                    results.append(valueList[midpoint])
+                else:
+                    results.append(sum(valueList[midpoint-1:midpoint+1]) / 2.0)
+            else:
+                trimAmount = int(len(valueList) * 0.2)
+                valueList = valueList[trimAmount:len(valueList) - trimAmount]
+                results.append(sum(valueList) / len(valueList))
+
+        return results
+
+
+    def get_values(self, times=3, timeout=None):
+        return [value - offset for (value, offset) in zip(self.read_longs(times, timeout), self.OFFSETS)]
+
+
+    def get_weights(self, times=3, timeout=None):
+        return [value / referenceUnit for (value, referenceUnit) in zip(self.get_values(times, timeout), self.REFERENCE_UNITS)]
+
+
+    def get_total_weight(self, times=3, timeout=None):
+        return sum(self.get_weights(times, timeout))
+
+
+    def get_weights_and_total(self, times=3, timeout=None):
+        weights = self.get_weights(times, timeout)
+        return weights, sum(weights)
+
+
+    def tare(self, times=15, timeout=None):
+        values = self.read_longs(times, timeout)
+        self.OFFSETS = list(values)
+        return values
+
+
+    def set_offsets(self, offsets):
+        if len(offsets) != len(self.DOUTS):
+            raise ValueError("HX711Array::set_offsets(): expected %d offsets!" % len(self.DOUTS))
+
+        self.OFFSETS = list(offsets)
+
+
+    def get_offsets(self):
+        return list(self.OFFSETS)
+
+
+    def set_reference_units(self, reference_units):
+        if len(reference_units) != len(self.DOUTS):
+            raise ValueError("HX711Array::set_reference_units(): expected %d reference units!" % len(self.DOUTS))
+
+        if 0 in reference_units:
+            raise ValueError("HX711Array::set_reference_units() can't accept 0 as a reference unit!")
+
+        self.REFERENCE_UNITS = list(reference_units)
+
+
+    def get_reference_units(self):
+        return list(self.REFERENCE_UNITS)
+
+
+    def power_down(self):
+        with self.readLock:
+            # Holding the shared PD_SCK high for more than 60us powers down
+            # every chip on it.
+            self.backend.write(self.PD_SCK, False)
+            self.backend.write(self.PD_SCK, True)
+
+            time.sleep(0.0001)
+
+
+    def power_up(self):
+        with self.readLock:
+            self.backend.write(self.PD_SCK, False)
+
+            time.sleep(0.0001)
+
+        # The chips wake up on channel A with a gain of 128.
+        if self.get_gain() != 128:
+            self.read_raw_ints()
 
 
     def reset(self):
         self.power_down()
         self.power_up()
 
+
 def hx711_add_event_detect(hx711_instance, event_callback):
-        GPIO.add_event_detect(self.DOUT, GPIO.FALLING, 
-            callback=event_callback)
+    # With WAIT_EDGE the instance already owns falling-edge detection on DOUT,
+    # and backends only allow one add_falling_edge() per pin.
+    backend = hx711_instance.backend
+    if hx711_instance.get_wait_strategy() == WAIT_EDGE:
+        backend.add_edge_callback(hx711_instance.DOUT, event_callback)
+    else:
+        backend.add_falling_edge(hx711_instance.DOUT, event_callback)
 
 # EOF - hx711.py
@@ -0,0 +1,579 @@
+import os
+import mmap
+import collections
+import time
+import threading
+
+'''
+GPIO backends for the HX711 drivers.
+
+A backend knows how to configure pins, drive PD_SCK, read DOUT and, when the
+hardware allows it, call back on a DOUT falling edge.  The drivers only ever
+talk to a backend, so the same HX711 code runs on RPi.GPIO, on the libgpiod
+character device, on raw /dev/gpiomem registers, or against FakeGPIOBackend
+on a machine without any GPIO at all.
+
+clock_bit() and shift_in() are the hot path: 25 to 27 bits per sample, so
+backends override them with the cheapest sequence they can do.
+'''
+
+
+class GPIOBackend:
+
+    def setup_output(self, pin):
+        raise NotImplementedError
+
+    def setup_input(self, pin):
+        raise NotImplementedError
+
+    def write(self, pin, value):
+        raise NotImplementedError
+
+    def read(self, pin):
+        raise NotImplementedError
+
+    def clock_bit(self, sck, dout):
+        # Clock PD_SCK high then low and sample DOUT after the falling edge,
+        # when we know it's stable.
+        self.write(sck, 1)
+        self.write(sck, 0)
+        return self.read(dout)
+
+    def shift_in(self, sck, dout, count):
+        # Clock `count` bits in and return them as an int, first bit in the
+        # most significant position.
+        clock_bit = self.clock_bit
+        value = 0
+        for i in range(count):
+            value = (value << 1) | clock_bit(sck, dout)
+        return value
+
+    def shift_in_timed(self, sck, dout, count):
+        # Like shift_in(), but also returns the longest time PD_SCK was held
+        # high, in seconds.  Each pulse is timed from before the rising edge
+        # to after the falling edge, so that's an upper bound.
+        write = self.write
+        read = self.read
+        clock = time.perf_counter
+        value = 0
+        longestHigh = 0.0
+        for i in range(count):
+            start = clock()
+            write(sck, 1)
+            write(sck, 0)
+            high = clock() - start
+            if high > longestHigh:
+                longestHigh = high
+            value = (value << 1) | read(dout)
+        return value, longestHigh
+
+    def read_many(self, pins):
+        return [self.read(pin) for pin in pins]
+
+    def shift_in_many(self, sck, douts, count):
+        # Like shift_in(), but for several chips sharing one PD_SCK line:
+        # every clock pulse samples all the DOUT pins.  Returns one int per
+        # DOUT pin, in the same order.
+        write = self.write
+        read_many = self.read_many
+        values = [0] * len(douts)
+        for i in range(count):
+            write(sck, 1)
+            write(sck, 0)
+            levels = read_many(douts)
+            for chip in range(len(douts)):
+                values[chip] = (values[chip] << 1) | levels[chip]
+        return values
+
+    def add_falling_edge(self, pin, callback):
+        raise RuntimeError("%s doesn't support edge detection" % type(self).__name__)
+
+    def add_edge_callback(self, pin, callback):
+        raise RuntimeError("%s doesn't support edge detection" % type(self).__name__)
+
+    def remove_edge(self, pin):
+        pass
+
+    def cleanup(self):
+        pass
+
+
+class RPiGPIOBackend(GPIOBackend):
+
+    def __init__(self):
+        # Imported here so the drivers can be used without RPi.GPIO installed.
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        GPIO.setmode(GPIO.BCM)
+
+    def setup_output(self, pin):
+        self.GPIO.setup(pin, self.GPIO.OUT)
+
+    def setup_input(self, pin):
+        self.GPIO.setup(pin, self.GPIO.IN)
+
+    def write(self, pin, value):
+        self.GPIO.output(pin, value)
+
+    def read(self, pin):
+        return int(self.GPIO.input(pin))
+
+    def clock_bit(self, sck, dout):
+        output = self.GPIO.output
+        output(sck, True)
+        output(sck, False)
+        return int(self.GPIO.input(dout))
+
+    def add_falling_edge(self, pin, callback):
+        self.GPIO.add_event_detect(pin, self.GPIO.FALLING, callback=callback)
+
+    def add_edge_callback(self, pin, callback):
+        self.GPIO.add_event_callback(pin, callback)
+
+    def remove_edge(self, pin):
+        self.GPIO.remove_event_detect(pin)
+
+    def cleanup(self):
+        self.GPIO.cleanup()
+
+
+class GpiodBackend(GPIOBackend):
+
+    # Uses the libgpiod v1 Python bindings (python3-libgpiod on Raspberry Pi
+    # OS).  Input lines are requested for falling-edge events, which still
+    # lets us read their value, so edge waits don't need to re-request them.
+
+    def __init__(self, chip='gpiochip0', consumer='hx711'):
+        import gpiod
+        self.gpiod = gpiod
+        self.chip = gpiod.Chip(chip)
+        self.consumer = consumer
+        self.lines = {}
+        self.edgeCallbacks = {}
+        self.edgeThreads = {}
+
+    def setup_output(self, pin):
+        line = self.chip.get_line(pin)
+        line.request(consumer=self.consumer,
+                     type=self.gpiod.LINE_REQ_DIR_OUT,
+                     default_vals=[0])
+        self.lines[pin] = line
+
+    def setup_input(self, pin):
+        line = self.chip.get_line(pin)
+        line.request(consumer=self.consumer,
+                     type=self.gpiod.LINE_REQ_EV_FALLING_EDGE)
+        self.lines[pin] = line
+
+    def write(self, pin, value):
+        self.lines[pin].set_value(1 if value else 0)
+
+    def read(self, pin):
+        return self.lines[pin].get_value()
+
+    def clock_bit(self, sck, dout):
+        line = self.lines[sck]
+        line.set_value(1)
+        line.set_value(0)
+        return self.lines[dout].get_value()
+
+    def get_event_fd(self, pin):
+        return self.lines[pin].event_get_fd()
+
+    def add_falling_edge(self, pin, callback):
+        if pin in self.edgeCallbacks:
+            raise RuntimeError("Conflicting edge detection already enabled for pin %d" % pin)
+
+        self.edgeCallbacks[pin] = [callback]
+        thread = threading.Thread(target=self.edgeLoop, args=(pin,),
+                                  name="gpiod-edge-%d" % pin, daemon=True)
+        self.edgeThreads[pin] = thread
+        thread.start()
+
+    def add_edge_callback(self, pin, callback):
+        if pin not in self.edgeCallbacks:
+            raise RuntimeError("Add event detection using add_falling_edge first for pin %d" % pin)
+
+        self.edgeCallbacks[pin].append(callback)
+
+    def remove_edge(self, pin):
+        self.edgeCallbacks.pop(pin, None)
+        thread = self.edgeThreads.pop(pin, None)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def edgeLoop(self, pin):
+        line = self.lines[pin]
+        while pin in self.edgeCallbacks:
+            if not line.event_wait(nsec=100000000):
+                continue
+
+            # Clocking data out toggles DOUT, so edges arrive in bursts.
+            # Drain them all and call back once.
+            line.event_read_multiple()
+            for callback in list(self.edgeCallbacks.get(pin, ())):
+                callback(pin)
+
+    def cleanup(self):
+        for pin in list(self.edgeCallbacks):
+            self.remove_edge(pin)
+
+        for line in self.lines.values():
+            line.release()
+
+        self.lines = {}
+        self.chip.close()
+
+
+class GpiomemBackend(GPIOBackend):
+
+    # Drives the BCM283x/BCM2711 GPIO block directly through an mmap of
+    # /dev/gpiomem: one register store per clock edge and one register load
+    # per sampled bit, with no syscalls or library calls in between.
+    # The Raspberry Pi 5 GPIOs live behind the RP1 chip, which has a
+    # different register layout, so use GpiodBackend there.  There's no
+    # interrupt support, so HX711 falls back to sleep-polling DOUT.
+
+    # Word offsets of the registers we use.
+    GPFSEL0 = 0
+    GPSET0 = 7
+    GPCLR0 = 10
+    GPLEV0 = 13
+
+    def __init__(self, path='/dev/gpiomem'):
+        fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        try:
+            self.mem = mmap.mmap(fd, 4096, mmap.MAP_SHARED,
+                                 mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+        self.regs = memoryview(self.mem).cast('I')
+
+    def setFunction(self, pin, function):
+        register = self.GPFSEL0 + pin // 10
+        shift = (pin % 10) * 3
+        self.regs[register] = (self.regs[register] & ~(0b111 << shift)) | (function << shift)
+
+    def setup_output(self, pin):
+        self.write(pin, 0)
+        self.setFunction(pin, 0b001)
+
+    def setup_input(self, pin):
+        self.setFunction(pin, 0b000)
+
+    def write(self, pin, value):
+        if value:
+            self.regs[self.GPSET0 + (pin >> 5)] = 1 << (pin & 31)
+        else:
+            self.regs[self.GPCLR0 + (pin >> 5)] = 1 << (pin & 31)
+
+    def read(self, pin):
+        return (self.regs[self.GPLEV0 + (pin >> 5)] >> (pin & 31)) & 1
+
+    def clock_bit(self, sck, dout):
+        regs = self.regs
+        mask = 1 << (sck & 31)
+        regs[self.GPSET0 + (sck >> 5)] = mask
+        regs[self.GPCLR0 + (sck >> 5)] = mask
+        return (regs[self.GPLEV0 + (dout >> 5)] >> (dout & 31)) & 1
+
+    def shift_in(self, sck, dout, count):
+        regs = self.regs
+        mask = 1 << (sck & 31)
+        setRegister = self.GPSET0 + (sck >> 5)
+        clearRegister = self.GPCLR0 + (sck >> 5)
+        levelRegister = self.GPLEV0 + (dout >> 5)
+        doutShift = dout & 31
+        value = 0
+        for i in range(count):
+            regs[setRegister] = mask
+            regs[clearRegister] = mask
+            value = (value << 1) | ((regs[levelRegister] >> doutShift) & 1)
+        return value
+
+    def read_many(self, pins):
+        # One register load covers every pin in the bank.
+        levels = self.regs[self.GPLEV0], self.regs[self.GPLEV0 + 1]
+        return [(levels[pin >> 5] >> (pin & 31)) & 1 for pin in pins]
+
+    def shift_in_many(self, sck, douts, count):
+        regs = self.regs
+        mask = 1 << (sck & 31)
+        setRegister = self.GPSET0 + (sck >> 5)
+        clearRegister = self.GPCLR0 + (sck >> 5)
+        levelRegister = self.GPLEV0 + (douts[0] >> 5)
+        if any((dout >> 5) != (douts[0] >> 5) for dout in douts):
+            return GPIOBackend.shift_in_many(self, sck, douts, count)
+
+        # Sample the whole level register once per pulse, and pick the bits
+        # apart afterwards.
+        levels = []
+        for i in range(count):
+            regs[setRegister] = mask
+            regs[clearRegister] = mask
+            levels.append(regs[levelRegister])
+
+        values = []
+        for dout in douts:
+            shift = dout & 31
+            value = 0
+            for level in levels:
+                value = (value << 1) | ((level >> shift) & 1)
+            values.append(value)
+        return values
+
+    def cleanup(self):
+        self.regs.release()
+        self.mem.close()
+
+
+class FakeHX711Chip:
+
+    # Bit-level model of one HX711 as seen from its PD_SCK/DOUT pins.
+    #
+    # sample_source is called with the gain of the conversion (128, 64 or 32)
+    # and returns a signed value, which is clamped to 24 bits like the real
+    # chip does.  sample_rate is in conversions per second.  With None the
+    # next conversion is ready conversion_time seconds after the last pulse
+    # of the previous read, which is as fast as the driver can go; keep it
+    # above the gap between the trailing gain pulses of a read.  Holding
+    # PD_SCK high for power_down_time seconds powers the chip down, mid-read
+    # or not; None disables that check.
+
+    GAIN_PULSES = {1: 128, 2: 32, 3: 64}
+
+    def __init__(self, sample_source=None, sample_rate=None,
+                 conversion_time=0.0001, power_down_time=60e-6):
+        self.sampleSource = sample_source if sample_source is not None else (lambda gain: 0)
+        self.sampleRate = sample_rate
+        self.conversionTime = conversion_time
+        self.powerDownTime = power_down_time
+
+        self.gainPulses = 1
+        self.word = 0
+        self.pulses = 0
+        self.latched = False
+        self.readyAt = 0.0
+        self.sckHigh = False
+        self.sckHighSince = 0.0
+        self.poweredDown = False
+
+        self.conversions = 0
+        self.powerDowns = 0
+        self.poweredDownSince = 0.0
+        self.poweredDownTotal = 0.0
+
+    def conversionPeriod(self):
+        if self.sampleRate is None:
+            return self.conversionTime
+
+        return 1.0 / self.sampleRate
+
+    def nextReadyTime(self, now):
+        # When the conversion started at `now` will be ready.
+        return now + self.conversionPeriod()
+
+    def latchSample(self):
+        value = int(self.sampleSource(self.GAIN_PULSES[self.gainPulses]))
+        value = max(-0x800000, min(0x7fffff, value))
+        self.word = value & 0xffffff
+        self.pulses = 0
+        self.latched = True
+        self.conversions += 1
+
+    def checkPowerDown(self, now):
+        if (self.sckHigh and not self.poweredDown and
+                self.powerDownTime is not None and
+                now - self.sckHighSince >= self.powerDownTime):
+            self.poweredDown = True
+            self.powerDowns += 1
+            self.poweredDownSince = self.sckHighSince + self.powerDownTime
+            self.latched = False
+
+    def sck(self, value, now):
+        if value and not self.sckHigh:
+            self.sckHigh = True
+            self.sckHighSince = now
+            if self.poweredDown or not self.latched:
+                return
+
+            self.pulses += 1
+            if self.pulses > 24:
+                # Pulses 25 to 27 pick the gain and channel of the next
+                # conversion, which starts right away.
+                self.gainPulses = self.pulses - 24
+                self.readyAt = self.nextReadyTime(now)
+
+        elif not value and self.sckHigh:
+            self.checkPowerDown(now)
+            self.sckHigh = False
+            if self.poweredDown:
+                # Waking up resets the chip to channel A, gain 128.
+                self.poweredDownTotal += now - self.poweredDownSince
+                self.poweredDown = False
+                self.gainPulses = 1
+                self.pulses = 0
+                self.readyAt = self.nextReadyTime(now)
+
+    def powered_down_time(self, now):
+        # Total seconds spent powered down so far.
+        if self.poweredDown:
+            return self.poweredDownTotal + now - self.poweredDownSince
+
+        return self.poweredDownTotal
+
+    def dout(self, now):
+        self.checkPowerDown(now)
+        if self.poweredDown:
+            return 1
+
+        if self.latched:
+            if self.pulses == 0:
+                return 0
+            if self.pulses <= 24:
+                return (self.word >> (24 - self.pulses)) & 1
+            if now < self.readyAt:
+                return 1
+            self.latched = False
+
+        if now >= self.readyAt:
+            self.latchSample()
+            return 0
+
+        return 1
+
+
+class FakeGPIOBackend(GPIOBackend):
+
+    # In-memory backend with simulated HX711 chips behind it, so drivers can
+    # be exercised and benchmarked on a plain Linux box.  Register chips with
+    # add_chip(), or let setup_input() create a default one clocked by the
+    # most recently configured output pin.
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.levels = {}
+        self.chips = {}
+        self.chipSck = {}
+        self.lastOutput = None
+        self.edgeCallbacks = {}
+        self.edgeThreads = {}
+
+    def add_chip(self, dout, pd_sck, chip=None, **kwargs):
+        if chip is None:
+            chip = FakeHX711Chip(**kwargs)
+
+        self.chips[dout] = chip
+        self.chipSck[dout] = pd_sck
+        return chip
+
+    def get_chip(self, dout):
+        return self.chips[dout]
+
+    def setup_output(self, pin):
+        self.levels[pin] = 0
+        self.lastOutput = pin
+
+    def setup_input(self, pin):
+        if pin not in self.chips and self.lastOutput is not None:
+            self.add_chip(pin, self.lastOutput)
+
+    def write(self, pin, value):
+        value = 1 if value else 0
+        self.levels[pin] = value
+        now = self.clock()
+        for dout, chip in self.chips.items():
+            if self.chipSck[dout] == pin:
+                chip.sck(value, now)
+
+    def read(self, pin):
+        chip = self.chips.get(pin)
+        if chip is None:
+            return self.levels.get(pin, 0)
+
+        level = chip.dout(self.clock())
+        previous = self.levels.get(pin, 1)
+        # Store the level before the callbacks run: they read the chip too,
+        # and what they leave on the pin is what's there afterwards.
+        self.levels[pin] = level
+        if level == 0 and previous == 1:
+            self.fireEdge(pin)
+        return level
+
+    def fireEdge(self, pin):
+        for callback in list(self.edgeCallbacks.get(pin, ())):
+            callback(pin)
+
+    def add_falling_edge(self, pin, callback):
+        if pin in self.edgeCallbacks:
+            raise RuntimeError("Conflicting edge detection already enabled for pin %d" % pin)
+        self.edgeCallbacks[pin] = [callback]
+
+        # Stand-in for the interrupt: look at DOUT when the chip's next
+        # conversion is due, which fires the callbacks through read().
+        if pin in self.chips:
+            thread = threading.Thread(target=self.edgeLoop, args=(pin,),
+                                      name="fake-edge-%d" % pin, daemon=True)
+            self.edgeThreads[pin] = thread
+            thread.start()
+
+    def add_edge_callback(self, pin, callback):
+        if pin not in self.edgeCallbacks:
+            raise RuntimeError("Add event detection using add_falling_edge first for pin %d" % pin)
+        self.edgeCallbacks[pin].append(callback)
+
+    def remove_edge(self, pin):
+        self.edgeCallbacks.pop(pin, None)
+        thread = self.edgeThreads.pop(pin, None)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def edgeLoop(self, pin):
+        chip = self.chips[pin]
+        while pin in self.edgeCallbacks:
+            time.sleep(max(chip.readyAt - self.clock(), 0.0005))
+            if self.levels.get(pin, 1) == 1:
+                self.read(pin)
+
+    def cleanup(self):
+        for pin in list(self.edgeCallbacks):
+            self.remove_edge(pin)
+
+
+class EdgeTimingBackend(FakeGPIOBackend):
+
+    # FakeGPIOBackend that records when every PD_SCK edge happened, so the
+    # timing a driver actually achieved can be measured without a logic
+    # analyser.  high_times() gives how long each pulse stayed high, which
+    # is what the chip cares about: over 50us breaks the datasheet, over
+    # 60us powers it down.  Only the last max_pulses pulses are kept.
+
+    def __init__(self, clock=time.perf_counter, max_pulses=1000000, **chipArgs):
+        FakeGPIOBackend.__init__(self, clock)
+        self.chipArgs = chipArgs
+        self.highTimes = collections.deque(maxlen=max_pulses)
+        self.risingEdge = None
+
+    def add_chip(self, dout, pd_sck, chip=None, **kwargs):
+        if chip is None:
+            kwargs = dict(self.chipArgs, **kwargs)
+        return FakeGPIOBackend.add_chip(self, dout, pd_sck, chip, **kwargs)
+
+    def write(self, pin, value):
+        FakeGPIOBackend.write(self, pin, value)
+        now = self.clock()
+        if value:
+            self.risingEdge = now
+        elif self.risingEdge is not None:
+            self.highTimes.append(now - self.risingEdge)
+            self.risingEdge = None
+
+    def high_times(self):
+        return list(self.highTimes)
+
+    def clear(self):
+        self.highTimes.clear()
+
+
+# EOF - hx711_backends.py
@@ -0,0 +1,656 @@
+import bisect
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+
+'''
+Persisted zero and calibration for the HX711 scales, and warm starts.
+
+The capture scripts keep the offset of the empty scale in zero_reading.json
+({"zero_reading": offset}) and the calibration in calibration_data.json
+({"reference_unit": ..., "calibration_timestamp": ...}).  Both stay good for
+a long time: the offset only moves with the load cell's thermal drift.
+
+warm_start() loads them back and checks the zero against a few quick
+samples instead of counting down and taring on 15 conversions at every
+start.  Only when the scale has drifted further than max_drift weight units
+from the persisted zero (or there isn't one) does it run a full tare, and it
+saves the new zero so the next start is warm again.  With the HX711 built
+with settle_time=0, that brings a scale from power-on to ready in well under
+a second at 10 SPS: the conversion set_gain() throws away plus `times`
+conversions.
+
+warm_start() works with anything that has the HX711 weight API: HX711,
+HX711Client or the emulator.
+
+A single reference unit is a straight line through zero and one known
+weight.  calibrate() instead weighs several known weights and
+fit_calibration() fits a CalibrationProfile to them by least squares
+(weight = slope * value, value being the reading minus the offset, so the
+line goes through the tare and an empty scale weighs 0).  With
+piecewise=True, the profile also follows the load cell's nonlinearity:
+between two calibration points it adds the straight-line interpolation of
+what the fit got wrong at those points.  Either way the
+profile folds everything into one slope and intercept per segment up front,
+so converting a sample costs one multiply-add (plus a bisect over the
+segments when piecewise).  hx.set_calibration(profile) makes the driver use
+it for channel A weights.
+
+save_calibration() stores the profile in calibration_data.json under
+"profile", with a format version, next to the "reference_unit" older code
+still reads.
+
+A station with several scales, or a fleet of stations sharing a directory,
+keeps them all in one CalibrationRegistry instead: one file of entries
+keyed by device (the station, its host name by default), chip (whatever
+names the load cell and its HX711, e.g. a serial number) and channel.  Each
+entry holds a profile and a persisted zero.  The registry
+
+- writes atomically: a temporary file in the same directory, fsync'd and
+  renamed over the registry, so a crash or power cut leaves either the old
+  or the new registry, never half of one;
+- keeps a SHA-256 checksum of the entries and refuses a file that doesn't
+  match it.  A registry whose file can't be used (unreadable, corrupt,
+  failing its checksum) leaves it as it is and turns read-only: get_error()
+  says why, and updates raise RuntimeError rather than replace the other
+  devices' entries with this one's;
+- caches the parsed profiles in memory.  refresh() only re-reads the file
+  when its size or modification time has changed, and get_registry() hands
+  out one shared registry per path, so reloading a station's configuration
+  costs a stat() rather than a parse.
+
+A profile can follow its chip: get_profile(..., follow_chip=True) on a
+(device, chip, channel) with no profile of its own finds the most recently
+calibrated one the same chip and channel have on another device, so a
+calibrated load cell swapped into another station keeps its calibration.
+Only ask for that when the chip id really names one load cell (a serial
+number, not a pin pair every station shares), or a station that was never
+calibrated silently weighs with another one's calibration.  Zeros stay with
+the device they were taken on.
+import_files() moves a station's calibration_data.json and
+zero_reading.json into the registry.
+'''
+
+# Format version of the "profile" in calibration_data.json.
+PROFILE_VERSION = 1
+
+# Format version of the calibration registry file.
+REGISTRY_VERSION = 1
+
+
+class CalibrationProfile:
+
+    def __init__(self, slope, intercept=0.0, points=(), piecewise=False, timestamp=None):
+        # slope and intercept: the straight-line fit, weight units per value
+        # unit and weight units.  points: the (value, weight) calibration
+        # points it was fitted to; piecewise corrections need at least two
+        # distinct values among them.
+        if slope == 0:
+            raise ValueError("CalibrationProfile(): slope can't be 0!")
+
+        self.slope = float(slope)
+        self.intercept = float(intercept)
+        self.points = [(float(value), float(weight)) for (value, weight) in points]
+        self.piecewise = piecewise
+        self.timestamp = timestamp
+
+        # breaks[i - 1] <= value < breaks[i] uses slopes[i] and intercepts[i].
+        self.breaks = []
+        self.slopes = [self.slope]
+        self.intercepts = [self.intercept]
+        if piecewise:
+            self.buildSegments()
+
+
+    def __repr__(self):
+        return "CalibrationProfile(slope=%r, intercept=%r, points=%d, piecewise=%r)" % (
+            self.slope, self.intercept, len(self.points), self.piecewise)
+
+
+    def buildSegments(self):
+        # The fit's error at each distinct calibration value, duplicates
+        # averaged.
+        errors = {}
+        for value, weight in self.points:
+            errors.setdefault(value, []).append(weight - (self.slope * value + self.intercept))
+
+        if len(errors) < 2:
+            raise ValueError("CalibrationProfile(): piecewise needs at least two distinct calibration values!")
+
+        values = sorted(errors)
+        corrections = [sum(errors[value]) / len(errors[value]) for value in values]
+
+        # Below the first and above the last point, the correction stays
+        # what it is at that point.
+        slopes = [self.slope]
+        intercepts = [self.intercept + corrections[0]]
+        for i in range(len(values) - 1):
+            step = (corrections[i + 1] - corrections[i]) / (values[i + 1] - values[i])
+            slopes.append(self.slope + step)
+            intercepts.append(self.intercept + corrections[i] - step * values[i])
+        slopes.append(self.slope)
+        intercepts.append(self.intercept + corrections[-1])
+
+        self.breaks = values
+        self.slopes = slopes
+        self.intercepts = intercepts
+
+
+    def get_reference_unit(self):
+        # The reference unit of the straight-line fit: value units per
+        # weight unit.
+        return 1.0 / self.slope
+
+
+    def weight(self, value):
+        # value is a reading minus the offset.
+        if not self.breaks:
+            return value * self.slope + self.intercept
+
+        segment = bisect.bisect_right(self.breaks, value)
+        return value * self.slopes[segment] + self.intercepts[segment]
+
+
+    def weights(self, values):
+        if not self.breaks:
+            slope = self.slope
+            intercept = self.intercept
+            return [value * slope + intercept for value in values]
+
+        breaks = self.breaks
+        slopes = self.slopes
+        intercepts = self.intercepts
+        bisectRight = bisect.bisect_right
+        weights = []
+        for value in values:
+            segment = bisectRight(breaks, value)
+            weights.append(value * slopes[segment] + intercepts[segment])
+
+        return weights
+
+
+    def slope_at(self, value):
+        # Weight units per value unit around value, for converting rates
+        # and variances.
+        if not self.breaks:
+            return self.slope
+
+        return self.slopes[bisect.bisect_right(self.breaks, value)]
+
+
+    def get_residuals(self):
+        # What the profile gets wrong at each calibration point, in weight
+        # units.
+        return [weight - self.weight(value) for (value, weight) in self.points]
+
+
+    def to_dict(self):
+        residuals = self.get_residuals()
+        return {
+            "version": PROFILE_VERSION,
+            "slope": self.slope,
+            "intercept": self.intercept,
+            "piecewise": self.piecewise,
+            "points": [[value, weight] for (value, weight) in self.points],
+            "max_error": max((abs(residual) for residual in residuals), default=0.0),
+            "timestamp": self.timestamp,
+        }
+
+
+def fit_calibration(points, piecewise=False):
+    # Least-squares fit of weight = slope * value to (value, weight) points,
+    # value being the reading minus the offset.  The line goes through
+    # (0, 0), the tared empty scale, so an empty scale still weighs 0; the
+    # profile's intercept is always 0.
+    points = [(float(value), float(weight)) for (value, weight) in points]
+    if not points:
+        raise ValueError("fit_calibration(): need at least one calibration point!")
+
+    spread = sum(value ** 2 for (value, weight) in points)
+    if spread == 0:
+        raise ValueError("fit_calibration(): calibration points need non-zero values!")
+
+    slope = sum(value * weight for (value, weight) in points) / spread
+    if slope == 0:
+        raise ValueError("fit_calibration(): calibration points need non-zero weights!")
+
+    return CalibrationProfile(slope, 0.0, points, piecewise,
+                              time.strftime("%Y-%m-%d %H:%M:%S"))
+
+
+def calibrate(hx, known_weights, times=15, piecewise=False, place=None):
+    # Tares hx, then for every known weight calls place(weight) (by default,
+    # asks on the terminal) to have it put on the scale, and reads the value
+    # as the median of `times` conversions.  Returns the fitted profile; the
+    # tare is the (0, 0) point.
+    if not known_weights:
+        raise ValueError("calibrate(): need at least one known weight!")
+
+    if place is None:
+        place = lambda weight: input("Place %sg on the scale and press Enter..." % weight)
+
+    hx.tare(times)
+    points = [(0.0, 0.0)]
+    for knownWeight in known_weights:
+        place(knownWeight)
+        points.append((hx.read_median(times) - hx.get_offset(), knownWeight))
+
+    return fit_calibration(points, piecewise)
+
+
+def load_zero_reading(path):
+    # The persisted offset, or None if there isn't a usable one.
+    try:
+        with open(path, "r") as zeroFile:
+            return float(json.load(zeroFile)["zero_reading"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_zero_reading(path, offset):
+    with open(path, "w") as zeroFile:
+        json.dump({"zero_reading": offset}, zeroFile, indent=4)
+
+
+def load_reference_unit(path):
+    # The persisted reference unit, or None if there isn't a usable one.
+    try:
+        with open(path, "r") as calibrationFile:
+            referenceUnit = float(json.load(calibrationFile)["reference_unit"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    return referenceUnit if referenceUnit != 0 else None
+
+
+def profileFromData(data):
+    # The profile in a calibration_data.json document, or a straight-line
+    # one from its reference unit if it predates profiles.
+    profile = data.get("profile")
+    if profile is None:
+        return CalibrationProfile(1.0 / float(data["reference_unit"]),
+                                  timestamp=data.get("calibration_timestamp"))
+
+    if profile.get("version") != PROFILE_VERSION:
+        raise ValueError("load_calibration(): unknown profile version %r!" % profile.get("version"))
+
+    return CalibrationProfile(profile["slope"], profile["intercept"], profile["points"],
+                              profile["piecewise"], profile.get("timestamp"))
+
+
+def load_calibration(path):
+    # The persisted CalibrationProfile, or None if there isn't a usable one.
+    try:
+        with open(path, "r") as calibrationFile:
+            return profileFromData(json.load(calibrationFile))
+    except (OSError, ValueError, KeyError, TypeError, ZeroDivisionError):
+        return None
+
+
+def save_calibration(path, profile):
+    with open(path, "w") as calibrationFile:
+        json.dump({
+            "reference_unit": profile.get_reference_unit(),
+            "calibration_timestamp": profile.timestamp,
+            "profile": profile.to_dict(),
+        }, calibrationFile, indent=4)
+
+
+class CalibrationRegistry:
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.lock = threading.RLock()
+
+        # Key string -> entry dict, with the profile parsed.
+        self.entries = {}
+        # (size, mtime) of the file the cache was read from, None if it
+        # hasn't been read (or didn't exist).
+        self.stamp = None
+        # Why the file couldn't be used, or None.  While it's set the
+        # registry is read-only.
+        self.error = None
+        self.refresh()
+
+
+    def keyFor(self, device, chip, channel):
+        parts = [str(part) for part in (device, chip, channel)]
+        if any(not part or '/' in part for part in parts):
+            raise ValueError("CalibrationRegistry::keyFor(): device, chip and channel must be non-empty and without '/'!")
+
+        return '/'.join(parts)
+
+
+    def fileStamp(self):
+        try:
+            status = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        return (status.st_size, status.st_mtime_ns)
+
+
+    def refresh(self):
+        # Re-reads the file if it changed since the cache was filled.
+        # Returns True if it did.  A file that can't be used keeps the cache
+        # as it was and makes the registry read-only until the file is
+        # fixed (see get_error()).
+        with self.lock:
+            stamp = self.fileStamp()
+            if stamp == self.stamp:
+                return False
+
+            entries = {}
+            if stamp is not None:
+                try:
+                    with open(self.path, "r") as registryFile:
+                        entries = self.parse(json.load(registryFile))
+                except (OSError, ValueError) as error:
+                    self.error = error
+                    self.stamp = stamp
+                    print("CalibrationRegistry: can't use %s (%s), not writing to it until it's fixed" % (
+                        self.path, error))
+                    return False
+
+            self.entries = entries
+            self.stamp = stamp
+            self.error = None
+            return True
+
+
+    def get_error(self):
+        # Why the registry file can't be used, or None if it can.
+        return self.error
+
+
+    def parse(self, document):
+        if document.get("version") != REGISTRY_VERSION:
+            raise ValueError("CalibrationRegistry::parse(): unknown registry version %r in %s!" % (
+                document.get("version"), self.path))
+
+        rawEntries = document.get("entries", {})
+        if document.get("checksum") != checksumOf(rawEntries):
+            raise ValueError("CalibrationRegistry::parse(): checksum mismatch in %s!" % self.path)
+
+        entries = {}
+        for key, rawEntry in rawEntries.items():
+            entry = dict(rawEntry)
+            if rawEntry.get("profile") is not None:
+                entry["profile"] = profileFromData({"profile": rawEntry["profile"]})
+            entries[key] = entry
+
+        return entries
+
+
+    def write(self):
+        # Atomically replaces the file with the cache.  Call with the lock
+        # held.
+        rawEntries = {}
+        for key, entry in self.entries.items():
+            rawEntry = dict(entry)
+            if entry.get("profile") is not None:
+                rawEntry["profile"] = entry["profile"].to_dict()
+            rawEntries[key] = rawEntry
+
+        document = {
+            "version": REGISTRY_VERSION,
+            "checksum": checksumOf(rawEntries),
+            "entries": rawEntries,
+        }
+
+        directory = os.path.dirname(self.path)
+        temporaryPath = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            with open(temporaryPath, "w") as registryFile:
+                json.dump(document, registryFile, indent=4, sort_keys=True)
+                registryFile.flush()
+                os.fsync(registryFile.fileno())
+            os.replace(temporaryPath, self.path)
+        except BaseException:
+            if os.path.exists(temporaryPath):
+                os.remove(temporaryPath)
+            raise
+
+        # Make the rename itself durable.
+        directoryFd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(directoryFd)
+        except OSError:
+            pass
+        finally:
+            os.close(directoryFd)
+
+        self.stamp = self.fileStamp()
+
+
+    def modify(self, change):
+        # Runs change() on the fresh cache and writes it back if it returns
+        # True, holding the lock against this process's other threads and
+        # (where there's fcntl) an flock on path + ".lock" against other
+        # processes, so no update is lost to a concurrent one.
+        with self.lock:
+            lockFile = None
+            try:
+                import fcntl
+                lockFile = open(self.path + ".lock", "a")
+                fcntl.flock(lockFile, fcntl.LOCK_EX)
+            except ImportError:
+                pass
+
+            try:
+                # Pick up what other processes wrote in the meantime.
+                self.refresh()
+                if self.error is not None:
+                    raise RuntimeError("CalibrationRegistry::modify(): %s can't be used (%s), fix or remove it first!" % (
+                        self.path, self.error))
+                if change():
+                    self.write()
+            finally:
+                if lockFile is not None:
+                    lockFile.close()
+
+
+    def update(self, device, chip, channel, **fields):
+        key = self.keyFor(device, chip, channel)
+
+        def change():
+            entry = dict(self.entries.get(key, {}))
+            entry.update(fields)
+            entry["updated"] = time.time()
+            if "profile" in fields:
+                # When it was calibrated, which zero updates don't change.
+                entry["profile_updated"] = entry["updated"]
+            self.entries[key] = entry
+            return True
+
+        self.modify(change)
+
+
+    def get_entry(self, device, chip, channel='A'):
+        # The entry for exactly this key, as a dict (profile, zero_reading,
+        # updated), or None.
+        entry = self.entries.get(self.keyFor(device, chip, channel))
+        return dict(entry) if entry is not None else None
+
+
+    def get_profile(self, device, chip, channel='A', follow_chip=False):
+        # This key's CalibrationProfile or, without one and with
+        # follow_chip, the most recently calibrated one the same chip and
+        # channel have on another device.  None if there's neither.
+        key = self.keyFor(device, chip, channel)
+        entries = self.entries
+
+        entry = entries.get(key)
+        if entry is not None and entry.get("profile") is not None:
+            return entry["profile"]
+
+        if not follow_chip:
+            return None
+
+        suffix = '/' + key.split('/', 1)[1]
+        candidates = [(candidateKey, candidate) for (candidateKey, candidate) in entries.items()
+                      if candidateKey.endswith(suffix) and candidate.get("profile") is not None]
+        if not candidates:
+            return None
+
+        newestKey, newest = max(candidates, key=lambda candidate: candidate[1].get("profile_updated", 0))
+        print("CalibrationRegistry: no calibration for %s, using the one from %s" % (key, newestKey))
+        return newest["profile"]
+
+
+    def set_profile(self, device, chip, channel, profile):
+        self.update(device, chip, channel, profile=profile)
+
+
+    def get_zero(self, device, chip, channel='A'):
+        entry = self.entries.get(self.keyFor(device, chip, channel))
+        return entry.get("zero_reading") if entry is not None else None
+
+
+    def set_zero(self, device, chip, channel, offset):
+        self.update(device, chip, channel, zero_reading=float(offset))
+
+
+    def remove(self, device, chip, channel='A'):
+        key = self.keyFor(device, chip, channel)
+        self.modify(lambda: self.entries.pop(key, None) is not None)
+
+
+    def keys(self):
+        # (device, chip, channel) of every entry.
+        return [tuple(key.split('/')) for key in sorted(self.entries)]
+
+
+    def apply(self, hx, device, chip, channel='A', follow_chip=False):
+        # Sets hx's calibration and offset from the registry, whatever of
+        # them it has.  Returns True if there was a profile.
+        profile = self.get_profile(device, chip, channel, follow_chip)
+        if profile is not None:
+            hx.set_calibration(profile)
+
+        zero = self.get_zero(device, chip, channel)
+        if zero is not None:
+            hx.set_offset(zero)
+
+        return profile is not None
+
+
+    def import_files(self, device, chip, channel='A', calibration_file=None, zero_file=None):
+        # Fills in what this key is missing from a calibration_data.json and
+        # a zero_reading.json.  Returns True if it imported anything.
+        key = self.keyFor(device, chip, channel)
+        entry = self.entries.get(key, {})
+
+        fields = {}
+        if calibration_file is not None and entry.get("profile") is None:
+            profile = load_calibration(calibration_file)
+            if profile is not None:
+                fields["profile"] = profile
+
+        if zero_file is not None and entry.get("zero_reading") is None:
+            zero = load_zero_reading(zero_file)
+            if zero is not None:
+                fields["zero_reading"] = zero
+
+        if fields:
+            self.update(device, chip, channel, **fields)
+
+        return bool(fields)
+
+
+# One shared registry per path, see get_registry().
+registries = {}
+registriesLock = threading.Lock()
+
+
+def get_registry(path):
+    # The shared CalibrationRegistry for path, refreshed if the file
+    # changed.  If the file can't be used (unreadable, corrupt, failing its
+    # checksum, unknown version) the registry is read-only, with whatever it
+    # had loaded before: check get_error() and have someone look at the
+    # file, which is left untouched.
+    path = os.path.abspath(path)
+    with registriesLock:
+        registry = registries.get(path)
+        if registry is None:
+            registry = CalibrationRegistry(path)
+            registries[path] = registry
+            return registry
+
+    registry.refresh()
+    return registry
+
+
+def default_device():
+    # The name a station goes by in the registry: its host name.
+    return socket.gethostname()
+
+
+def checksumOf(rawEntries):
+    canonical = json.dumps(rawEntries, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def warm_start(hx, zero_file=None, calibration_file=None, times=3, max_drift=2.0, tare=True, tare_times=15,
+               registry=None, key=None):
+    # Sets hx's calibration from calibration_file (if given and usable) and
+    # its offset from zero_file, if `times` quick samples say the empty
+    # scale is still within max_drift weight units of it.  Otherwise, with
+    # `tare`, tares on tare_times samples and saves the new zero; without,
+    # leaves the offset alone for the caller to tare.  With a registry and
+    # a (device, chip, channel) key, both come from and go to the registry
+    # instead of the files.
+    #
+    # Returns a dict: warm (the persisted zero was good), tared (a full tare
+    # ran), drift (weight units between the persisted zero and the scale
+    # now, None without a persisted zero), offset, reference_unit and
+    # elapsed (seconds).
+    if times <= 0:
+        raise ValueError("warm_start(): times must be greater than zero!")
+
+    if registry is None and zero_file is None:
+        raise ValueError("warm_start(): need a zero_file or a registry!")
+
+    start = time.monotonic()
+
+    if registry is not None:
+        profile = registry.get_profile(*key)
+        zero = registry.get_zero(*key)
+        saveZero = lambda offset: registry.set_zero(*key, offset)
+    else:
+        profile = load_calibration(calibration_file) if calibration_file is not None else None
+        zero = load_zero_reading(zero_file)
+        saveZero = lambda offset: save_zero_reading(zero_file, offset)
+
+    if profile is not None:
+        hx.set_calibration(profile)
+
+    referenceUnit = hx.get_reference_unit()
+
+    drift = None
+    if zero is not None:
+        drift = (hx.read_median(times) - zero) / referenceUnit
+
+    warm = drift is not None and abs(drift) <= max_drift
+    tared = False
+    if warm:
+        hx.set_offset(zero)
+    elif tare:
+        hx.tare(tare_times)
+        saveZero(hx.get_offset())
+        tared = True
+
+    return {
+        "warm": warm,
+        "tared": tared,
+        "drift": drift,
+        "offset": hx.get_offset(),
+        "reference_unit": referenceUnit,
+        "elapsed": time.monotonic() - start,
+    }
+
+
+# EOF - hx711_calibration.py
@@ -0,0 +1,670 @@
+import os
+import time
+import signal
+import struct
+import threading
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from hx711_stats import trimmedMeanOf, steadyMean
+
+'''
+Out-of-process HX711 acquisition.
+
+Clocking a sample out of the HX711 from Python holds the GIL for the whole
+burst of PD_SCK pulses.  In a process that is also running MediaPipe,
+matplotlib, JSON logging or boto3, another thread can grab the GIL in the
+middle of a read, PD_SCK stays high for more than 60us, the chip powers
+down and the sample comes out corrupted.
+
+serve() runs the HX711 driver in a process of its own, which does nothing
+but read samples and publish them into a multiprocessing.shared_memory ring
+buffer.  HX711Client attaches to the ring from any other process and has the
+HX711 API the capture scripts use (get_weight, tare, get_offset, ...), with
+the offset and reference unit kept on the client side, so switching a
+script over is a matter of replacing
+
+    hx = HX711(5, 6)
+with
+    hx = HX711Client()
+
+once the daemon is running (python acquisition_daemon.py, or
+AcquisitionDaemon(5, 6).start() from the script itself).
+
+Shared memory layout, native byte order:
+
+    header  magic "HXSM", version, capacity, running flag, requested
+            reading format, daemon's pid, power-down request, reset
+            requests so far, samples published so far (int64)
+    slots   capacity x (sequence number, timestamp, value)
+
+Sample n goes to slot n % capacity.  The daemon marks the slot invalid,
+writes timestamp and value, writes n as the slot's sequence number and only
+then bumps the published count.  A reader takes a slot only if its sequence
+number reads n both before and after the data, so it never returns a sample
+the daemon was overwriting.  Timestamps are time.monotonic(), which is the
+same clock in every process.
+
+The daemon stops on SIGTERM as it does on Ctrl+C or a cleared running flag,
+unlinking the ring on the way out; its reads have a deadline, so it notices
+even with the chip dead.  A ring left behind by a daemon that couldn't clean
+up (SIGKILL, power cut) is recognised by its pid and removed by the next
+one.  AcquisitionDaemon.start() hears back from the child once the HX711
+answered, and raises with the child's error if it didn't, e.g. with no chip
+on the pins; stop() terminates, then kills, a daemon that doesn't stop and
+unlinks the ring itself.
+
+HX711Client's power_down(), power_up() and reset() are requests the daemon
+carries out before its next read.  Channel B and gain changes aren't
+supported: the daemon reads channel A at the gain it was started with.
+'''
+
+MAGIC = b'HXSM'
+VERSION = 2
+HEADER = struct.Struct('=4sIIIIIIIq')
+SLOT = struct.Struct('=qdq')
+INVALID_SEQUENCE = -1
+
+RUNNING_OFFSET = 12
+FORMAT_OFFSET = 16
+PID_OFFSET = 20
+POWER_OFFSET = 24
+RESET_OFFSET = 28
+COUNT_OFFSET = 32
+
+# Deadline, in seconds, of each of the daemon's reads: how long a dead chip
+# can keep it from checking its running flag.
+READ_TIMEOUT = 0.5
+
+# How often a powered down daemon checks for requests, in seconds.
+POWER_DOWN_POLL = 0.05
+
+READING_FORMATS = [("MSB", "MSB"), ("MSB", "LSB"), ("LSB", "MSB"), ("LSB", "LSB")]
+
+
+def serve(dout, pd_sck, name='hx711', capacity=1024, gain=128, backend_factory=None, realtime=None,
+          status=None):
+    # Owns the HX711 and publishes every sample into the shared memory ring
+    # `name` until the ring's running flag is cleared (see
+    # AcquisitionDaemon.stop()) or the process is interrupted.
+    # backend_factory, if given, is called in this process to create the
+    # GPIO backend.  realtime, if given, is an hx711_realtime.RealtimeProfile
+    # the process reads under.  status, if given, is the sending end of a
+    # multiprocessing.Pipe: serve() sends None once the HX711 has answered,
+    # or the error that kept it from starting.
+    from hx711 import HX711
+
+    def reportStatus(error):
+        if status is not None:
+            status.send(error)
+            status.close()
+
+    if capacity <= 0:
+        reportStatus("capacity must be greater than zero")
+        raise ValueError("serve(): capacity must be greater than zero!")
+
+    try:
+        removeStaleRing(name)
+        ring = shared_memory.SharedMemory(name=name, create=True, size=HEADER.size + capacity * SLOT.size)
+    except (OSError, RuntimeError) as e:
+        reportStatus(str(e))
+        raise
+
+    buffer = ring.buf
+
+    # SIGTERM (AcquisitionDaemon.stop() once it's out of patience, systemd,
+    # kill) clears the running flag like stop() does, so the loop below
+    # winds down through the finally block and the ring gets unlinked.
+    # Signal handlers can only be set from the main thread.
+    previousHandler = None
+    if threading.current_thread() is threading.main_thread():
+        def stopOnSignal(signum, frame):
+            struct.pack_into('=I', buffer, RUNNING_OFFSET, 0)
+
+        previousHandler = signal.signal(signal.SIGTERM, stopOnSignal)
+
+    try:
+        HEADER.pack_into(buffer, 0, MAGIC, VERSION, capacity, 1, 0, os.getpid(), 0, 0, 0)
+
+        # With a deadline on every read, a dead or missing chip makes the
+        # constructor raise TimeoutError instead of hanging.  set_gain() has
+        # already waited for a conversion, so there's no need to settle.
+        try:
+            backend = backend_factory() if backend_factory is not None else None
+            hx = HX711(dout, pd_sck, gain=gain, backend=backend, read_timeout=READ_TIMEOUT, settle_time=0)
+        except Exception as e:
+            reportStatus("%s: %s" % (type(e).__name__, e))
+            raise
+
+        reportStatus(None)
+        hx.set_reading_format(*READING_FORMATS[0])
+        formatCode = 0
+        poweredDown = 0
+        resets = 0
+
+        if realtime is not None:
+            realtime.apply()
+
+        count = 0
+        while struct.unpack_from('=I', buffer, RUNNING_OFFSET)[0]:
+            requestedFormat, pid, requestedPower, requestedResets = struct.unpack_from('=IIII', buffer, FORMAT_OFFSET)
+            if requestedFormat != formatCode and requestedFormat < len(READING_FORMATS):
+                hx.set_reading_format(*READING_FORMATS[requestedFormat])
+                formatCode = requestedFormat
+
+            if requestedPower != poweredDown:
+                if requestedPower:
+                    hx.power_down()
+                else:
+                    hx.power_up()
+                poweredDown = requestedPower
+
+            if poweredDown:
+                time.sleep(POWER_DOWN_POLL)
+                continue
+
+            if requestedResets != resets:
+                hx.reset()
+                resets = requestedResets
+
+            burst = realtime.begin_burst() if realtime is not None else False
+            try:
+                value = hx.read_raw_int(READ_TIMEOUT)
+            except TimeoutError:
+                # Nothing to publish; check the running flag and try again.
+                continue
+            finally:
+                if realtime is not None:
+                    realtime.end_burst(burst)
+            timestamp = time.monotonic()
+
+            offset = HEADER.size + (count % capacity) * SLOT.size
+            struct.pack_into('=q', buffer, offset, INVALID_SEQUENCE)
+            struct.pack_into('=dq', buffer, offset + 8, timestamp, value)
+            struct.pack_into('=q', buffer, offset, count)
+            count += 1
+            struct.pack_into('=q', buffer, COUNT_OFFSET, count)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        if previousHandler is not None:
+            signal.signal(signal.SIGTERM, previousHandler)
+        if realtime is not None:
+            realtime.release()
+        struct.pack_into('=I', buffer, RUNNING_OFFSET, 0)
+        del buffer
+        ring.close()
+        ring.unlink()
+
+
+def removeStaleRing(name):
+    # Unlinks the ring `name` if the daemon that created it is gone.
+    # Raises RuntimeError if it's still running.  Returns whether there was
+    # a stale ring.
+    try:
+        ring = attachRing(name)
+    except FileNotFoundError:
+        return False
+
+    try:
+        pid = 0
+        if ring.size >= HEADER.size and bytes(ring.buf[0:4]) == MAGIC:
+            pid = struct.unpack_from('=I', ring.buf, PID_OFFSET)[0]
+    finally:
+        ring.close()
+
+    if pid and pid != os.getpid():
+        try:
+            os.kill(pid, 0)
+            alive = True
+        except ProcessLookupError:
+            alive = False
+        except PermissionError:
+            # Alive, just not ours.
+            alive = True
+
+        if alive:
+            raise RuntimeError("removeStaleRing(): %s belongs to running process %d!" % (name, pid))
+
+    # Attached the tracked way, so unlink() has a registration to drop.
+    try:
+        ring = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+
+    ring.close()
+    ring.unlink()
+    return True
+
+
+class AcquisitionDaemon:
+
+    # Runs serve() in a child process.  The backend factory must be
+    # picklable when multiprocessing doesn't fork.
+
+    def __init__(self, dout, pd_sck, name='hx711', capacity=1024, gain=128, backend_factory=None, realtime=None):
+        self.name = name
+        self.status, childStatus = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(target=serve, name="hx711-daemon",
+                                               args=(dout, pd_sck, name, capacity, gain, backend_factory,
+                                                     realtime, childStatus),
+                                               daemon=True)
+        self.childStatus = childStatus
+
+
+    def start(self, timeout=5.0):
+        # Starts the daemon and waits until its first sample is published.
+        # A ring of the same name left behind by a dead daemon is removed
+        # first; one of a live daemon raises RuntimeError, and so does a
+        # daemon that can't start (no chip answering, for one).
+        removeStaleRing(self.name)
+        # A forked daemon shares our resource tracker only if it's already
+        # running; otherwise the daemon starts one of its own, which outlives
+        # a killed daemon and complains about the ring stop() unlinked.
+        resource_tracker.ensure_running()
+        self.process.start()
+        # Only the child writes to it; closing ours lets recv() see it exit.
+        self.childStatus.close()
+
+        deadline = time.monotonic() + timeout
+        try:
+            error = self.status.recv() if self.status.poll(timeout) else "no answer in %g s" % timeout
+        except EOFError:
+            error = "it exited"
+        if error is not None:
+            self.stop()
+            raise RuntimeError("AcquisitionDaemon::start(): the daemon didn't start (%s)!" % error)
+
+        while time.monotonic() < deadline:
+            try:
+                client = HX711Client(self.name)
+            except FileNotFoundError:
+                time.sleep(0.01)
+                continue
+
+            try:
+                if client.wait_for_new_sample(max(deadline - time.monotonic(), 0.0)) is not None:
+                    return
+            finally:
+                client.close()
+
+            break
+
+        self.stop()
+        raise RuntimeError("AcquisitionDaemon::start(): the daemon didn't publish any sample!")
+
+
+    def stop(self, timeout=2.0):
+        # Clears the running flag, then terminates and finally kills a
+        # daemon that takes longer than `timeout` seconds to go each time.
+        # A daemon that didn't get to unlink the ring leaves it to us.
+        if self.process.pid is None:
+            return
+
+        try:
+            ring = attachRing(self.name)
+        except FileNotFoundError:
+            ring = None
+
+        if ring is not None:
+            struct.pack_into('=I', ring.buf, RUNNING_OFFSET, 0)
+            ring.close()
+
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+        removeStaleRing(self.name)
+
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+
+def attachRing(name):
+    # The daemon owns the ring, so attaching mustn't register it with this
+    # process' resource tracker: the tracker would unlink it when this
+    # process exits or, when the daemon is a child sharing our tracker,
+    # lose the daemon's own registration.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13, attaching always registers.
+        pass
+
+    with trackerLock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+# Serialises attachRing()'s stand-in for resource_tracker.register.
+trackerLock = threading.Lock()
+
+
+class HX711Client:
+
+    # The HX711 API on top of the daemon's ring buffer.  Reads take the most
+    # recent samples the daemon published, waiting for fresh ones when
+    # needed, so they never touch the GPIO.
+
+    def __init__(self, name='hx711', max_age=1.0, timeout=2.0):
+        self.name = name
+        self.ring = attachRing(name)
+        self.buffer = self.ring.buf
+
+        magic, version, capacity, running, formatCode, pid, power, resets, count = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("HX711Client(): %s isn't a version %d HX711 ring buffer!" % (name, VERSION))
+
+        self.capacity = capacity
+
+        # Samples older than maxSampleAge seconds are stale; reads wait up to
+        # timeout seconds for fresh ones before giving up.
+        self.maxSampleAge = max_age
+        self.timeout = timeout
+        self.pollMinDelay = 0.0001
+        self.pollMaxDelay = 0.002
+        self.lastSeen = count
+
+        self.REFERENCE_UNIT = 1
+        self.OFFSET = 1
+        self.calibration = None
+        self.lastVal = int(0)
+
+        self.DEBUG_PRINTING = False
+
+
+    def close(self):
+        if self.ring is None:
+            return
+
+        self.buffer = None
+        self.ring.close()
+        self.ring = None
+
+
+    def published_count(self):
+        return struct.unpack_from('=q', self.buffer, COUNT_OFFSET)[0]
+
+
+    def is_daemon_running(self):
+        return struct.unpack_from('=I', self.buffer, RUNNING_OFFSET)[0] != 0
+
+
+    def readSample(self, n):
+        # Sample n as (timestamp, value), or None if it has been overwritten
+        # (or is being overwritten) already.
+        offset = HEADER.size + (n % self.capacity) * SLOT.size
+        sequence, timestamp, value = SLOT.unpack_from(self.buffer, offset)
+        if sequence != n or struct.unpack_from('=q', self.buffer, offset)[0] != n:
+            return None
+
+        return timestamp, value
+
+
+    def get_buffered_samples(self, times=None):
+        # The most recent samples (up to `times`, or all the ring holds) as
+        # (timestamp, value) tuples, oldest first.
+        count = self.published_count()
+        if times is None or times > self.capacity:
+            times = self.capacity
+
+        samples = []
+        for n in range(max(count - times, 0), count):
+            sample = self.readSample(n)
+            if sample is not None:
+                samples.append(sample)
+
+        return samples
+
+
+    def waitForCount(self, target, timeout):
+        # Polls the published count with an exponential backoff, like
+        # HX711's WAIT_POLL strategy.  Returns the count, which is below
+        # target on timeout.
+        deadline = time.monotonic() + timeout
+        delay = self.pollMinDelay
+        while True:
+            count = self.published_count()
+            if count >= target or time.monotonic() >= deadline:
+                return count
+
+            time.sleep(delay)
+            delay = min(delay * 2, self.pollMaxDelay)
+
+
+    def wait_for_new_sample(self, timeout=None):
+        # Blocks until the daemon publishes a sample newer than the last one
+        # this client has seen, and returns it as a (timestamp, value) tuple.
+        # Returns None on timeout.
+        if timeout is None:
+            timeout = self.timeout
+
+        count = self.waitForCount(self.lastSeen + 1, timeout)
+        if count <= self.lastSeen:
+            return None
+
+        self.lastSeen = count
+        return self.readSample(count - 1)
+
+
+    def get_buffered_values(self, times=3, max_age=None):
+        # Returns the `times` most recent values, waiting for the daemon until
+        # there are enough of them and the newest one is no older than
+        # max_age seconds.
+        if times <= 0:
+            raise ValueError("HX711Client::get_buffered_values(): times must be greater than zero!")
+
+        if times > self.capacity:
+            raise ValueError("HX711Client::get_buffered_values(): times can't exceed the ring size (%d)!" % self.capacity)
+
+        if max_age is None:
+            max_age = self.maxSampleAge
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            samples = self.get_buffered_samples(times)
+            if len(samples) == times and time.monotonic() - samples[-1][0] <= max_age:
+                self.lastSeen = max(self.lastSeen, self.published_count())
+                return [value for (timestamp, value) in samples]
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.is_daemon_running():
+                raise RuntimeError("HX711Client::get_buffered_values(): the acquisition daemon isn't publishing samples!")
+
+            self.waitForCount(self.published_count() + 1, min(remaining, max_age))
+
+
+    def steadyRingValue(self, times, maxSpread):
+        samples = self.get_buffered_samples(times)
+        if len(samples) < times or time.monotonic() - samples[-1][0] > self.maxSampleAge:
+            return None
+
+        return steadyMean([value for (timestamp, value) in samples], maxSpread)
+
+
+    def waitForFreshValues(self, times):
+        if times > self.capacity:
+            raise ValueError("HX711Client::waitForFreshValues(): times can't exceed the ring size (%d)!" % self.capacity)
+
+        target = self.published_count() + times
+        count = self.waitForCount(target, self.timeout)
+        if count < target:
+            raise RuntimeError("HX711Client::waitForFreshValues(): the acquisition daemon isn't publishing samples!")
+
+        self.lastSeen = max(self.lastSeen, count)
+        return [value for (timestamp, value) in self.get_buffered_samples(times)]
+
+
+    def read_long(self):
+        value = self.get_buffered_values(1)[0]
+        self.lastVal = value
+        return value
+
+
+    def read_average(self, times=3):
+        if times <= 0:
+            raise ValueError("HX711Client::read_average(): times must >= 1!!")
+
+        if times == 1:
+            return self.read_long()
+
+        if times < 5:
+            return self.read_median(times)
+
+        valueList = sorted(self.get_buffered_values(times))
+
+        # Trim 20% of outlier samples from top and bottom, like HX711 does.
+        trimAmount = int(len(valueList) * 0.2)
+        valueList = valueList[trimAmount:-trimAmount]
+
+        return sum(valueList) / len(valueList)
+
+
+    def read_median(self, times=3):
+        if times <= 0:
+            raise ValueError("HX711Client::read_median(): times must be greater than zero!")
+
+        if times == 1:
+            return self.read_long()
+
+        valueList = sorted(self.get_buffered_values(times))
+
+        midpoint = len(valueList) // 2
+        if (times & 0x1) == 0x1:
+            return valueList[midpoint]
+        else:
+            return sum(valueList[midpoint-1:midpoint+1]) / 2.0
+
+
+    def get_value(self, times=3):
+        return self.get_value_A(times)
+
+
+    def get_value_A(self, times=3):
+        return self.read_median(times) - self.get_offset_A()
+
+
+    def get_weight(self, times=3):
+        return self.get_weight_A(times)
+
+
+    def get_weight_A(self, times=3):
+        value = self.get_value_A(times)
+        if self.calibration is not None:
+            return self.calibration.weight(value)
+
+        return value / self.REFERENCE_UNIT
+
+
+    def tare(self, times=15, instant=False, tolerance=1.0):
+        return self.tare_A(times, instant, tolerance)
+
+
+    def tare_A(self, times=15, instant=False, tolerance=1.0):
+        # instant and tolerance work like HX711.tare_A()'s: the last `times`
+        # samples in the ring if they're fresh and steady, otherwise the
+        # next `times` the daemon publishes.
+        if instant:
+            value = self.steadyRingValue(times, tolerance * abs(self.REFERENCE_UNIT))
+            if value is None:
+                value = trimmedMeanOf(self.waitForFreshValues(times))
+        else:
+            value = self.read_average(times)
+
+        if self.DEBUG_PRINTING:
+            print("Tare A value:", value)
+
+        self.set_offset_A(value)
+        return value
+
+
+    def power_down(self):
+        # The daemon powers the chip down before its next read and publishes
+        # nothing until power_up().
+        struct.pack_into('=I', self.buffer, POWER_OFFSET, 1)
+
+
+    def power_up(self):
+        struct.pack_into('=I', self.buffer, POWER_OFFSET, 0)
+
+
+    def reset(self):
+        # Has the daemon power-cycle the chip, and waits for a sample it read
+        # after that: the one it may have been reading when asked doesn't
+        # count.
+        resets = struct.unpack_from('=I', self.buffer, RESET_OFFSET)[0]
+        struct.pack_into('=I', self.buffer, RESET_OFFSET, (resets + 1) & 0xffffffff)
+
+        target = self.published_count() + 2
+        count = self.waitForCount(target, self.timeout)
+        if count < target:
+            raise RuntimeError("HX711Client::reset(): the acquisition daemon isn't publishing samples!")
+
+        self.lastSeen = max(self.lastSeen, count)
+
+
+    def set_reading_format(self, byte_format="LSB", bit_format="MSB"):
+        # The daemon applies it before its next read.  Samples already in the
+        # ring keep the format they were read with.
+        if (byte_format, bit_format) not in READING_FORMATS:
+            raise ValueError("Unrecognised reading format: \"%s\"/\"%s\"" % (byte_format, bit_format))
+
+        struct.pack_into('=I', self.buffer, FORMAT_OFFSET, READING_FORMATS.index((byte_format, bit_format)))
+
+
+    def set_offset(self, offset):
+        self.set_offset_A(offset)
+
+    def set_offset_A(self, offset):
+        self.OFFSET = offset
+
+    def get_offset(self):
+        return self.get_offset_A()
+
+    def get_offset_A(self):
+        return self.OFFSET
+
+
+    def set_reference_unit(self, reference_unit):
+        self.set_reference_unit_A(reference_unit)
+
+
+    def set_reference_unit_A(self, reference_unit):
+        if reference_unit == 0:
+            raise ValueError("HX711Client::set_reference_unit_A() can't accept 0 as a reference unit!")
+
+        self.REFERENCE_UNIT = reference_unit
+
+
+    def get_reference_unit(self):
+        return self.get_reference_unit_A()
+
+
+    def get_reference_unit_A(self):
+        return self.REFERENCE_UNIT
+
+
+    def set_calibration(self, calibration):
+        # Like HX711.set_calibration(): a CalibrationProfile, or None.
+        if calibration is not None:
+            self.set_reference_unit_A(calibration.get_reference_unit())
+
+        self.calibration = calibration
+
+
+    def get_calibration(self):
+        return self.calibration
+
+
+# EOF - hx711_daemon.py
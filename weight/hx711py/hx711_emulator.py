@@ -2,75 +2,175 @@ import time
 import random
 import math
 import threading
+from hx711 import build_reorder_tables, reorder_and_sign
+
+'''
+Emulated HX711, with the same API as the HX711 class in hx711.py.
+
+Nothing here touches GPIO or the wall clock.  Time comes from a clock object:
+VirtualClock (the default) only moves when the emulator waits for a
+conversion or when told to sleep, so a day of samples is generated as fast
+as Python can compute them.  RealClock runs at wall-clock speed, for
+interactive demos.  All randomness comes from a random.Random seeded with
+`seed`, so the same seed and the same calls give the same numbers.
+
+The chip is modelled at the word level:
+- Conversions complete every 1 / sample_rate seconds (10 or 80 SPS on real
+  boards).  Reading waits, on the clock, for the next one.
+- Like the real chip, a read returns the conversion programmed by the
+  previous read's gain pulses, so set_gain() throws one sample away.
+- Channel A reads load_A(t) grams, channel B load_B(t) grams.  Each gram is
+  counts_per_gram counts at gain 128, halved at 64 and quartered on B (gain
+  32), plus gaussian noise and zero_counts.  The result saturates at the
+  24-bit limits.
+- Once every glitch_interval conversions on average, a channel A sample is
+  replaced by one of GLITCH_GRAMS, like hardware glitches.
+- power_down()/power_up() go back to channel A, gain 128, and the first
+  samples after powering up come settle_samples conversion periods later.
+
+The default load_A is the original emulator's signal, |sin(20 deg/s * t)|
+times 72 grams.
+'''
+
+
+GLITCH_GRAMS = [0.0, 40.0, 70.0, 150.0, 280.0, 580.0]
+
+
+class VirtualClock:
+
+    # Simulated monotonic time in seconds.  sleep() returns immediately after
+    # moving the clock forward.
+
+    def __init__(self, start=0.0):
+        self.currentTime = float(start)
+
+
+    def now(self):
+        return self.currentTime
+
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.currentTime += seconds
+
+
+    def sleep_until(self, timestamp):
+        if timestamp > self.currentTime:
+            self.currentTime = timestamp
+
+
+class RealClock:
+
+    # Wall-clock time, measured from when the clock was created.
+
+    def __init__(self):
+        self.startTime = time.monotonic()
+
+
+    def now(self):
+        return time.monotonic() - self.startTime
+
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+    def sleep_until(self, timestamp):
+        self.sleep(timestamp - self.now())
+
+
+def sine_load(t):
+    # The original emulator's test signal, in grams.
+    return abs(math.sin(math.radians(t * 20))) * 72.0
+
+
+def no_load(t):
+    return 0.0
 
 
 class HX711:
-    def __init__(self, dout, pd_sck, gain=128):
+
+    def __init__(self, dout, pd_sck, gain=128, seed=None, clock=None, sample_rate=80.0,
+                 load_A=sine_load, load_B=no_load, counts_per_gram=1000.0, zero_counts=0,
+                 noise_counts=300.0, glitch_interval=142, settle_samples=4):
         self.PD_SCK = pd_sck
 
         self.DOUT = dout
 
-        # Last time we've been read.
-        self.lastReadTime = time.time()
-        self.sampleRateHz = 80.0
-        self.resetTimeStamp = time.time()
+        # Virtual clock by default; see VirtualClock and RealClock.
+        self.clock = clock if clock is not None else VirtualClock()
+        self.random = random.Random(seed)
+
+        # Chip model.
+        self.sampleRateHz = float(sample_rate)
+        self.loadA = load_A
+        self.loadB = load_B
+        self.countsPerGram = counts_per_gram
+        self.zeroCounts = zero_counts
+        self.noiseCounts = noise_counts
+        self.glitchInterval = glitch_interval
+        self.settleSamples = settle_samples
+
+        # Conversions complete at conversionEpoch + k / sampleRateHz.
+        # conversionGain holds the gain pulses programmed for the conversion
+        # in progress.  nextConversion is k for the next unread conversion,
+        # and nextReadyTime is when it's done.  k is kept as an integer so
+        # float rounding can't make two reads land on the same conversion.
+        self.conversionEpoch = self.clock.now()
+        self.nextConversion = 0
+        self.nextReadyTime = self.conversionEpoch
+        self.conversionGain = 1
+        self.poweredUp = True
+        self.resetTimeStamp = self.clock.now()
+
         self.sampleCount = 0
-        self.simulateTare = False
+        self.injectedGlitches = 0
 
         # Mutex for reading from the HX711, in case multiple threads in client
         # software try to access get values from the class at the same time.
         self.readLock = threading.Lock()
-        
+
         self.GAIN = 0
-        self.REFERENCE_UNIT = 1  # The value returned by the hx711 that corresponds to your reference unit AFTER dividing by the SCALE.
-        
+
+        # The value returned by the hx711 that corresponds to your reference
+        # unit AFTER dividing by the SCALE.
+        self.REFERENCE_UNIT = 1
+        self.REFERENCE_UNIT_B = 1
+
         self.OFFSET = 1
-        self.lastVal = long(0)
+        self.OFFSET_B = 1
+        self.calibration = None
+        self.lastVal = int(0)
 
         self.DEBUG_PRINTING = False
-        
+
         self.byte_format = 'MSB'
         self.bit_format = 'MSB'
+        self.reorderTables = build_reorder_tables(self.byte_format, self.bit_format)
 
         self.set_gain(gain)
 
 
-
-
-        # Think about whether this is necessary.
-        time.sleep(1)
-
     def convertToTwosComplement24bit(self, inputValue):
-       # HX711 has saturating logic.
-       if inputValue >= 0x7fffff:
-          return 0x7fffff
-
-       # If it's a positive value, just return it, masked with our max value.
-       if inputValue >= 0:
-          return inputValue & 0x7fffff
+        # HX711 has saturating logic.
+        if inputValue >= 0x7fffff:
+            return 0x7fffff
 
-       if inputValue < 0:
-          # HX711 has saturating logic.
-          if inputValue < -0x800000:
-             inputValue = -0x800000
+        if inputValue < -0x800000:
+            inputValue = -0x800000
 
-          diff = inputValue + 0x800000
+        return inputValue & 0xFFFFFF
 
-          return 0x800000 + diff
 
-        
     def convertFromTwosComplement24bit(self, inputValue):
         return -(inputValue & 0x800000) + (inputValue & 0x7fffff)
 
-    
+
     def is_ready(self):
-        # Calculate how long we should be waiting between samples, given the
-        # sample rate.
-        sampleDelaySeconds = 1.0 / self.sampleRateHz
+        return self.poweredUp and self.clock.now() >= self.nextReadyTime
 
-        return time.time() >= self.lastReadTime + sampleDelaySeconds
 
-    
     def set_gain(self, gain):
         if gain == 128:
             self.GAIN = 1
@@ -79,10 +179,10 @@ class HX711:
         elif gain == 32:
             self.GAIN = 2
 
-        # Read out a set of raw bytes and throw it away.
-        self.readRawBytes()
+        # Read out a sample and throw it away.
+        self.read_raw_int()
+
 
-        
     def get_gain(self):
         if self.GAIN == 1:
             return 128
@@ -93,90 +193,101 @@ class HX711:
 
         # Shouldn't get here.
         return 0
-        
+
+
+    def waitUntilReady(self):
+        # Sleeps on the clock until the next conversion is done.  A virtual
+        # clock just jumps there.
+        if not self.poweredUp:
+            raise RuntimeError("HX711::waitUntilReady(): the emulated HX711 is powered down!")
+
+        self.clock.sleep_until(self.nextReadyTime)
+
+
+    def readRawWordUnlocked(self):
+        # Caller must hold the Read Lock.  Returns the 24 bits as the chip
+        # clocks them out, MSB first.
+        self.waitUntilReady()
+
+        now = self.clock.now()
+        gainPulses = self.conversionGain
+
+        rawSample = self.convertToTwosComplement24bit(self.generateFakeSample(now, gainPulses))
+
+        # The trailing pulses of this read program the next conversion, which
+        # completes at the next conversion boundary after now.
+        self.conversionGain = self.GAIN
+        period = 1.0 / self.sampleRateHz
+        conversions = max(self.nextConversion + 1,
+                          math.floor((now - self.conversionEpoch) / period) + 1)
+        self.nextConversion = conversions
+        self.nextReadyTime = self.conversionEpoch + conversions * period
+
+        return rawSample
+
 
     def readRawBytes(self):
         # Wait for and get the Read Lock, incase another thread is already
         # driving the virtual HX711 serial interface.
         self.readLock.acquire()
+        rawSample = self.readRawWordUnlocked()
+        self.readLock.release()
 
-        # Wait until HX711 is ready for us to read a sample.
-        while not self.is_ready():
-           pass
-
-        self.lastReadTime = time.time()
-
-        # Generate a 24bit 2s complement sample for the virtual HX711.
-        rawSample = self.convertToTwosComplement24bit(self.generateFakeSample())
-        
-        # Read three bytes of data from the HX711.
-        firstByte  = (rawSample >> 16) & 0xFF
-        secondByte = (rawSample >> 8)  & 0xFF
-        thirdByte  = rawSample & 0xFF
-
-        # Release the Read Lock, now that we've finished driving the virtual HX711
-        # serial interface.
-        self.readLock.release()           
+        # Read three bytes of data from the HX711, in clock order, with the
+        # same bit order treatment hx711.HX711.readNextByte() gives them.
+        dataBytes = [(rawSample >> 16) & 0xFF, (rawSample >> 8) & 0xFF, rawSample & 0xFF]
+        if self.bit_format == 'LSB':
+            dataBytes = [int('{:08b}'.format(byteValue)[::-1], 2) for byteValue in dataBytes]
 
         # Depending on how we're configured, return an orderd list of raw byte
         # values.
         if self.byte_format == 'LSB':
-           return [thirdByte, secondByte, firstByte]
+            return [dataBytes[2], dataBytes[1], dataBytes[0]]
         else:
-           return [firstByte, secondByte, thirdByte]
+            return dataBytes
 
 
-    def read_long(self):
-        # Get a sample from the HX711 in the form of raw bytes.
-        dataBytes = self.readRawBytes()
+    def read_raw_int(self):
+        # Same as hx711.HX711.read_raw_int(): the sample as a signed int,
+        # reordered according to the reading format.
+        self.readLock.acquire()
+        rawSample = self.readRawWordUnlocked()
+        self.readLock.release()
 
+        return reorder_and_sign(rawSample, self.reorderTables)
 
-        if self.DEBUG_PRINTING:
-            print(dataBytes,)
-        
-        # Join the raw bytes into a single 24bit 2s complement value.
-        twosComplementValue = ((dataBytes[0] << 16) |
-                               (dataBytes[1] << 8)  |
-                               dataBytes[2])
+
+    def read_long(self):
+        # Get a sample from the HX711 as a signed value.
+        signedIntValue = self.read_raw_int()
 
         if self.DEBUG_PRINTING:
-            print("Twos: 0x%06x" % twosComplementValue)
-        
-        # Convert from 24bit twos-complement to a signed value.
-        signedIntValue = self.convertFromTwosComplement24bit(twosComplementValue)
+            print("Twos: 0x%06x" % (signedIntValue & 0xFFFFFF))
 
         # Record the latest sample value we've read.
         self.lastVal = signedIntValue
 
         # Return the sample value we've read from the HX711.
-        return int(signedIntValue)
+        return signedIntValue
+
 
-    
     def read_average(self, times=3):
         # Make sure we've been asked to take a rational amount of samples.
         if times <= 0:
-            print("HX711().read_average(): times must >= 1!!  Assuming value of 1.")
-            times = 1
+            raise ValueError("HX711()::read_average(): times must >= 1!!")
 
         # If we're only average across one value, just read it and return it.
         if times == 1:
             return self.read_long()
 
-        # If we're averaging across a low amount of values, just take an
-        # arithmetic mean.
+        # If we're averaging across a low amount of values, just take the
+        # median.
         if times < 5:
-            values = int(0)
-            for i in range(times):
-                values += self.read_long()
-
-            return values / times
+            return self.read_median(times)
 
         # If we're taking a lot of samples, we'll collect them in a list, remove
         # the outliers, then take the mean of the remaining set.
-        valueList = []
-
-        for x in range(times):
-            valueList += [self.read_long()]
+        valueList = [self.read_long() for x in range(times)]
 
         valueList.sort()
 
@@ -189,142 +300,257 @@ class HX711:
         # Return the mean of remaining samples.
         return sum(valueList) / len(valueList)
 
-    
+
+    def read_median(self, times=3):
+        if times <= 0:
+            raise ValueError("HX711::read_median(): times must be greater than zero!")
+
+        # If times == 1, just return a single reading.
+        if times == 1:
+            return self.read_long()
+
+        valueList = [self.read_long() for x in range(times)]
+
+        valueList.sort()
+
+        # If times is odd we can just take the centre value.
+        midpoint = len(valueList) // 2
+        if (times & 0x1) == 0x1:
+            return valueList[midpoint]
+        else:
+            # If times is even we have to take the arithmetic mean of
+            # the two middle values.
+            return sum(valueList[midpoint-1:midpoint+1]) / 2.0
+
+
+    # Compatibility function, uses channel A version
     def get_value(self, times=3):
-        return self.read_average(times) - self.OFFSET
+        return self.get_value_A(times)
+
+
+    def get_value_A(self, times=3):
+        return self.read_median(times) - self.get_offset_A()
 
-    
+
+    def get_value_B(self, times=3):
+        # for channel B, we need to set_gain(32)
+        g = self.get_gain()
+        self.set_gain(32)
+        value = self.read_median(times) - self.get_offset_B()
+        self.set_gain(g)
+        return value
+
+
+    # Compatibility function, uses channel A version
     def get_weight(self, times=3):
-        value = self.get_value(times)
-        value = value / self.REFERENCE_UNIT
+        return self.get_weight_A(times)
+
+
+    def get_weight_A(self, times=3):
+        value = self.get_value_A(times)
+        if self.calibration is not None:
+            return self.calibration.weight(value)
+
+        return value / self.REFERENCE_UNIT
+
+
+    def get_weight_B(self, times=3):
+        value = self.get_value_B(times)
+        value = value / self.REFERENCE_UNIT_B
         return value
 
-    
+
+    # Sets tare for channel A for compatibility purposes
     def tare(self, times=15):
-        # If we aren't simulating Taring because it takes too long, just skip it.
-        if not self.simulateTare:
-            return 0
+        return self.tare_A(times)
+
 
+    def tare_A(self, times=15):
         # Backup REFERENCE_UNIT value
-        reference_unit = self.REFERENCE_UNIT
-        self.set_reference_unit(1)
+        backupReferenceUnit = self.get_reference_unit_A()
+        self.set_reference_unit_A(1)
 
         value = self.read_average(times)
 
         if self.DEBUG_PRINTING:
-            print("Tare value:", value)
-        
-        self.set_offset(value)
+            print("Tare A value:", value)
+
+        self.set_offset_A(value)
 
         # Restore the reference unit, now that we've got our offset.
-        self.set_reference_unit(reference_unit)
+        self.set_reference_unit_A(backupReferenceUnit)
 
-        return value;
+        return value
+
+
+    def tare_B(self, times=15):
+        # Backup REFERENCE_UNIT value
+        backupReferenceUnit = self.get_reference_unit_B()
+        self.set_reference_unit_B(1)
+
+        # Remember current gain, and switch to channel B (gain 32).
+        backupGain = self.get_gain()
+        self.set_gain(32)
+
+        value = self.read_average(times)
+
+        if self.DEBUG_PRINTING:
+            print("Tare B value:", value)
+
+        self.set_offset_B(value)
+
+        # Restore gain/channel/reference unit settings.
+        self.set_gain(backupGain)
+        self.set_reference_unit_B(backupReferenceUnit)
+
+        return value
 
-    
-    def set_reading_format(self, byte_format="LSB", bit_format="MSB"):
 
+    def set_reading_format(self, byte_format="LSB", bit_format="MSB"):
         if byte_format == "LSB":
             self.byte_format = byte_format
         elif byte_format == "MSB":
             self.byte_format = byte_format
         else:
-            print("Unrecognised byte_format: \"%s\"" % byte_format)
+            raise ValueError("Unrecognised byte_format: \"%s\"" % byte_format)
 
         if bit_format == "LSB":
             self.bit_format = bit_format
         elif bit_format == "MSB":
             self.bit_format = bit_format
         else:
-            print("Unrecognised bit_format: \"%s\"" % bit_format)
+            raise ValueError("Unrecognised bitformat: \"%s\"" % bit_format)
+
+        self.reorderTables = build_reorder_tables(self.byte_format, self.bit_format)
 
-            
 
+    # sets offset for channel A for compatibility reasons
     def set_offset(self, offset):
+        self.set_offset_A(offset)
+
+    def set_offset_A(self, offset):
         self.OFFSET = offset
 
-        
+    def set_offset_B(self, offset):
+        self.OFFSET_B = offset
+
     def get_offset(self):
+        return self.get_offset_A()
+
+    def get_offset_A(self):
         return self.OFFSET
 
-    
+    def get_offset_B(self):
+        return self.OFFSET_B
+
+
     def set_reference_unit(self, reference_unit):
+        self.set_reference_unit_A(reference_unit)
+
+
+    def set_reference_unit_A(self, reference_unit):
         # Make sure we aren't asked to use an invalid reference unit.
         if reference_unit == 0:
-            print("HX711().set_reference_unit(): Can't use 0 as a reference unit!!")
-            return
+            raise ValueError("HX711::set_reference_unit_A() can't accept 0 as a reference unit!")
 
         self.REFERENCE_UNIT = reference_unit
 
 
-    def power_down(self):
-        # Wait for and get the Read Lock, incase another thread is already
-        # driving the HX711 serial interface.
-        self.readLock.acquire()
+    def set_reference_unit_B(self, reference_unit):
+        # Make sure we aren't asked to use an invalid reference unit.
+        if reference_unit == 0:
+            raise ValueError("HX711::set_reference_unit_B() can't accept 0 as a reference unit!")
 
-        # Wait 100us for the virtual HX711 to power down.
-        time.sleep(0.0001)
+        self.REFERENCE_UNIT_B = reference_unit
 
-        # Release the Read Lock, now that we've finished driving the HX711
-        # serial interface.
-        self.readLock.release()           
 
+    def get_reference_unit(self):
+        return self.get_reference_unit_A()
 
-    def power_up(self):
-        # Wait for and get the Read Lock, incase another thread is already
-        # driving the HX711 serial interface.
+
+    def get_reference_unit_A(self):
+        return self.REFERENCE_UNIT
+
+
+    def get_reference_unit_B(self):
+        return self.REFERENCE_UNIT_B
+
+
+    def set_calibration(self, calibration):
+        # Like HX711.set_calibration(): a CalibrationProfile, or None.
+        if calibration is not None:
+            self.set_reference_unit_A(calibration.get_reference_unit())
+
+        self.calibration = calibration
+
+
+    def get_calibration(self):
+        return self.calibration
+
+
+    def power_down(self):
         self.readLock.acquire()
 
-        # Wait 100 us for the virtual HX711 to power back up.
-        time.sleep(0.0001)
+        # The real chip needs PD_SCK held high for 60us.
+        self.clock.sleep(0.0001)
+        self.poweredUp = False
 
-        # Release the Read Lock, now that we've finished driving the HX711
-        # serial interface.
         self.readLock.release()
 
-        # HX711 will now be defaulted to Channel A with gain of 128.  If this
-        # isn't what client software has requested from us, take a sample and
-        # throw it away, so that next sample from the HX711 will be from the
-        # correct channel/gain.
-        if self.get_gain() != 128:
-            self.readRawBytes()
 
+    def power_up(self):
+        self.readLock.acquire()
 
-    def reset(self):
-        # self.power_down()
-        # self.power_up()
+        self.clock.sleep(0.0001)
 
-        # Mark time when we were reset.  We'll use this for sample generation.
-        self.resetTimeStamp = time.time()
+        # HX711 restarts converting on channel A with a gain of 128, and its
+        # output needs a few conversions to settle.
+        now = self.clock.now()
+        self.poweredUp = True
+        self.conversionGain = 1
+        self.conversionEpoch = now
+        self.nextConversion = self.settleSamples
+        self.nextReadyTime = now + self.settleSamples / self.sampleRateHz
 
+        self.readLock.release()
 
-    def generateFakeSample(self):
-       sampleTimeStamp = time.time() - self.resetTimeStamp
+        # If that isn't what client software has requested from us, take a
+        # sample and throw it away, so that next sample from the HX711 will be
+        # from the correct channel/gain.
+        if self.get_gain() != 128:
+            self.read_raw_int()
 
-       noiseScale = 1.0
-       noiseValue = random.randrange(-(noiseScale * 1000),(noiseScale * 1000)) / 1000.0
-       sample     = math.sin(math.radians(sampleTimeStamp * 20)) * 72.0
 
-       self.sampleCount += 1
+    def reset(self):
+        self.power_down()
+        self.power_up()
 
-       if sample < 0.0:
-          sample = -sample
+        # Mark time when we were reset.  The default load is relative to it.
+        self.resetTimeStamp = self.clock.now()
 
-       sample += noiseValue
 
-       BIG_ERROR_SAMPLE_FREQUENCY = 142
-       ###BIG_ERROR_SAMPLE_FREQUENCY = 15
-       BIG_ERROR_SAMPLES = [0.0, 40.0, 70.0, 150.0, 280.0, 580.0]
+    def generateFakeSample(self, now, gainPulses):
+        sampleTimeStamp = now - self.resetTimeStamp
+        self.sampleCount += 1
 
-       if random.randrange(0, BIG_ERROR_SAMPLE_FREQUENCY) == 0:
-          sample = random.sample(BIG_ERROR_SAMPLES, 1)[0]
-          print("Sample %d: Injecting %f as a random bad sample." % (self.sampleCount, sample))
+        if gainPulses == 2:
+            grams = self.loadB(sampleTimeStamp)
+            countsPerGram = self.countsPerGram / 4.0
+        else:
+            grams = self.loadA(sampleTimeStamp)
+            countsPerGram = self.countsPerGram / (2.0 if gainPulses == 3 else 1.0)
 
-       sample *= 1000
+            if self.glitchInterval and self.random.randrange(self.glitchInterval) == 0:
+                grams = self.random.choice(GLITCH_GRAMS)
+                self.injectedGlitches += 1
+                if self.DEBUG_PRINTING:
+                    print("Sample %d: Injecting %f as a random bad sample." % (self.sampleCount, grams))
 
-       sample *= self.REFERENCE_UNIT
+        sample = self.zeroCounts + grams * countsPerGram
+        if self.noiseCounts:
+            sample += self.random.gauss(0.0, self.noiseCounts)
 
-       return int(sample)
+        return int(sample)
 
 
-# EOF - emulated_hx711.py
+# EOF - hx711_emulator.py
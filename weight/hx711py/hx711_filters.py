@@ -0,0 +1,275 @@
+from hx711_stats import SlidingWindowStats
+
+'''
+Per-sample filters for the HX711 sample stream.
+
+Every stage takes one raw value at a time and returns either the value to
+pass on (possibly changed) or None to drop the sample, and counts how many
+samples it rejected.  Stages are chained with FilterPipeline, and a pipeline
+can be handed to HX711.start_continuous(filters=...) so the acquisition
+thread filters channel A before buffering it:
+
+    noise = estimate_noise(hx.get_buffered_values(NOISE_SAMPLES))
+    filters = FilterPipeline([SaturationFilter(),
+                              HampelFilter(window=7, min_deviation=noise),
+                              PlausibilityFilter(max_step=50000),
+                              LowPassFilter(alpha=0.5)])
+    hx.start_continuous(filters=filters)
+
+All stages work on raw counts, before OFFSET and REFERENCE_UNIT, and cost a
+constant amount of work per sample: the Hampel window has a fixed size, the
+other stages only keep the last value or two.
+'''
+
+
+# Limits of the HX711's 24-bit two's complement output.  It clamps to these
+# when the input is out of range.
+RAW_MAX = 0x7fffff
+RAW_MIN = -0x800000
+
+
+class SampleFilter:
+
+    # Base class for pipeline stages.  Subclasses implement filterValue()
+    # and may override reset().
+
+    def __init__(self):
+        self.processed = 0
+        self.rejected = 0
+
+        # Set by filterValue() for a sample it rejected but passed on
+        # something else for, e.g. an outlier replaced with the median.
+        self.outlier = False
+
+
+    def process(self, value):
+        self.processed += 1
+        self.outlier = False
+        result = self.filterValue(value)
+        if result is None or self.outlier:
+            self.rejected += 1
+
+        return result
+
+
+    def filterValue(self, value):
+        raise NotImplementedError
+
+
+    def reset(self):
+        # Forget the signal history, keep the counters.
+        pass
+
+
+    def reset_counters(self):
+        self.processed = 0
+        self.rejected = 0
+
+
+class SaturationFilter(SampleFilter):
+
+    # Drops samples at the ends of the 24-bit range.  The HX711 reports a
+    # saturated input as exactly RAW_MAX or RAW_MIN, which says nothing about
+    # the actual load.
+
+    def filterValue(self, value):
+        if value >= RAW_MAX or value <= RAW_MIN:
+            return None
+
+        return value
+
+
+class HampelFilter(SampleFilter):
+
+    # Causal Hampel filter: a sample further than n_sigmas standard
+    # deviations from the median of the last `window` samples is an outlier.
+    # The standard deviation is estimated as 1.4826 * MAD, with min_deviation
+    # raw counts as a floor: a MAD over a handful of samples is often far
+    # below the real noise (on a flat signal, 0), and without the floor
+    # about one clean sample in ten would be called an outlier.  The floor
+    # depends on the load cell and the reference unit, so there is no
+    # default: pass the scale's measured noise, e.g.
+    # hx711_stats.estimate_noise() of the empty scale, or its noise in grams
+    # times the reference unit.
+    #
+    # Outliers are replaced with the window median when `replace` is set and
+    # dropped otherwise.  Either way they count as rejected.  Every sample,
+    # outlier or not, goes into the window, so a real change of the load
+    # passes once it fills half of it.
+
+    def __init__(self, window=7, n_sigmas=3.0, min_deviation=None, replace=False):
+        SampleFilter.__init__(self)
+        if window < 3:
+            raise ValueError("HampelFilter(): window must be at least 3!")
+        if min_deviation is None or min_deviation <= 0:
+            raise ValueError("HampelFilter(): min_deviation, the scale's noise in raw counts, must be given and greater than zero!")
+
+        self.window = SlidingWindowStats(window)
+        self.nSigmas = n_sigmas
+        self.minDeviation = min_deviation
+        self.replace = replace
+
+
+    def filterValue(self, value):
+        window = self.window
+        isOutlier = False
+        median = None
+
+        if window.is_full():
+            median = window.median()
+            deviation = max(1.4826 * window.mad(), self.minDeviation)
+            isOutlier = abs(value - median) > self.nSigmas * deviation
+
+        window.add(value)
+
+        if not isOutlier:
+            return value
+
+        self.outlier = True
+        return median if self.replace else None
+
+
+    def reset(self):
+        self.window.clear()
+
+
+class PlausibilityFilter(SampleFilter):
+
+    # Drops samples that jump more than max_step raw counts away from the
+    # last accepted one, or fall outside [min_value, max_value].  A jump
+    # that holds for `confirm` consecutive samples, agreeing with each other
+    # within max_step, is a real change of the load: the last of them is
+    # accepted and becomes the new reference.
+
+    def __init__(self, max_step, confirm=3, min_value=None, max_value=None):
+        SampleFilter.__init__(self)
+        if max_step <= 0:
+            raise ValueError("PlausibilityFilter(): max_step must be greater than zero!")
+        if confirm < 1:
+            raise ValueError("PlausibilityFilter(): confirm must be at least 1!")
+
+        self.maxStep = max_step
+        self.confirm = confirm
+        self.minValue = min_value
+        self.maxValue = max_value
+
+        self.lastAccepted = None
+        self.candidate = None
+        self.candidateCount = 0
+
+
+    def filterValue(self, value):
+        if self.minValue is not None and value < self.minValue:
+            return None
+        if self.maxValue is not None and value > self.maxValue:
+            return None
+
+        if self.lastAccepted is None or abs(value - self.lastAccepted) <= self.maxStep:
+            self.lastAccepted = value
+            self.candidateCount = 0
+            return value
+
+        # A jump.  Track it until enough samples agree on the new level.
+        if self.candidateCount and abs(value - self.candidate) <= self.maxStep:
+            self.candidateCount += 1
+        else:
+            self.candidateCount = 1
+        self.candidate = value
+
+        if self.candidateCount >= self.confirm:
+            self.lastAccepted = value
+            self.candidateCount = 0
+            return value
+
+        return None
+
+
+    def reset(self):
+        self.lastAccepted = None
+        self.candidateCount = 0
+
+
+class LowPassFilter(SampleFilter):
+
+    # First order IIR low-pass (exponential moving average):
+    #     y += alpha * (x - y)
+    # Smaller alpha smooths more and settles slower.  A step larger than
+    # snap_threshold raw counts, if given, restarts the filter at the new
+    # value, so putting something on the scale isn't smeared over many
+    # samples.  Never rejects anything.
+
+    def __init__(self, alpha=0.5, snap_threshold=None):
+        SampleFilter.__init__(self)
+        if not 0 < alpha <= 1:
+            raise ValueError("LowPassFilter(): alpha must be in (0, 1]!")
+
+        self.alpha = alpha
+        self.snapThreshold = snap_threshold
+        self.state = None
+
+
+    def filterValue(self, value):
+        if self.state is None or (self.snapThreshold is not None and
+                                  abs(value - self.state) > self.snapThreshold):
+            self.state = value
+        else:
+            self.state += self.alpha * (value - self.state)
+
+        return self.state
+
+
+    def reset(self):
+        self.state = None
+
+
+class FilterPipeline:
+
+    # Runs the stages in order.  A sample rejected by one stage doesn't
+    # reach the following ones.
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.processed = 0
+        self.accepted = 0
+
+
+    def process(self, value):
+        self.processed += 1
+        for stage in self.stages:
+            value = stage.process(value)
+            if value is None:
+                return None
+
+        self.accepted += 1
+        return value
+
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+
+    def reset_counters(self):
+        self.processed = 0
+        self.accepted = 0
+        for stage in self.stages:
+            stage.reset_counters()
+
+
+    def get_stats(self):
+        # Per-stage rejection counts, keyed by the stage's class name (with
+        # its position appended when a class shows up more than once).
+        names = [type(stage).__name__ for stage in self.stages]
+        stats = {
+            "processed": self.processed,
+            "accepted": self.accepted,
+            "rejected": {},
+        }
+        for i, stage in enumerate(self.stages):
+            name = names[i] if names.count(names[i]) == 1 else "%s[%d]" % (names[i], i)
+            stats["rejected"][name] = stage.rejected
+
+        return stats
+
+
+# EOF - hx711_filters.py
@@ -0,0 +1,160 @@
+import time
+import threading
+
+'''
+Single-producer, single-consumer sample queue for the HX711 ready callback.
+
+The GPIO callback thread is the only producer and one consumer thread reads
+from it, so the queue needs no lock: it's a fixed ring of slots where only
+the producer ever moves `head` and only the consumer ever moves `tail`, and
+under the GIL each of those is a single atomic store.  The producer
+publishes a slot by storing it before moving `head`, so the consumer never
+sees a half-written sample.
+
+Every conversion the producer hears about gets the next sequence number,
+whether it makes it into the queue or not:
+
+- put() queues a sample as (sequence, timestamp, value).
+- skip() records a conversion that couldn't be read, e.g. because another
+  thread held the Read Lock or the read failed its timing.
+- A put() into a full queue drops the new sample: the consumer is behind,
+  and the samples it hasn't read yet are older and in order.
+
+So a consumer sees a gap in the sequence numbers wherever a sample was lost,
+get_stats() says how many were lost and why, and the rate of sequence
+numbers over time is the conversion rate the chip actually delivered.
+'''
+
+
+class SampleQueue:
+
+    def __init__(self, capacity=256):
+        if capacity <= 0:
+            raise ValueError("SampleQueue(): capacity must be greater than zero!")
+
+        # One slot more than the capacity, so a full ring can be told apart
+        # from an empty one without a shared counter.
+        self.slots = [None] * (capacity + 1)
+        self.capacity = capacity
+        self.head = 0
+        self.tail = 0
+        self.notEmpty = threading.Event()
+
+        # Producer-side counters.
+        self.sequence = 0
+        self.queued = 0
+        self.missed = 0
+        self.overflows = 0
+        self.firstTimestamp = None
+        self.lastTimestamp = None
+
+
+    def __len__(self):
+        return (self.head - self.tail) % len(self.slots)
+
+
+    def put(self, value, timestamp=None):
+        # Producer only.  Returns the sample's sequence number.
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        sequence = self.sequence
+        self.sequence = sequence + 1
+        self.noteTimestamp(timestamp)
+
+        head = self.head
+        nextHead = (head + 1) % len(self.slots)
+        if nextHead == self.tail:
+            self.overflows += 1
+            return sequence
+
+        self.slots[head] = (sequence, timestamp, value)
+        self.head = nextHead
+        self.queued += 1
+        self.notEmpty.set()
+        return sequence
+
+
+    def skip(self, timestamp=None):
+        # Producer only.  A conversion happened but no sample came out of
+        # it; it still takes a sequence number.
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        self.sequence += 1
+        self.missed += 1
+        self.noteTimestamp(timestamp)
+
+
+    def noteTimestamp(self, timestamp):
+        if self.firstTimestamp is None:
+            self.firstTimestamp = timestamp
+        self.lastTimestamp = timestamp
+
+
+    def get_nowait(self):
+        # Consumer only.  The oldest queued (sequence, timestamp, value), or
+        # None if the queue is empty.
+        tail = self.tail
+        if tail == self.head:
+            return None
+
+        sample = self.slots[tail]
+        self.slots[tail] = None
+        self.tail = (tail + 1) % len(self.slots)
+        return sample
+
+
+    def get(self, timeout=None):
+        # Consumer only.  Like get_nowait(), but waits up to timeout seconds
+        # (forever if None) for a sample.  Returns None on timeout.
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            # Clear before looking, so a put() in between still wakes us up.
+            self.notEmpty.clear()
+            sample = self.get_nowait()
+            if sample is not None:
+                return sample
+
+            if deadline is None:
+                self.notEmpty.wait()
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.notEmpty.wait(remaining):
+                return self.get_nowait()
+
+
+    def drain(self):
+        # Consumer only.  Every queued sample, oldest first.
+        samples = []
+        sample = self.get_nowait()
+        while sample is not None:
+            samples.append(sample)
+            sample = self.get_nowait()
+
+        return samples
+
+
+    def get_stats(self):
+        # sequence: conversions heard of so far, and the next sequence
+        # number.  queued: samples that made it into the queue.  missed:
+        # conversions that couldn't be read.  overflows: samples dropped on
+        # a full queue.  rate: conversions per second between the first and
+        # the last one, None until there are two.
+        rate = None
+        if self.sequence > 1 and self.lastTimestamp > self.firstTimestamp:
+            rate = (self.sequence - 1) / (self.lastTimestamp - self.firstTimestamp)
+
+        return {
+            "sequence": self.sequence,
+            "queued": self.queued,
+            "missed": self.missed,
+            "overflows": self.overflows,
+            "pending": len(self),
+            "rate": rate,
+        }
+
+
+# EOF - hx711_queue.py
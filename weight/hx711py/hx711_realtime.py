@@ -0,0 +1,169 @@
+import gc
+import os
+
+'''
+Opt-in real-time profile for the thread or process that reads the HX711.
+
+A read bit-bangs 25 to 27 PD_SCK pulses, and each pulse must not stay high
+for more than 50us: a context switch, a page fault or a garbage collection
+pass at the wrong moment stretches a pulse, and past 60us the chip powers
+down in the middle of the read.  On a loaded Pi what the reading thread is
+allowed to do decides whether readings are clean or glitched.
+
+RealtimeProfile bundles what can be done about it from user space:
+
+- cpus: pins the thread to these CPUs, ideally one isolated from the
+  scheduler with isolcpus= on the kernel command line (isolated_cpus()).
+- priority: runs the thread under SCHED_FIFO at this priority (1 to 99), so
+  ordinary processes can't preempt it.  Needs root or CAP_SYS_NICE.
+- lock_memory: mlockall() the process, so no page of it is ever faulted in
+  from disk in the middle of a read.  Needs root or a high enough
+  RLIMIT_MEMLOCK.
+- pause_gc: gc.freeze() the objects that already exist when the profile is
+  applied, and keep the garbage collector disabled for the length of every
+  burst read.
+
+    hx.start_continuous(realtime=RealtimeProfile(cpus=isolated_cpus() or {3},
+                                                 priority=50, lock_memory=True,
+                                                 pause_gc=True))
+
+Affinity and scheduling policy apply to the calling thread only, so
+apply() is called from the thread that reads.  Settings that can't be
+applied (no permission, not Linux) are reported and skipped: the reads then
+simply run without them.
+'''
+
+# From <sys/mman.h>.
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+class RealtimeProfile:
+
+    def __init__(self, cpus=None, priority=None, lock_memory=False, pause_gc=False):
+        if priority is not None and not 1 <= priority <= 99:
+            raise ValueError("RealtimeProfile(): priority must be between 1 and 99!")
+
+        self.cpus = set(cpus) if cpus is not None else None
+        if self.cpus is not None and not self.cpus:
+            raise ValueError("RealtimeProfile(): cpus must not be empty!")
+
+        self.priority = priority
+        self.lockMemory = lock_memory
+        self.pauseGc = pause_gc
+
+        # What apply() managed to do, by setting name: True, or the reason
+        # it couldn't.
+        self.applied = {}
+        self.memoryLocked = False
+        self.gcFrozen = False
+
+
+    def __repr__(self):
+        return "RealtimeProfile(cpus=%r, priority=%r, lock_memory=%r, pause_gc=%r)" % (
+            self.cpus, self.priority, self.lockMemory, self.pauseGc)
+
+
+    def apply(self):
+        # Applies the profile to the calling thread (and, for lock_memory and
+        # pause_gc, to the whole process).  Returns self.applied.
+        self.applied = {}
+
+        if self.cpus is not None:
+            self.applySetting("cpus", lambda: os.sched_setaffinity(0, self.cpus))
+
+        if self.priority is not None:
+            self.applySetting("priority", lambda: os.sched_setscheduler(
+                0, os.SCHED_FIFO, os.sched_param(self.priority)))
+
+        if self.lockMemory and not self.memoryLocked:
+            self.applySetting("lock_memory", self.lockAllMemory)
+            self.memoryLocked = self.applied["lock_memory"] is True
+
+        if self.pauseGc and not self.gcFrozen:
+            # Move everything allocated so far out of the collector's reach,
+            # so the collections that do run between bursts stay short.
+            gc.collect()
+            gc.freeze()
+            self.gcFrozen = True
+            self.applied["pause_gc"] = True
+
+        return self.applied
+
+
+    def applySetting(self, name, action):
+        try:
+            action()
+            self.applied[name] = True
+        except (AttributeError, NotImplementedError, OSError) as error:
+            # AttributeError: no sched_* functions on this platform.
+            reason = getattr(error, 'strerror', None) or str(error)
+            self.applied[name] = reason
+            print("RealtimeProfile: couldn't apply %s (%s), going on without it" % (name, reason))
+
+
+    def lockAllMemory(self):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+
+    def release(self):
+        # Undoes the process-wide parts of the profile.  The thread's
+        # affinity and scheduling policy go away with the thread.
+        if self.memoryLocked:
+            import ctypes
+            import ctypes.util
+
+            ctypes.CDLL(ctypes.util.find_library('c')).munlockall()
+            self.memoryLocked = False
+
+        if self.gcFrozen:
+            gc.unfreeze()
+            self.gcFrozen = False
+
+
+    def begin_burst(self):
+        # Call right before a burst read, and end_burst() with what this
+        # returns right after it.  The collector is disabled in between, for
+        # every thread of the process, so keep bursts short.
+        if not self.pauseGc:
+            return False
+
+        enabled = gc.isenabled()
+        gc.disable()
+        return enabled
+
+
+    def end_burst(self, token):
+        if token:
+            gc.enable()
+
+
+def isolated_cpus():
+    # CPUs isolated from the scheduler with isolcpus=, as a set, empty if
+    # there are none or this isn't Linux.
+    try:
+        with open('/sys/devices/system/cpu/isolated') as isolatedFile:
+            text = isolatedFile.read().strip()
+    except OSError:
+        return set()
+
+    cpus = set()
+    for part in text.split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+
+    return cpus
+
+
+# EOF - hx711_realtime.py
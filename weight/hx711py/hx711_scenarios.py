@@ -0,0 +1,284 @@
+import math
+import random
+
+'''
+Scripted scale sessions for the HX711 emulator, with ground-truth labels.
+
+A Scenario is a load function of time in grams, built from kitchen events:
+
+    scenario = Scenario(duration=20)
+    scenario.place(2.0, 250)                   # put a 250 g bowl down
+    scenario.pour(6.0, 120, rate=40)           # pour 120 g into it at 40 g/s
+    scenario.bump(11.0, 80)                    # knock the counter
+    scenario.lean(13.0, 1.5, 400)              # rest a hand on the plate
+    scenario.remove(17.0)                      # take everything off
+    hx = HX711(5, 6, seed=1, load_A=scenario)
+
+Every event adds a label (kind, start, end, grams) to scenario.labels(), and
+settled_intervals() derives from them the (start, end, grams) periods when
+nothing is moving, which are the only periods a stability detector should
+capture a weight in.  Creep and vibration are properties of the load cell
+and the bench rather than of the ingredients: creep drifts the reading
+slowly towards a fraction more than each load change without unsettling
+it, vibration adds a sinusoid and does.
+
+random_scenario() builds a random session from a seed, so a benchmark can
+run thousands of them and each one can be rebuilt from its seed alone in
+any worker process.
+'''
+
+
+# Kinds of label.
+PLACE = 'place'
+POUR = 'pour'
+REMOVE = 'remove'
+BUMP = 'bump'
+VIBRATION = 'vibration'
+LEAN = 'lean'
+
+
+class Scenario:
+
+    def __init__(self, duration, rise_time=0.15, ringing=0.08, ringing_hz=6.0, ringing_decay=0.08,
+                 creep=0.0, creep_time_constant=30.0):
+        if duration <= 0:
+            raise ValueError("Scenario(): duration must be greater than zero!")
+
+        self.duration = float(duration)
+
+        # Items land over rise_time seconds, then the plate rings at
+        # ringing_hz with an amplitude of `ringing` times the load change,
+        # decaying with a time constant of ringing_decay seconds.
+        self.riseTime = rise_time
+        self.ringing = ringing
+        self.ringingHz = ringing_hz
+        self.ringingDecay = ringing_decay
+
+        # Load-cell creep: after a load change of g grams, the reading drifts
+        # towards g * (1 + creep) with a time constant of creep_time_constant.
+        self.creep = creep
+        self.creepTimeConstant = creep_time_constant
+
+        # Load changes that stay on the plate: (start, end, grams), ramped
+        # linearly from start to end.
+        self.ramps = []
+        # Transient forces: (start, end, grams, kind, frequency).
+        self.transients = []
+        self.labelList = []
+
+
+    def __call__(self, t):
+        return self.load(t)
+
+
+    def load(self, t):
+        # What the load cell reads at time t, in grams.
+        grams = 0.0
+
+        for start, end, change in self.ramps:
+            if t <= start:
+                continue
+
+            if t < end:
+                grams += change * (t - start) / (end - start)
+                continue
+
+            grams += change
+            since = t - end
+            if self.ringing:
+                grams += (change * self.ringing * math.exp(-since / self.ringingDecay) *
+                          math.sin(2.0 * math.pi * self.ringingHz * since))
+            if self.creep:
+                grams += change * self.creep * (1.0 - math.exp(-since / self.creepTimeConstant))
+
+        for start, end, force, kind, frequency in self.transients:
+            if not start <= t < end:
+                continue
+
+            if kind == VIBRATION:
+                grams += force * math.sin(2.0 * math.pi * frequency * (t - start))
+            elif kind == LEAN:
+                # Pressed in and released over a quarter of the lean each.
+                edge = (end - start) / 4.0
+                grams += force * min(1.0, (t - start) / edge, (end - t) / edge)
+            else:
+                # A knock: a half sine pulse.
+                grams += force * math.sin(math.pi * (t - start) / (end - start))
+
+        return grams
+
+
+    def on_plate(self, t):
+        # Ground truth: grams of ingredients on the plate at time t, without
+        # ringing, creep or transients.
+        grams = 0.0
+        for start, end, change in self.ramps:
+            if t >= end:
+                grams += change
+            elif t > start:
+                grams += change * (t - start) / (end - start)
+
+        return grams
+
+
+    def addRamp(self, kind, start, end, change):
+        if start < 0 or end > self.duration:
+            raise ValueError("Scenario::%s(): the event must happen between 0 and %g s!" % (kind, self.duration))
+
+        self.ramps.append((start, end, float(change)))
+        self.labelList.append((kind, start, end, float(change)))
+
+
+    def addTransient(self, kind, start, end, force, frequency=0.0):
+        if start < 0 or end > self.duration:
+            raise ValueError("Scenario::%s(): the event must happen between 0 and %g s!" % (kind, self.duration))
+
+        self.transients.append((start, end, float(force), kind, frequency))
+        self.labelList.append((kind, start, end, float(force)))
+
+
+    def place(self, t, grams):
+        if grams <= 0:
+            raise ValueError("Scenario::place(): grams must be greater than zero!")
+
+        self.addRamp(PLACE, t, t + self.riseTime, grams)
+        return self
+
+
+    def stack(self, t, items, interval=3.0):
+        # Places each item of `items` (grams) on top of the last one,
+        # `interval` seconds apart.
+        for i, grams in enumerate(items):
+            self.place(t + i * interval, grams)
+
+        return self
+
+
+    def pour(self, t, grams, rate):
+        if grams <= 0 or rate <= 0:
+            raise ValueError("Scenario::pour(): grams and rate must be greater than zero!")
+
+        self.addRamp(POUR, t, t + grams / rate, grams)
+        return self
+
+
+    def remove(self, t, grams=None):
+        # Takes `grams` off the plate, everything by default.
+        onPlate = self.on_plate(t)
+        if grams is None:
+            grams = onPlate
+
+        if not 0 < grams <= onPlate + 1e-9:
+            raise ValueError("Scenario::remove(): there are only %g g on the plate!" % onPlate)
+
+        self.addRamp(REMOVE, t, t + self.riseTime, -grams)
+        return self
+
+
+    def bump(self, t, grams, duration=0.05):
+        self.addTransient(BUMP, t, t + duration, grams)
+        return self
+
+
+    def vibration(self, t, duration, grams, frequency=25.0):
+        # Something shaking the bench: a sinusoid of `grams` amplitude.
+        self.addTransient(VIBRATION, t, t + duration, grams, frequency)
+        return self
+
+
+    def lean(self, t, duration, grams):
+        # A hand resting on the plate for `duration` seconds.
+        self.addTransient(LEAN, t, t + duration, grams)
+        return self
+
+
+    def settleTime(self):
+        # How long the plate rings after a load change, until it's within
+        # 1% of the change.
+        if not self.ringing or self.ringing <= 0.01:
+            return 0.0
+
+        return self.ringingDecay * math.log(self.ringing / 0.01)
+
+
+    def labels(self):
+        # Ground-truth events, (kind, start, end, grams), by start time.
+        # grams is the load change for place, pour and remove, and the force
+        # or amplitude for bump, vibration and lean.
+        return sorted(self.labelList, key=lambda label: label[1])
+
+
+    def settled_intervals(self, min_duration=0.0):
+        # The (start, end, grams) periods when the plate holds `grams` and
+        # nothing is moving or ringing, longer than min_duration seconds.
+        settle = self.settleTime()
+        busy = []
+        for start, end, change in self.ramps:
+            busy.append((start, end + settle))
+        for start, end, force, kind, frequency in self.transients:
+            busy.append((start, end))
+        busy.sort()
+
+        intervals = []
+        quietFrom = 0.0
+        for start, end in busy + [(self.duration, self.duration)]:
+            if start - quietFrom > min_duration:
+                intervals.append((quietFrom, start, self.on_plate(quietFrom)))
+            quietFrom = max(quietFrom, end)
+
+        return intervals
+
+
+def random_scenario(seed, duration=30.0, creep=0.002):
+    # A random kitchen session: items placed, stacked and poured, then
+    # removed, with knocks, a hand on the plate or a vibrating bench
+    # thrown in.  The same seed always gives the same scenario.
+    rng = random.Random(seed)
+    scenario = Scenario(duration, creep=creep)
+
+    t = rng.uniform(1.0, 3.0)
+    while t < duration - 6.0:
+        action = rng.random()
+
+        if action < 0.35:
+            scenario.place(t, rng.uniform(20.0, 800.0))
+            t += scenario.riseTime
+        elif action < 0.5:
+            items = [rng.uniform(20.0, 300.0) for i in range(rng.randint(2, 3))]
+            interval = rng.uniform(2.0, 4.0)
+            if t + len(items) * interval >= duration - 6.0:
+                break
+            scenario.stack(t, items, interval)
+            t += (len(items) - 1) * interval + scenario.riseTime
+        elif action < 0.65:
+            grams = rng.uniform(30.0, 300.0)
+            rate = rng.uniform(10.0, 60.0)
+            if t + grams / rate >= duration - 6.0:
+                break
+            scenario.pour(t, grams, rate)
+            t += grams / rate
+        elif action < 0.75 and scenario.on_plate(t) > 0:
+            scenario.remove(t)
+            t += scenario.riseTime
+        elif action < 0.85:
+            scenario.bump(t, rng.uniform(-100.0, 200.0))
+            t += 0.05
+        elif action < 0.93:
+            length = rng.uniform(0.5, 2.0)
+            scenario.lean(t, length, rng.uniform(50.0, 1500.0))
+            t += length
+        else:
+            length = rng.uniform(0.5, 3.0)
+            scenario.vibration(t, length, rng.uniform(1.0, 15.0))
+            t += length
+
+        # Time on the plate before whatever comes next.
+        t += rng.uniform(1.5, 5.0)
+
+    if scenario.on_plate(duration - 3.0) > 0:
+        scenario.remove(duration - 3.0)
+
+    return scenario
+
+
+# EOF - hx711_scenarios.py
@@ -0,0 +1,408 @@
+import bisect
+import collections
+import statistics
+
+'''
+Streaming statistics over the last N weight samples.
+
+SlidingWindowStats is fed one sample at a time and keeps the window both in
+arrival order (to know which sample to evict) and sorted (to answer order
+statistics without sorting again).  Per sample, add() does two binary
+searches plus a list insert and delete, so it is O(n), not O(log n): the
+insert and delete shift up to n list slots.  That shift is a single memmove
+of n pointers, though, and for the window sizes a scale uses (tens to a few
+hundred samples) it is lost in the interpreter overhead: about 1us per
+sample from 5 to 500 samples, 3us at 5000.  An indexable skip list would be
+O(log n) but does its work in Python bytecode and only wins on far larger
+windows; two heaps would give the median but not the indexed access mad()
+relies on.
+
+Queries:
+- median(): O(1).
+- mad(): median absolute deviation, O(log n).  The deviations on each side
+  of the median are already sorted in the window, so the MAD is the median
+  of two sorted sequences, found by binary search without building them.
+- trimmed_mean(): O(trimmed samples), using a running total of the window.
+
+KalmanWeightEstimator tracks the load as a constant-velocity state (value
+and rate of change) and reports, after every sample, the estimate together
+with its variance, so callers can tell a settled reading from one that is
+still moving without waiting for a full window.  Right after a (re)start its
+variance is just the measurement noise, so an estimate only counts as
+settled once settle_samples samples have gone into it; stability detection
+then waits for STABLE_SAMPLES settled, steady estimates in a row.
+estimate_noise() works out its measurement noise from NOISE_SAMPLES samples
+of the empty scale.
+
+ReadTimingStats keeps count of how long reads of the HX711 serial interface
+take and how long PD_SCK stayed high in each, which is what decides whether
+a read came out right: the datasheet allows at most 50us, and after 60us the
+chip powers down in the middle of the read.
+
+steadyMean() is the test behind instant tares: the trimmed mean of a batch
+of buffered samples, but only if they're steady enough to tare on.
+'''
+
+# Samples a KalmanWeightEstimator needs after a (re)start before its
+# estimate counts as settled.
+SETTLE_SAMPLES = 5
+
+# Settled, steady estimates in a row before a load counts as stable.
+STABLE_SAMPLES = 8
+
+# Empty-scale samples to estimate the measurement noise from.
+NOISE_SAMPLES = 50
+
+
+class SlidingWindowStats:
+
+    def __init__(self, size):
+        if size <= 0:
+            raise ValueError("SlidingWindowStats(): size must be greater than zero!")
+
+        self.size = size
+        self.window = collections.deque()
+        self.sortedValues = []
+        self.total = 0
+
+
+    def __len__(self):
+        return len(self.window)
+
+
+    def is_full(self):
+        return len(self.window) == self.size
+
+
+    def add(self, value):
+        # O(n) per sample, for the list insert and delete; see above.  Evict
+        # the oldest sample first, so the window never exceeds size.
+        if len(self.window) == self.size:
+            oldest = self.window.popleft()
+            del self.sortedValues[bisect.bisect_left(self.sortedValues, oldest)]
+            self.total -= oldest
+
+        self.window.append(value)
+        bisect.insort(self.sortedValues, value)
+        self.total += value
+
+
+    def clear(self):
+        self.window.clear()
+        self.sortedValues = []
+        self.total = 0
+
+
+    def values(self):
+        # Samples in arrival order, oldest first.
+        return list(self.window)
+
+
+    def mean(self):
+        self.checkNotEmpty("mean")
+        return self.total / len(self.window)
+
+
+    def median(self):
+        self.checkNotEmpty("median")
+        values = self.sortedValues
+        midpoint = len(values) // 2
+
+        if len(values) & 0x1:
+            return values[midpoint]
+
+        return (values[midpoint - 1] + values[midpoint]) / 2.0
+
+
+    def trimmed_mean(self, trim=0.2):
+        # Mean after dropping int(n * trim) samples from each end, like
+        # HX711.read_average() always did.
+        self.checkNotEmpty("trimmed_mean")
+        if not 0 <= trim < 0.5:
+            raise ValueError("SlidingWindowStats::trimmed_mean(): trim must be in [0, 0.5)!")
+
+        values = self.sortedValues
+        trimAmount = int(len(values) * trim)
+        if trimAmount == 0:
+            return self.total / len(values)
+
+        trimmedTotal = self.total - sum(values[:trimAmount]) - sum(values[-trimAmount:])
+        return trimmedTotal / (len(values) - 2 * trimAmount)
+
+
+    def mad(self):
+        self.checkNotEmpty("mad")
+        values = self.sortedValues
+        count = len(values)
+        median = self.median()
+
+        # Deviations of the samples below the median, smallest first, and of
+        # the samples from the median up, smallest first.
+        split = bisect.bisect_left(values, median)
+        below = lambda i: median - values[split - 1 - i]
+        above = lambda i: values[split + i] - median
+
+        midpoint = count // 2
+        deviation = kthOfTwoSorted(below, split, above, count - split, midpoint)
+        if count & 0x1:
+            return deviation
+
+        previous = kthOfTwoSorted(below, split, above, count - split, midpoint - 1)
+        return (previous + deviation) / 2.0
+
+
+    def checkNotEmpty(self, name):
+        if not self.window:
+            raise ValueError("SlidingWindowStats::%s(): no samples in the window!" % name)
+
+
+def kthOfTwoSorted(a, aLength, b, bLength, k):
+    # k-th smallest (0-based) element of the union of two ascending
+    # sequences, given as index -> value functions.  Binary search on how
+    # many of the k + 1 smallest elements come from `a`.
+    low = max(0, k + 1 - bLength)
+    high = min(k + 1, aLength)
+
+    while low < high:
+        fromA = (low + high) // 2
+        if a(fromA) < b(k - fromA):
+            low = fromA + 1
+        else:
+            high = fromA
+
+    fromA = low
+    fromB = k + 1 - fromA
+
+    if fromA == 0:
+        return b(fromB - 1)
+    if fromB == 0:
+        return a(fromA - 1)
+
+    return max(a(fromA - 1), b(fromB - 1))
+
+
+class KalmanWeightEstimator:
+
+    # Kalman filter over raw samples with state [value, rate].  Between
+    # samples the rate is assumed constant up to white acceleration noise of
+    # spectral density process_noise (counts^2 / s^3); every sample is a
+    # measurement of the value with standard deviation measurement_noise
+    # (counts).  Each update is a handful of scalar operations.
+    #
+    # A sample more than reset_sigmas standard deviations away from the
+    # prediction means the load changed (something was put on or taken off
+    # the scale): the filter restarts at that sample instead of slowly
+    # tracking the step, and its variance goes back up until the new load
+    # has settled.  Until settle_samples samples have gone in since the last
+    # (re)start, is_settled() is False whatever the variance says.
+
+    def __init__(self, measurement_noise=50.0, process_noise=1e6, reset_sigmas=6.0,
+                 initial_rate_variance=1e8, settle_samples=SETTLE_SAMPLES):
+        if measurement_noise <= 0:
+            raise ValueError("KalmanWeightEstimator(): measurement_noise must be greater than zero!")
+        if process_noise < 0:
+            raise ValueError("KalmanWeightEstimator(): process_noise can't be negative!")
+        if settle_samples < 1:
+            raise ValueError("KalmanWeightEstimator(): settle_samples must be at least 1!")
+
+        self.measurementVariance = float(measurement_noise) ** 2
+        self.processNoise = float(process_noise)
+        self.resetSigmas = reset_sigmas
+        self.initialRateVariance = float(initial_rate_variance)
+        self.settleSamples = settle_samples
+
+        self.resets = 0
+        self.reset()
+
+
+    def reset(self):
+        self.value = None
+        self.rate = 0.0
+        self.timestamp = None
+        self.samples = 0
+
+        # Covariance matrix [[p00, p01], [p01, p11]].
+        self.p00 = 0.0
+        self.p01 = 0.0
+        self.p11 = 0.0
+
+
+    def restart(self, timestamp, value):
+        self.value = float(value)
+        self.rate = 0.0
+        self.timestamp = timestamp
+        self.samples = 1
+        self.p00 = self.measurementVariance
+        self.p01 = 0.0
+        self.p11 = self.initialRateVariance
+
+
+    def update(self, timestamp, value):
+        # Feeds one sample taken at `timestamp` (seconds, monotonic) and
+        # returns the new (value, rate, variance) estimate.
+        if self.value is None:
+            self.restart(timestamp, value)
+            return self.value, self.rate, self.p00
+
+        dt = max(timestamp - self.timestamp, 0.0)
+        self.timestamp = timestamp
+
+        # Predict.
+        q = self.processNoise
+        predicted = self.value + self.rate * dt
+        p11 = self.p11 + q * dt
+        p01 = self.p01 + dt * self.p11 + q * dt * dt / 2.0
+        p00 = self.p00 + dt * (2.0 * self.p01 + dt * self.p11) + q * dt * dt * dt / 3.0
+
+        # Correct.
+        innovation = value - predicted
+        innovationVariance = p00 + self.measurementVariance
+
+        if innovation * innovation > self.resetSigmas * self.resetSigmas * innovationVariance:
+            self.resets += 1
+            self.restart(timestamp, value)
+            return self.value, self.rate, self.p00
+
+        k0 = p00 / innovationVariance
+        k1 = p01 / innovationVariance
+
+        self.samples += 1
+        self.value = predicted + k0 * innovation
+        self.rate += k1 * innovation
+        self.p00 = (1.0 - k0) * p00
+        self.p01 = (1.0 - k0) * p01
+        self.p11 = p11 - k1 * p01
+
+        return self.value, self.rate, self.p00
+
+
+    def get_estimate(self):
+        # The last (value, rate, variance) estimate, or None before the first
+        # sample.
+        if self.value is None:
+            return None
+
+        return self.value, self.rate, self.p00
+
+
+    def is_settled(self):
+        # Whether enough samples went in since the last (re)start for the
+        # variance to mean something.
+        return self.samples >= self.settleSamples
+
+
+
+def estimate_noise(values):
+    # Standard deviation of raw samples of a steady load, estimated as
+    # 1.4826 * MAD, e.g. to use as KalmanWeightEstimator's measurement_noise.
+    # Take NOISE_SAMPLES of them: over a handful the MAD is often far below
+    # the real noise.
+    values = list(values)
+    if len(values) < 2:
+        raise ValueError("estimate_noise(): need at least two samples!")
+
+    median = statistics.median(values)
+    noise = 1.4826 * statistics.median(abs(value - median) for value in values)
+    if noise == 0:
+        raise ValueError("estimate_noise(): the samples don't vary!")
+
+    return noise
+
+
+
+class ReadTimingStats:
+
+    # Counters and recent timings of HX711 reads.  record() is called once
+    # per read with its wall time and the longest PD_SCK high interval, and
+    # says whether that interval broke the max_sck_high limit.  The last
+    # `history` timings are kept for percentiles, which are only worked out
+    # when get_stats() is called.
+
+    def __init__(self, max_sck_high=50e-6, history=1024):
+        if max_sck_high <= 0:
+            raise ValueError("ReadTimingStats(): max_sck_high must be greater than zero!")
+        if history <= 0:
+            raise ValueError("ReadTimingStats(): history must be greater than zero!")
+
+        self.maxSckHigh = max_sck_high
+        self.readTimes = collections.deque(maxlen=history)
+        self.sckHighTimes = collections.deque(maxlen=history)
+        self.reset()
+
+
+    def reset(self):
+        self.readTimes.clear()
+        self.sckHighTimes.clear()
+        self.reads = 0
+        self.violations = 0
+        self.retries = 0
+        self.drops = 0
+        self.maxReadTime = 0.0
+        self.maxSckHighTime = 0.0
+
+
+    def record(self, readTime, sckHighTime):
+        # Returns True if the read broke the timing limit.
+        self.reads += 1
+        self.readTimes.append(readTime)
+        self.sckHighTimes.append(sckHighTime)
+
+        if readTime > self.maxReadTime:
+            self.maxReadTime = readTime
+        if sckHighTime > self.maxSckHighTime:
+            self.maxSckHighTime = sckHighTime
+
+        if sckHighTime > self.maxSckHigh:
+            self.violations += 1
+            return True
+
+        return False
+
+
+    def get_stats(self):
+        # Times in seconds.  Jitter is the longest time PD_SCK stayed high
+        # in a read: ideally a microsecond or two, more when the read got
+        # preempted in the middle of a pulse.
+        return {
+            "reads": self.reads,
+            "violations": self.violations,
+            "retries": self.retries,
+            "drops": self.drops,
+            "read_time_max": self.maxReadTime,
+            "read_time_p99": percentileOf(self.readTimes, 0.99),
+            "jitter_max": self.maxSckHighTime,
+            "jitter_p99": percentileOf(self.sckHighTimes, 0.99),
+        }
+
+
+def trimmedMeanOf(values, trim=0.2):
+    # Mean after dropping int(n * trim) values from each end, like
+    # HX711.read_average().
+    values = sorted(values)
+    trimAmount = int(len(values) * trim)
+    values = values[trimAmount:len(values) - trimAmount]
+    return sum(values) / len(values)
+
+
+def steadyMean(values, maxSpread, trim=0.2):
+    # trimmedMeanOf(values), if the values left after trimming span no more
+    # than maxSpread, otherwise None.  A glitch or a knock gets trimmed off;
+    # a load that's still settling or being moved doesn't.
+    values = sorted(values)
+    trimAmount = int(len(values) * trim)
+    values = values[trimAmount:len(values) - trimAmount]
+    if not values or values[-1] - values[0] > maxSpread:
+        return None
+
+    return sum(values) / len(values)
+
+
+def percentileOf(values, fraction):
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+# EOF - hx711_stats.py
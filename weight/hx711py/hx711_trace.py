@@ -0,0 +1,324 @@
+import mmap
+import time
+import struct
+from hx711_backends import FakeHX711Chip, FakeGPIOBackend
+
+'''
+Raw HX711 sample traces: recording, reading and replaying them.
+
+A trace is every raw 24-bit sample a chip produced, with the monotonic time
+it was read and the gain it was converted at.  record_trace() writes one
+from a real HX711, TraceReader reads it back through mmap, and
+TraceReplayBackend plays it into the unmodified HX711 driver, in real time
+or as fast as the driver can read, so field issues and filter changes can
+be worked on against real kitchen noise on any machine.
+
+File format, little endian:
+
+    header   magic "HX7T", version (u16), flags (u16), sample count (u64),
+             timestamp of the first sample in microseconds (i64)
+    records  one per sample, two unsigned LEB128 varints:
+             - microseconds since the previous sample (0 for the first)
+             - zigzag(value - previous value) << 2 | gain pulses (1 to 3)
+
+Consecutive samples differ by a few hundred counts and arrive a few
+milliseconds apart, so a record usually takes 4 bytes.  The sample count is
+written when the trace is closed; a trace whose recording was cut short has
+a count of 0 and is read up to its last complete record.
+'''
+
+MAGIC = b'HX7T'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQq')
+
+GAIN_PULSES = {128: 1, 64: 3, 32: 2}
+PULSES_GAIN = {1: 128, 2: 32, 3: 64}
+
+
+class TraceWriter:
+
+    def __init__(self, path, flush_size=65536):
+        self.path = path
+        self.flushSize = flush_size
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        self.buffer = bytearray()
+
+        self.count = 0
+        self.startMicros = None
+        self.lastMicros = 0
+        self.lastValue = 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+
+    def add(self, timestamp, value, gain=128):
+        # Appends one sample read at `timestamp` (seconds, monotonic).
+        micros = int(round(timestamp * 1e6))
+        if self.startMicros is None:
+            self.startMicros = micros
+            self.lastMicros = micros
+
+        if micros < self.lastMicros:
+            raise ValueError("TraceWriter::add(): timestamps must not go backwards!")
+
+        delta = value - self.lastValue
+        zigzag = delta << 1 if delta >= 0 else ((-delta) << 1) - 1
+
+        encodeVarint(micros - self.lastMicros, self.buffer)
+        encodeVarint((zigzag << 2) | GAIN_PULSES[gain], self.buffer)
+
+        self.lastMicros = micros
+        self.lastValue = value
+        self.count += 1
+
+        if len(self.buffer) >= self.flushSize:
+            self.flush()
+
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer = bytearray()
+        self.file.flush()
+
+
+    def close(self):
+        if self.file is None:
+            return
+
+        self.flush()
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, 0, self.count, self.startMicros or 0))
+        self.file.close()
+        self.file = None
+
+
+class TraceReader:
+
+    # Iterating gives (timestamp, value, gain) tuples, oldest first.  The
+    # file is memory-mapped, so records are decoded straight from the page
+    # cache and only the samples being iterated are ever turned into
+    # objects.
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as traceFile:
+            self.data = mmap.mmap(traceFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.data) < HEADER.size:
+            self.data.close()
+            raise ValueError("TraceReader(): %s is too short to be a trace!" % path)
+
+        magic, version, flags, count, startMicros = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError("TraceReader(): %s isn't a version %d HX711 trace!" % (path, VERSION))
+
+        self.count = count
+        self.startMicros = startMicros
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+
+    def __len__(self):
+        if self.count == 0:
+            # Not closed properly; count what's there.
+            self.count = sum(1 for sample in self)
+
+        return self.count
+
+
+    def __iter__(self):
+        data = self.data
+        end = len(data)
+        position = HEADER.size
+        micros = self.startMicros
+        value = 0
+
+        while position < end:
+            try:
+                delta, position = decodeVarint(data, position)
+                word, position = decodeVarint(data, position)
+            except IndexError:
+                # Cut off in the middle of a record.
+                return
+
+            micros += delta
+            zigzag = word >> 2
+            value += (zigzag >> 1) if not zigzag & 1 else -((zigzag + 1) >> 1)
+
+            yield micros / 1e6, value, PULSES_GAIN[word & 0x3]
+
+
+    def close(self):
+        self.data.close()
+
+
+def encodeVarint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decodeVarint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def record_trace(hx, path, duration=None, samples=None, clock=time.monotonic):
+    # Reads hx (an HX711, or anything with read_raw_int() and get_gain())
+    # into a trace at `path` until `duration` seconds have passed or
+    # `samples` samples have been read, or until interrupted.  Record with
+    # the MSB/MSB reading format so the trace holds the chip's own values.
+    # Returns the number of samples recorded.
+    with TraceWriter(path) as writer:
+        start = clock()
+        try:
+            while ((duration is None or clock() - start < duration) and
+                   (samples is None or writer.count < samples)):
+                value = hx.read_raw_int()
+                writer.add(clock(), value, hx.get_gain())
+        except KeyboardInterrupt:
+            pass
+
+        return writer.count
+
+
+class TraceChip(FakeHX711Chip):
+
+    # FakeHX711Chip that converts the samples of a trace, in order, instead
+    # of asking a sample source.  With a speed, sample i is ready at
+    # (t_i - t_0) / speed after the first one was read, or right away if
+    # the driver is already late for it, so every recorded sample is
+    # replayed exactly once.  With speed None samples are ready
+    # conversion_time after the previous read, as fast as the driver goes.
+    # At the end of the trace DOUT stays high, unless `loop` starts it over.
+    # Power-down detection is off by default: a replay on a busy laptop
+    # must not drop a sample because a read got preempted mid-pulse.
+
+    def __init__(self, trace, speed=1.0, loop=False, conversion_time=0.0001, power_down_time=None):
+        FakeHX711Chip.__init__(self, sample_source=self.nextSample, conversion_time=conversion_time,
+                               power_down_time=power_down_time)
+
+        if speed is not None and speed <= 0:
+            raise ValueError("TraceChip(): speed must be greater than zero, or None!")
+
+        self.trace = trace
+        self.speed = speed
+        self.loop = loop
+
+        self.samples = iter(trace)
+        self.pending = next(self.samples, None)
+        if self.pending is None:
+            raise ValueError("TraceChip(): the trace is empty!")
+
+        # Trace time (seconds since the first sample, laps included) of the
+        # latched sample, and the monotonic time trace time 0 maps to.
+        self.traceStart = self.pending[0]
+        self.lapOffset = 0.0
+        self.lapSamples = 0
+        self.latchedTime = 0.0
+        self.replayStart = None
+
+        self.replayed = 0
+        self.gainMismatches = 0
+
+
+    def nextSample(self, gain):
+        timestamp, value, recordedGain = self.pending
+        if recordedGain != gain:
+            self.gainMismatches += 1
+
+        self.latchedTime = timestamp - self.traceStart + self.lapOffset
+        self.replayed += 1
+        self.lapSamples += 1
+
+        self.pending = next(self.samples, None)
+        if self.pending is None and self.loop:
+            # Start over one average sample period after the last sample.
+            lapLength = timestamp - self.traceStart
+            if self.lapSamples > 1:
+                lapLength += lapLength / (self.lapSamples - 1)
+            self.lapOffset += lapLength
+            self.lapSamples = 0
+            self.samples = iter(self.trace)
+            self.pending = next(self.samples)
+
+        return value
+
+
+    def nextReadyTime(self, now):
+        if self.pending is None:
+            return now + 0.1
+
+        earliest = now + self.conversionTime
+        if self.speed is None:
+            return earliest
+
+        if self.replayStart is None:
+            self.replayStart = now - self.latchedTime / self.speed
+
+        traceTime = self.pending[0] - self.traceStart + self.lapOffset
+        return max(earliest, self.replayStart + traceTime / self.speed)
+
+
+    def dout(self, now):
+        if self.pending is None and (not self.latched or self.pulses > 24):
+            # Out of samples once the last one has been clocked out.
+            self.readyAt = max(self.readyAt, now + 0.1)
+            return 1
+
+        return FakeHX711Chip.dout(self, now)
+
+
+    def is_finished(self):
+        # True once the last sample of the trace has been clocked out.
+        return self.pending is None and (not self.latched or self.pulses > 24)
+
+
+class TraceReplayBackend(FakeGPIOBackend):
+
+    # FakeGPIOBackend with a single TraceChip on dout/pd_sck, so
+    # HX711(dout, pd_sck, backend=TraceReplayBackend("kitchen.trace"))
+    # reads the trace back.  `trace` is a path or a TraceReader.
+
+    def __init__(self, trace, dout=5, pd_sck=6, speed=1.0, loop=False, clock=time.monotonic, **kwargs):
+        FakeGPIOBackend.__init__(self, clock)
+
+        self.ownsTrace = not isinstance(trace, TraceReader)
+        if self.ownsTrace:
+            trace = TraceReader(trace)
+
+        self.trace = trace
+        self.chip = self.add_chip(dout, pd_sck, chip=TraceChip(trace, speed, loop, **kwargs))
+
+    def is_finished(self):
+        return self.chip.is_finished()
+
+    def cleanup(self):
+        FakeGPIOBackend.cleanup(self)
+        if self.ownsTrace:
+            self.trace.close()
+
+
+# EOF - hx711_trace.py
@@ -7,7 +7,7 @@ import math  # Import to check for NaN values
 import matplotlib.pyplot as plt
 from datetime import datetime
 import RPi.GPIO as GPIO
-from hx711 import HX711
+from hx711 import HX711, ZeroTracker
 from picamera2 import Picamera2
 from tkinter import Tk, Label, Button, Frame
 from threading import Thread
@@ -21,7 +21,8 @@ CLIENT = InferenceHTTPClient(
     api_key="7XvsXx7RYeTnwBvj9HH2"
 )
 
-BASE_DIR = "/home/xm23917/Desktop/weight/hx711py"
+# Data lives next to the scripts unless SCALE_BASE_DIR says otherwise
+BASE_DIR = os.environ.get("SCALE_BASE_DIR", os.path.dirname(os.path.abspath(__file__)))
 ZERO_READING_FILE = os.path.join(BASE_DIR, "zero_reading.json")
 CALIBRATION_FILE = os.path.join(BASE_DIR, "calibration_data.json")
 IMAGES_DIR = os.path.join(BASE_DIR, "images")
@@ -37,6 +38,8 @@ NUTRITIONIX_API_KEY = "5e7a357053959ca39c053ba924460cc9"
 # Initialize HX711, Camera, and Nutrition Variables
 hx = HX711(5, 6)
 hx.set_reading_format("MSB", "MSB")
+# Keep the empty scale at zero as the load cell drifts.
+hx.set_zero_tracker(ZeroTracker())
 camera = Picamera2()
 camera.configure(camera.create_still_configuration())
 total_nutrition = {
@@ -0,0 +1,26 @@
+import sys
+import RPi.GPIO as GPIO
+from hx711 import HX711
+from hx711_trace import record_trace
+
+'''
+Records the raw samples of the HX711 on DOUT BCM 5 / PD_SCK BCM 6 into a
+trace file, for replaying later with hx711_trace.TraceReplayBackend.
+
+Usage: python record_trace.py kitchen.trace [seconds]
+
+Without seconds it records until Ctrl+C.
+'''
+
+path = sys.argv[1] if len(sys.argv) > 1 else "hx711.trace"
+duration = float(sys.argv[2]) if len(sys.argv) > 2 else None
+
+hx = HX711(5, 6)
+# The trace holds the values as the chip sends them.
+hx.set_reading_format("MSB", "MSB")
+
+print("Recording to %s, Ctrl+C to stop..." % path)
+count = record_trace(hx, path, duration=duration)
+print("Recorded %d samples." % count)
+
+GPIO.cleanup()
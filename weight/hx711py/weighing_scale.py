@@ -2,7 +2,7 @@ import time
 import sys
 import json
 import RPi.GPIO as GPIO
-from hx711 import HX711
+from hx711 import HX711, AdaptiveDutyCycle
 
 # Cleanup function to handle exit
 def cleanAndExit():
@@ -113,6 +113,10 @@ def main():
     # Initialize the scale
     initialize_scale()
 
+    # Read continuously, but drop to a few powered-down wakeups per second
+    # while the scale stays empty and flat.
+    hx.start_continuous(duty_cycle=AdaptiveDutyCycle(power_down=True))
+
     print("Scale initialized. Add weight now...")
 
     last_weight = 0  # Track the last known weight
@@ -132,10 +136,9 @@ def main():
                     print("Weight: 0.00 grams")
                 last_weight = 0  # Reset the last known weight
 
-            # Power down/up the HX711 to prevent noise and save power
-            hx.power_down()
-            hx.power_up()
-            time.sleep(3)  # Delay between readings
+            # The duty cycle controller powers the HX711 down while idle, so
+            # just wait for the next sample instead of sleeping.
+            hx.wait_for_new_sample(timeout=1.0)
 
     except (KeyboardInterrupt, SystemExit):
         cleanAndExit()